@@ -0,0 +1,147 @@
+"""
+Allan variance benchmark
+------------------------
+Compares the original per-lag Allan variance loop with the engine in ``Calculate.allan_variance``
+
+Run from the ``old_code`` directory:
+```
+python -m benchmarks.allan_variance [sizes ...] [--max-legacy-seconds 120]
+```
+
+For every record size the original expression is timed against the engine on every lag up
+to N/2 (the default ``taus=None``) and on the octave-spaced lags (``taus='octave'``), and
+their results are checked against each other. The original loop costs O(N) per lag, so every
+lag costs O(N^2) in total and takes days at 10^7 samples; when its projected time exceeds
+``max_legacy_seconds`` it is timed on evenly spaced lags and scaled by the number of terms of
+every lag, and the table marks the time as estimated.
+
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+import src.Calculate as Calc
+
+NUM_SAMPLED_LAGS = 64
+
+def legacy_allan_variance(value:np.ndarray, lags:np.ndarray, delta_time:float):
+    """The per-lag expression of the original ``allan_variance`` evaluated at the given lags
+    """
+    allan_var = np.zeros(len(lags))
+    for idx, lag in enumerate(lags):
+        allan_var[idx] = np.mean((value[:-2*lag] - 2*value[lag:-lag] + value[lag*2:])**2.0) / (2.0 * (lag * delta_time) **2)
+
+    return allan_var
+
+def _max_relative_error(values:np.ndarray, reference:np.ndarray):
+    return float(np.max(np.abs(values - reference) / np.abs(reference))) if len(reference) else 0.0
+
+def run(sizes:list=[10**5, 10**6, 10**7], sampling_frequency:int=625, seed:int=0, max_legacy_seconds:float=120):
+    """Times the original and new Allan variance on random-walk records of each size
+
+    Parameters
+    ----------
+    sizes : list
+        The record sizes in samples
+        (default ``[10**5, 10**6, 10**7]``)
+
+    sampling_frequency : int
+        The sampling frequency of the synthetic records
+        (default ``625``)
+
+    seed : int
+        The seed of the random number generator
+        (default ``0``)
+
+    max_legacy_seconds : float
+        The longest projected time of the original loop over every lag which is run in full;
+        longer runs are estimated from ``NUM_SAMPLED_LAGS`` evenly spaced lags
+        (default ``120``)
+
+    Returns
+    -------
+    results : list
+        One dictionary of timings per record size
+
+    """
+    rng = np.random.default_rng(seed)
+    delta_time = 1.0 / sampling_frequency
+    results = []
+
+    for num_samples in sizes:
+        value = np.cumsum(rng.standard_normal(num_samples))
+        value -= np.mean(value)
+        collection = {'specifications':{'units':{'times':'sec', 'pressures':'bar'}},
+                      'times':np.arange(num_samples) * delta_time,
+                      'excess_path_length':{'syn-syn':value}}
+
+        every_lag = np.arange(1, num_samples//2)
+        start = time.perf_counter()
+        engine_every = Calc.allan_variance(collection)['allan_var']['syn-syn'][every_lag]
+        engine_every_time = time.perf_counter() - start
+
+        # Each lag of the original loop costs in proportion to its number of terms N - 2*lag
+        sampled = np.unique(np.linspace(1, num_samples//2 - 1, NUM_SAMPLED_LAGS).astype(np.int64))
+        start = time.perf_counter()
+        legacy_sampled = legacy_allan_variance(value, sampled, delta_time)
+        sampled_time = time.perf_counter() - start
+        legacy_every_time = sampled_time * np.sum(num_samples - 2*every_lag) / np.sum(num_samples - 2*sampled)
+
+        estimated = legacy_every_time > max_legacy_seconds
+        if estimated:
+            every_error = _max_relative_error(engine_every[sampled - 1], legacy_sampled)
+        else:
+            start = time.perf_counter()
+            legacy_every = legacy_allan_variance(value, every_lag, delta_time)
+            legacy_every_time = time.perf_counter() - start
+            every_error = _max_relative_error(engine_every, legacy_every)
+
+        octave_lags = Calc.octave_lags(num_samples)
+        start = time.perf_counter()
+        legacy_octave = legacy_allan_variance(value, octave_lags, delta_time)
+        legacy_octave_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine_octave = Calc.allan_variance(collection, taus='octave')['allan_var']['syn-syn']
+        engine_octave_time = time.perf_counter() - start
+
+        results.append({'num_samples':num_samples,
+                        'num_lags':len(every_lag),
+                        'legacy_every_lag_sec':legacy_every_time,
+                        'legacy_every_lag_estimated':bool(estimated),
+                        'engine_every_lag_sec':engine_every_time,
+                        'speedup_every_lag':legacy_every_time / engine_every_time,
+                        'every_lag_relative_error':every_error,
+                        'num_octave_lags':len(octave_lags),
+                        'legacy_octave_sec':legacy_octave_time,
+                        'engine_octave_sec':engine_octave_time,
+                        'speedup_octave':legacy_octave_time / engine_octave_time,
+                        'octave_relative_error':_max_relative_error(engine_octave, legacy_octave)})
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the original Allan variance against Calculate.allan_variance')
+    parser.add_argument('sizes', nargs='*', type=float, default=[1e5, 1e6, 1e7], help='record sizes in samples')
+    parser.add_argument('--max-legacy-seconds', type=float, default=120,
+                        help='estimate the original every-lag loop from sampled lags when it would take longer')
+    args = parser.parse_args()
+
+    print('%10s %9s %16s %12s %9s %9s | %6s %11s %11s %9s %9s' % ('samples', 'lags', 'legacy all (s)', 'engine (s)',
+                                                                 'speedup', 'rel err', 'octave', 'legacy (s)',
+                                                                 'engine (s)', 'speedup', 'rel err'))
+    for result in run([int(size) for size in args.sizes], max_legacy_seconds=args.max_legacy_seconds):
+        legacy = '%.1f' % result['legacy_every_lag_sec'] + (' (est.)' if result['legacy_every_lag_estimated'] else '')
+        print('%10d %9d %16s %12.3f %8.0fx %9.1e | %6d %11.3f %11.3f %8.1fx %9.1e' % (result['num_samples'],
+                                                                                   result['num_lags'],
+                                                                                   legacy,
+                                                                                   result['engine_every_lag_sec'],
+                                                                                   result['speedup_every_lag'],
+                                                                                   result['every_lag_relative_error'],
+                                                                                   result['num_octave_lags'],
+                                                                                   result['legacy_octave_sec'],
+                                                                                   result['engine_octave_sec'],
+                                                                                   result['speedup_octave'],
+                                                                                   result['octave_relative_error']))
@@ -0,0 +1,136 @@
+"""
+Decimation benchmark
+--------------------
+Checks that ``Streaming.StreamingDecimator`` keeps up with a live feed on a single core
+
+Run from the ``old_code`` directory:
+```
+python -m benchmarks.decimate
+python -m benchmarks.decimate --factors 5 25 125 --block-seconds 0.2 --cpu 0
+```
+
+A synthetic collection is fed block by block as the collector would, with the process pinned to
+one core (``--cpu``) so that the result reflects a single core of the Raspberry Pi rather than
+a multi-core workstation. For each factor the real-time factor (seconds of data per second of
+processing) and the slowest block relative to the block duration are reported: the stage keeps
+up while both leave a margin. The output is also checked against decimating the whole record
+in one block, and the residue of a tone above the new Nyquist frequency gives the stopband
+attenuation.
+
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import src.Streaming as Streaming
+from benchmarks.synthetic import synthetic_collection
+
+def run(factors:list=[5, 25, 125], num_stations:int=4, sampling_frequency:int=625, duration:float=600,
+        block_seconds:float=1.0, taps_per_phase:int=12):
+    """Times the streaming decimation of a synthetic collection for every factor
+
+    Parameters
+    ----------
+    factors : list
+        The decimation factors
+        (default ``[5, 25, 125]``)
+
+    num_stations, sampling_frequency, duration
+        The synthetic collection (see ``benchmarks.synthetic.synthetic_collection()``)
+        (default ``4``, ``625`` and ``600``)
+
+    block_seconds : float
+        The length of the blocks fed to the decimator, in seconds
+        (default ``1.0``)
+
+    taps_per_phase : int
+        The filter length per output sample of each stage (see ``Streaming.StreamingDecimator``)
+        (default ``12``)
+
+    Returns
+    -------
+    results : list
+        One dictionary of timings and checks per factor
+
+    """
+    collection = synthetic_collection(num_stations=num_stations, sampling_frequency=sampling_frequency, duration=duration)
+    specifications = collection['specifications']
+    stations = specifications['stations']
+    times = collection['data'][stations[0]]['times']
+    pressures = {station:collection['data'][station]['pressures'] for station in stations}
+    block_length = max(1, int(block_seconds * sampling_frequency))
+
+    results = []
+    for factor in factors:
+        decimator = Streaming.StreamingDecimator(specifications, factor, taps_per_phase)
+        block_times = []
+        outputs = []
+        start = time.perf_counter()
+        for first in range(0, len(times), block_length):
+            block_start = time.perf_counter()
+            block, _ = decimator.update({station:pressures[station][first:first + block_length] for station in stations},
+                                        times[first:first + block_length])
+            block_times.append(time.perf_counter() - block_start)
+            outputs.append(block[stations[0]])
+        elapsed = time.perf_counter() - start
+
+        whole, _ = Streaming.StreamingDecimator(specifications, factor, taps_per_phase).update(pressures, times)
+
+        # A tone between the new Nyquist frequency and the original one that the filters must remove
+        new_frequency = sampling_frequency / factor
+        tone_frequency = 0.5 * (0.5*new_frequency + 0.5*sampling_frequency) if factor > 1 else 0.25 * sampling_frequency
+        tone = np.sin(2*np.pi*tone_frequency*times)
+        residue, _ = Streaming.StreamingDecimator({'stations':['tone'], 'sampling_frequency':sampling_frequency},
+                                                  factor, taps_per_phase).update({'tone':tone}, times)
+
+        results.append({'factor':factor,
+                        'stages':decimator.specifications['decimation']['stages'],
+                        'output_frequency':decimator.specifications['sampling_frequency'],
+                        'seconds':elapsed,
+                        'realtime_factor':duration / elapsed,
+                        'worst_block_fraction':max(block_times) / (block_length / sampling_frequency),
+                        'samples_per_second':num_stations * len(times) / elapsed,
+                        'max_block_difference':float(np.max(np.abs(np.concatenate(outputs) - whole[stations[0]]))),
+                        'tone_frequency':tone_frequency,
+                        'attenuation_db':20*np.log10(np.sqrt(2)*np.std(residue['tone']) + 1e-300)})
+
+    return results
+
+def main(argv:list=None):
+    """Command line entry point of the decimation benchmark
+    """
+    parser = argparse.ArgumentParser(description='Check that the streaming decimation keeps up in real time on one core')
+    parser.add_argument('--factors', nargs='+', type=int, default=[5, 25, 125])
+    parser.add_argument('--stations', type=int, default=4)
+    parser.add_argument('--sampling-frequency', type=int, default=625)
+    parser.add_argument('--duration', type=float, default=600)
+    parser.add_argument('--block-seconds', type=float, default=1.0)
+    parser.add_argument('--taps-per-phase', type=int, default=12)
+    parser.add_argument('--cpu', type=int, default=0, help='core to pin the process to, or -1 to not pin it')
+    args = parser.parse_args(argv)
+
+    if args.cpu >= 0 and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {args.cpu})
+
+    results = run(args.factors, args.stations, args.sampling_frequency, args.duration, args.block_seconds, args.taps_per_phase)
+
+    print('%7s %10s %9s %12s %12s %12s %14s %10s' % ('factor', 'stages', 'rate (Hz)', 'realtime', 'worst block',
+                                                      'samples/s', 'block diff', 'stopband'))
+    for result in results:
+        print('%7d %10s %9.2f %11.0fx %11.2f%% %12.3g %14.1e %7.0f dB' % (result['factor'],
+                                                                          'x'.join(str(stage) for stage in result['stages']),
+                                                                          result['output_frequency'],
+                                                                          result['realtime_factor'],
+                                                                          100*result['worst_block_fraction'],
+                                                                          result['samples_per_second'],
+                                                                          result['max_block_difference'],
+                                                                          result['attenuation_db']))
+
+    return 0 if all(result['worst_block_fraction'] < 1 for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
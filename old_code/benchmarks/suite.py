@@ -0,0 +1,258 @@
+"""
+Benchmark suite
+---------------
+Times and memory-profiles ``Calculate`` and ``DataCollection`` on synthetic collections of several sizes
+
+Run from the ``old_code`` directory:
+```
+python -m benchmarks.suite --output results.json
+python -m benchmarks.suite --output new.json --compare results.json
+python -m benchmarks.suite --output wide.json --stations 4 8 --sampling-frequency 625 1250 --durations 600
+python -m benchmarks.suite --output custom.json --cases cases.json
+```
+
+Every case is a synthetic collection (see ``benchmarks.synthetic``) of a number of stations,
+sampling frequency and duration. ``--stations``, ``--sampling-frequency`` and ``--durations`` run every
+combination of the given values in place of ``DEFAULT_CASES``, and ``--cases`` reads a JSON list of
+``synthetic_collection()`` keyword arguments. Each function is timed as the best of ``repeats`` runs and its
+peak allocation is measured with ``tracemalloc`` in a separate run, so tracing does not distort
+the timings. Results are written as JSON; ``--compare`` reports every function that got slower
+or used more memory than in an earlier run by more than ``--threshold`` and exits non-zero.
+
+Methods
+-------
+BENCHMARKS
+    The benchmarked functions by name
+
+run_suite(cases:list=DEFAULT_CASES, repeats:int=3)
+    Returns the timing and memory of every benchmark for every case
+
+compare(results:dict, baseline:dict, threshold:float=1.25)
+    Returns the benchmarks of ``results`` that regressed against ``baseline``
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+import src.Calculate as Calc
+import src.Streaming as Streaming
+import src.DataCollection as Data
+from benchmarks.synthetic import synthetic_collection
+
+DEFAULT_CASES = [{'num_stations':4, 'sampling_frequency':625, 'duration':60},
+                 {'num_stations':4, 'sampling_frequency':625, 'duration':600},
+                 {'num_stations':4, 'sampling_frequency':625, 'duration':3600},
+                 {'num_stations':8, 'sampling_frequency':625, 'duration':600}]
+
+def _excess_path_length(collection, scratch):
+    Calc.excess_path_length(collection)
+
+def _allan_variance(collection, scratch):
+    Calc.allan_variance(scratch['excess_path_length'], taus='octave')
+
+def _cross_correlate(collection, scratch):
+    Calc.cross_correlate(collection)
+
+def _auto_correlate(collection, scratch):
+    Calc.auto_correlate(collection)
+
+def _correlate_segmented(collection, scratch):
+    num_samples = len(collection['data'][collection['specifications']['stations'][0]]['pressures'])
+    Calc.correlate(collection, segment_length=min(2**14, num_samples))
+
+def _decimate(collection, scratch):
+    specifications = collection['specifications']
+    stations = specifications['stations']
+    block_length = int(specifications['sampling_frequency'])
+    decimator = Streaming.StreamingDecimator(specifications, factor=25)
+    times = collection['data'][stations[0]]['times']
+    for first in range(0, len(times), block_length):
+        decimator.update({station:collection['data'][station]['pressures'][first:first + block_length] for station in stations},
+                         times[first:first + block_length])
+
+def _save(collection, scratch):
+    Data.save(collection, os.path.join(scratch['directory'], 'collection.pkl'))
+
+def _load(collection, scratch):
+    Data.load(os.path.join(scratch['directory'], 'collection.pkl'))
+
+def _save_columnar(collection, scratch):
+    Data.save_columnar(collection, os.path.join(scratch['directory'], 'columnar'))
+
+def _load_columnar(collection, scratch):
+    loaded = Data.load_columnar(os.path.join(scratch['directory'], 'columnar'))
+    for station in loaded['specifications']['stations']:
+        np.sum(loaded['data'][station]['pressures'])
+
+BENCHMARKS = {'excess_path_length':_excess_path_length,
+              'allan_variance':_allan_variance,
+              'cross_correlate':_cross_correlate,
+              'auto_correlate':_auto_correlate,
+              'correlate_segmented':_correlate_segmented,
+              'decimate':_decimate,
+              'save':_save,
+              'load':_load,
+              'save_columnar':_save_columnar,
+              'load_columnar':_load_columnar}
+
+def _case_name(case:dict):
+    name = '%dst_%gHz_%gs' % (case.get('num_stations', 4), case.get('sampling_frequency', 625), case.get('duration', 600))
+    extras = sorted(set(case) - {'num_stations', 'sampling_frequency', 'duration'})
+
+    return name + ''.join('_%s=%s' % (key, case[key]) for key in extras)
+
+def run_suite(cases:list=DEFAULT_CASES, repeats:int=3, benchmarks:list=None, progress=print):
+    """Runs every benchmark on a synthetic collection of every case
+
+    Parameters
+    ----------
+    cases : list
+        Keyword arguments of ``synthetic_collection()`` for each case
+        (default ``DEFAULT_CASES``)
+
+    repeats : int
+        The number of timed runs of each benchmark, the fastest is reported
+        (default ``3``)
+
+    benchmarks : list
+        The names of the benchmarks to run
+        (default every benchmark in ``BENCHMARKS``, in order)
+
+    progress : callable
+        Called with one line of text per result, or ``None`` for no output
+        (default ``print``)
+
+    Returns
+    -------
+    results : dict
+        ``{'environment':{...}, 'results':{case:{benchmark:{'seconds':float, 'peak_bytes':int}}}}``
+
+    """
+    benchmarks = list(BENCHMARKS) if benchmarks is None else benchmarks
+    results = {}
+
+    for case in cases:
+        collection = synthetic_collection(**case)
+        scratch = {'directory':tempfile.mkdtemp(prefix='met4a_bench_'),
+                   'excess_path_length':Calc.excess_path_length(collection)}
+        case_results = {}
+        try:
+            for name in benchmarks:
+                function = BENCHMARKS[name]
+
+                timings = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    function(collection, scratch)
+                    timings.append(time.perf_counter() - start)
+
+                tracemalloc.start()
+                function(collection, scratch)
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                case_results[name] = {'seconds':min(timings), 'peak_bytes':peak_bytes}
+                if progress is not None:
+                    progress('%-18s %-22s %10.4f s %10.1f MB' % (_case_name(case), name, min(timings), peak_bytes / 2**20))
+        finally:
+            shutil.rmtree(scratch['directory'], ignore_errors=True)
+
+        results[_case_name(case)] = case_results
+
+    environment = {'python':platform.python_version(),
+                   'numpy':np.__version__,
+                   'machine':platform.machine(),
+                   'processor':platform.processor(),
+                   'cpu_count':os.cpu_count(),
+                   'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    return {'environment':environment, 'results':results}
+
+def compare(results:dict, baseline:dict, threshold:float=1.25):
+    """Finds the benchmarks that regressed against an earlier run
+
+    Parameters
+    ----------
+    results, baseline : dict
+        Outputs of ``run_suite()``
+
+    threshold : float
+        The ratio of new to old time or peak memory above which a benchmark has regressed
+        (default ``1.25``)
+
+    Returns
+    -------
+    regressions : list
+        ``(case, benchmark, metric, old, new)`` for every regression
+
+    """
+    regressions = []
+    for case, case_results in results['results'].items():
+        for name, entry in case_results.items():
+            old_entry = baseline['results'].get(case, {}).get(name)
+            if old_entry is None:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if old_entry[metric] > 0 and entry[metric] / old_entry[metric] > threshold:
+                    regressions.append((case, name, metric, old_entry[metric], entry[metric]))
+
+    return regressions
+
+def main(argv:list=None):
+    """Command line entry point of the benchmark suite
+    """
+    parser = argparse.ArgumentParser(description='Benchmark Calculate and DataCollection on synthetic collections')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file in which the results are written')
+    parser.add_argument('--compare', default=None, help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--benchmarks', nargs='+', default=None, choices=list(BENCHMARKS))
+    parser.add_argument('--cases', default=None,
+                        help='JSON file with a list of synthetic_collection() keyword arguments, one per case')
+    parser.add_argument('--stations', nargs='+', type=int, default=None,
+                        help='numbers of stations of the cases (default 4 when other case options are given)')
+    parser.add_argument('--sampling-frequency', nargs='+', type=float, default=None,
+                        help='sampling frequencies in Hz of the cases (default 625 when other case options are given)')
+    parser.add_argument('--durations', nargs='+', type=float, default=None,
+                        help='record lengths in seconds of the cases (default 600 when other case options are given)')
+    args = parser.parse_args(argv)
+
+    grid = (args.stations, args.sampling_frequency, args.durations)
+    if args.cases is not None:
+        if any(values is not None for values in grid):
+            parser.error('--cases cannot be combined with --stations, --sampling-frequency or --durations')
+        with open(args.cases, 'r') as f:
+            cases = json.load(f)
+    elif all(values is None for values in grid):
+        cases = DEFAULT_CASES
+    else:
+        cases = [{'num_stations':num_stations, 'sampling_frequency':sampling_frequency, 'duration':duration}
+                 for num_stations in args.stations or [4]
+                 for sampling_frequency in args.sampling_frequency or [625]
+                 for duration in args.durations or [600]]
+    results = run_suite(cases, args.repeats, args.benchmarks)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if args.compare is None:
+        return 0
+
+    with open(args.compare, 'r') as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for case, name, metric, old, new in regressions:
+        print('REGRESSION %s %s %s: %.4g -> %.4g' % (case, name, metric, old, new))
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Synthetic collections
+---------------------
+Generates pressure data collections in standard format with realistic infrasound for benchmarking
+
+Every station records the same red-noise atmosphere (a first order autoregressive process, so
+the spectrum falls off towards high frequencies) plus independent white sensor noise, and
+optionally booms: N-shaped pressure pulses reaching each station with a small delay.
+
+Methods
+-------
+synthetic_collection(num_stations:int=4, sampling_frequency:int=625, duration:float=600, num_events:int=3, seed:int=0)
+    Returns a pressure data collection in standard format
+
+"""
+
+import numpy as np
+
+STATION_NAMES = ['dol', 'ott', 'sea', 'orc']
+
+def _red_noise(rng, num_samples:int, correlation:float, chunk_size:int=2**20):
+    """Returns a first order autoregressive series ``x[n] = correlation*x[n-1] + w[n]`` without a per-sample Python loop
+
+    Each chunk is the discounted cumulative sum of its white noise, seeded with the last value of
+    the previous chunk; chunking keeps ``correlation**-n`` within floating point range.
+    """
+    series = np.empty(num_samples)
+    last_value = 0.0
+    chunk_size = min(chunk_size, max(1, int(200 / max(-np.log(correlation), 1e-12))))
+    for start in range(0, num_samples, chunk_size):
+        white = rng.standard_normal(min(chunk_size, num_samples - start))
+        powers = correlation ** np.arange(1, len(white) + 1)
+        series[start:start + len(white)] = powers * (last_value + np.cumsum(white / powers))
+        last_value = series[start + len(white) - 1]
+
+    return series
+
+def _n_wave(times:np.ndarray, arrival:float, duration:float, amplitude:float):
+    """Returns an N-wave pulse: a jump to ``amplitude`` at ``arrival`` decaying linearly to ``-amplitude`` over ``duration``
+    """
+    phase = (times - arrival) / duration
+    return np.where((phase >= 0) & (phase <= 1), amplitude * (1 - 2*phase), 0.0)
+
+def synthetic_collection(num_stations:int=4, sampling_frequency:int=625, duration:float=600,
+                         num_events:int=3, seed:int=0, base_pressure:float=1.01325,
+                         noise_amplitude:float=2e-6, sensor_noise:float=2e-7, event_amplitude:float=2e-5):
+    """Generates a pressure data collection in standard format
+
+    Parameters
+    ----------
+    num_stations : int
+        The number of stations, named after ``STATION_NAMES`` and then ``st4``, ``st5``, ...
+        (default ``4``)
+
+    sampling_frequency : int
+        The sampling frequency in Hz
+        (default ``625``)
+
+    duration : float
+        The length of the record in seconds
+        (default ``600``)
+
+    num_events : int
+        The number of booms injected at random times
+        (default ``3``)
+
+    seed : int
+        The seed of the random number generator
+        (default ``0``)
+
+    base_pressure, noise_amplitude, sensor_noise, event_amplitude : float
+        The mean pressure, the standard deviation of the red noise and of the sensor noise, and the peak
+        pressure of each boom, all in bar
+
+    Returns
+    -------
+    data_dict : dict
+        The pressure data collection in standard format, with ``specifications['events']`` listing the
+        arrival time of each boom at the first station
+
+    """
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration * sampling_frequency)
+    times = np.arange(num_samples) / sampling_frequency
+    stations = (STATION_NAMES + ['st%d' % idx for idx in range(len(STATION_NAMES), num_stations)])[:num_stations]
+
+    correlation = np.exp(-2*np.pi * 0.5 / sampling_frequency)
+    atmosphere = _red_noise(rng, num_samples, correlation)
+    atmosphere *= noise_amplitude / np.std(atmosphere)
+
+    event_times = np.sort(rng.uniform(0.1*duration, 0.9*duration, num_events))
+    event_durations = rng.uniform(0.05, 0.5, num_events)
+
+    data_dict = {}
+    for idx, station in enumerate(stations):
+        pressures = base_pressure + atmosphere + sensor_noise * rng.standard_normal(num_samples)
+        delay = 0.01 * idx
+        for event_time, event_duration in zip(event_times, event_durations):
+            window = slice(int((event_time + delay) * sampling_frequency),
+                           int((event_time + delay + event_duration) * sampling_frequency) + 1)
+            pressures[window] += _n_wave(times[window], event_time + delay, event_duration, event_amplitude)
+
+        data_dict[station] = {'pressures':pressures, 'times':times.copy()}
+
+    specifications = {'filter':b'IA=0',
+                      'units':{'pressures':'bar',
+                               'times':'sec'},
+                      'stations':stations,
+                      'sampling_frequency':sampling_frequency,
+                      'events':event_times.tolist()}
+
+    return {'specifications':specifications, 'data':data_dict}
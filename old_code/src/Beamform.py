@@ -0,0 +1,381 @@
+"""
+Beamform
+--------
+Direction of arrival of infrasound crossing the station array
+
+The cross-spectra of every station pair are steered to every slowness vector of a polar grid of
+slowness and back-azimuth in one batched tensor operation: a plane wave with slowness vector s
+delays station i by s.r_i, so the cross-spectrum of pair (i, j) carries the phase
+exp(-2πi f s.(r_i - r_j)), and the steered sum over pairs and frequencies peaks at the true s.
+The best point of a coarse grid is refined on successively finer grids around it.
+
+Station coordinates are stored as ``specifications['coordinates'] = {station:[east, north]}`` in
+metres, so slownesses are in s/m and back-azimuths in degrees clockwise from north, pointing
+towards the source.
+
+```
+collection['specifications']['coordinates'] = {'dol':[0, 0], 'ott':[12.5, 3.1], 'sea':[-4.0, 9.8], 'orc':[6.2, -8.4]}
+estimates = Beamform.sliding_beamform(collection, window_length=10, step=1, segment_length=1024, f_min=1, f_max=20)
+```
+
+Methods
+-------
+pair_baselines(specifications:dict, keys:list)
+    Returns the east and north separation of each station pair
+
+beam_power(spectra:np.ndarray, frequencies:np.ndarray, baselines:np.ndarray, slowness_vectors:np.ndarray)
+    Returns the normalized beam power of every window at every slowness vector
+
+beamform(spectra:np.ndarray, frequencies:np.ndarray, keys:list, specifications:dict, ...)
+    Returns the coarse-to-fine direction estimate of one or many windows of cross-spectra
+
+beamform_correlation(correlate_dict:dict, f_min:float=None, f_max:float=None, ...)
+    Returns the direction estimate of a ``Calculate.correlate()`` or ``Calculate.cross_correlate()`` collection
+
+sliding_beamform(data_collection:dict, window_length:float, step:float, segment_length:int, ...)
+    Returns the direction estimate of every sliding window of a long record
+
+"""
+
+import numpy as np
+
+import src.Calculate as Calc
+import src.Instrument as Instrument
+
+DEFAULT_MAX_SLOWNESS = 1 / 150
+MAX_STEERING_ELEMENTS = 2**22
+
+def pair_baselines(specifications:dict, keys:list):
+    """Returns the separation ``r_i - r_j`` of every ``'i-j'`` station pair
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` holding ``coordinates``
+
+    keys : list
+        The ``station-station`` pair keys
+
+    Returns
+    -------
+    baselines : numpy.ndarray
+        A (P, 2) array of the east and north separations in metres
+
+    """
+    if 'coordinates' not in specifications:
+        raise KeyError("specifications['coordinates'] must give the [east, north] position of every station in metres")
+
+    coordinates = {station:np.asarray(position, dtype=np.float64)[:2] for station, position in specifications['coordinates'].items()}
+    stations = specifications['stations']
+    # Station names may contain '-', so pairs are matched against the known stations
+    pairs = {str(first + '-' + second):(first, second) for first in stations for second in stations}
+
+    return np.array([coordinates[pairs[key][0]] - coordinates[pairs[key][1]] for key in keys]).reshape(len(keys), 2)
+
+def slowness_vectors(slownesses:np.ndarray, back_azimuths:np.ndarray):
+    """Returns the east and north slowness of waves arriving from ``back_azimuths`` (degrees) with ``slownesses``
+
+    The arrays are broadcast together and a trailing axis of length 2 is added.
+    """
+    theta = np.deg2rad(back_azimuths)
+
+    # The wave travels away from the source, opposite to the back-azimuth
+    return np.stack(np.broadcast_arrays(-slownesses * np.sin(theta), -slownesses * np.cos(theta)), axis=-1)
+
+def beam_power(spectra:np.ndarray, frequencies:np.ndarray, baselines:np.ndarray, slowness_vectors:np.ndarray):
+    """Steers the cross-spectra of every window to every slowness vector
+
+    Parameters
+    ----------
+    spectra : numpy.ndarray
+        A (W, P, F) complex array of the cross-spectra of P pairs at F frequencies in W windows
+
+    frequencies : numpy.ndarray
+        The F frequencies
+
+    baselines : numpy.ndarray
+        The (P, 2) separations of the pairs (see ``pair_baselines()``)
+
+    slowness_vectors : numpy.ndarray
+        A (G, 2) grid shared by every window or a (W, G, 2) grid per window
+
+    Returns
+    -------
+    power : numpy.ndarray
+        A (W, G) array of the steered power divided by the total cross-spectral amplitude, so 1 means every
+        pair and frequency is perfectly in phase
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm = 1.0 / np.sum(np.abs(spectra), axis=(1, 2))
+    norm[~np.isfinite(norm)] = 0.0
+    phase_scale = 2j * np.pi * frequencies
+
+    # The (G, P, F) or (w, G, P, F) steering tensor is built a chunk of grid points and windows at a time
+    pair_frequencies = max(1, spectra.shape[1] * spectra.shape[2])
+    point_chunk = max(1, MAX_STEERING_ELEMENTS // pair_frequencies)
+
+    if slowness_vectors.ndim == 2:
+        num_points = slowness_vectors.shape[0]
+        power = np.empty((spectra.shape[0], num_points))
+        for first_point in range(0, num_points, point_chunk):
+            last_point = min(first_point + point_chunk, num_points)
+            delays = slowness_vectors[first_point:last_point] @ baselines.T
+            steering = np.exp(delays[:, :, None] * phase_scale)
+            power[:, first_point:last_point] = np.einsum('wpf,gpf->wg', spectra, steering).real * norm[:, None]
+
+        return power
+
+    num_windows, num_points = slowness_vectors.shape[:2]
+    window_chunk = max(1, MAX_STEERING_ELEMENTS // max(1, num_points * pair_frequencies))
+    power = np.empty((num_windows, num_points))
+    for start in range(0, num_windows, window_chunk):
+        stop = min(start + window_chunk, num_windows)
+        for first_point in range(0, num_points, point_chunk):
+            last_point = min(first_point + point_chunk, num_points)
+            delays = slowness_vectors[start:stop, first_point:last_point] @ baselines.T
+            steering = np.exp(delays[..., None] * phase_scale)
+            power[start:stop, first_point:last_point] = (np.einsum('wpf,wgpf->wg', spectra[start:stop], steering).real
+                                                         * norm[start:stop, None])
+
+    return power
+
+def _band(frequencies:np.ndarray, f_min:float, f_max:float):
+    """Returns the mask of the positive frequencies inside the band
+    """
+    mask = frequencies > 0
+    if f_min is not None:
+        mask &= frequencies >= f_min
+    if f_max is not None:
+        mask &= frequencies <= f_max
+    if not np.any(mask):
+        raise ValueError('No frequency falls in the band [%s, %s]' % (f_min, f_max))
+
+    return mask
+
+@Instrument.instrumented
+def beamform(spectra:np.ndarray, frequencies:np.ndarray, keys:list, specifications:dict,
+             max_slowness:float=DEFAULT_MAX_SLOWNESS, num_slowness:int=25, num_azimuth:int=72,
+             levels:int=3, num_refine:int=9):
+    """Estimates the direction of arrival from the cross-spectra of one or many windows
+
+    A (num_slowness x num_azimuth) polar grid is evaluated for every window at once, then each
+    window's best point is refined ``levels`` times on a (num_refine x num_refine) grid spanning
+    the neighbouring points of the previous grid.
+
+    Parameters
+    ----------
+    spectra : numpy.ndarray
+        A (P, F) or (W, P, F) complex array of cross-spectra, e.g. from ``Calculate.cross_spectra()``
+
+    frequencies : numpy.ndarray
+        The F frequencies in Hz
+
+    keys : list
+        The ``station-station`` key of each pair
+
+    specifications : dict
+        The ``specifications`` holding ``coordinates``
+
+    max_slowness : float
+        The largest slowness searched in s/m
+        (default ``1/150``)
+
+    num_slowness, num_azimuth : int
+        The size of the coarse grid
+        (default ``25`` and ``72``)
+
+    levels : int
+        The number of refinements
+        (default ``3``)
+
+    num_refine : int
+        The number of slownesses and back-azimuths of each refined grid
+        (default ``9``)
+
+    Returns
+    -------
+    estimate : dict
+        ``'back_azimuth'`` (degrees), ``'slowness'`` (s/m), ``'apparent_velocity'`` (m/s) and ``'power'`` of the
+        best point, as scalars for (P, F) spectra or arrays of W values, and ``'grid'`` with the coarse
+        ``'slowness'``, ``'back_azimuth'`` and (W, num_slowness, num_azimuth) ``'power'``
+
+    """
+    single = spectra.ndim == 2
+    spectra = spectra[None] if single else spectra
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    baselines = pair_baselines(specifications, keys)
+
+    coarse_slowness = np.linspace(0, max_slowness, num_slowness)
+    coarse_azimuth = np.arange(num_azimuth) * 360.0 / num_azimuth
+    grid_vectors = slowness_vectors(coarse_slowness[:, None], coarse_azimuth[None, :]).reshape(-1, 2)
+    coarse_power = beam_power(spectra, frequencies, baselines, grid_vectors)
+
+    best = np.argmax(coarse_power, axis=1)
+    slowness = coarse_slowness[best // num_azimuth]
+    azimuth = coarse_azimuth[best % num_azimuth]
+    power = coarse_power[np.arange(len(best)), best]
+
+    slowness_span = max_slowness / max(1, num_slowness - 1)
+    azimuth_span = 360.0 / num_azimuth
+    offsets = np.linspace(-1, 1, num_refine)
+    for _ in range(levels):
+        fine_slowness = np.clip(slowness[:, None] + slowness_span * offsets, 0, max_slowness)
+        fine_azimuth = azimuth[:, None] + azimuth_span * offsets
+        fine_vectors = slowness_vectors(fine_slowness[:, :, None], fine_azimuth[:, None, :]).reshape(len(best), -1, 2)
+        fine_power = beam_power(spectra, frequencies, baselines, fine_vectors)
+
+        fine_best = np.argmax(fine_power, axis=1)
+        improved = fine_power[np.arange(len(best)), fine_best] >= power
+        rows = np.arange(len(best))
+        slowness = np.where(improved, fine_slowness[rows, fine_best // num_refine], slowness)
+        azimuth = np.where(improved, fine_azimuth[rows, fine_best % num_refine], azimuth)
+        power = np.maximum(power, fine_power[rows, fine_best])
+
+        slowness_span *= 2.0 / (num_refine - 1)
+        azimuth_span *= 2.0 / (num_refine - 1)
+
+    with np.errstate(divide='ignore'):
+        velocity = np.where(slowness > 0, 1.0 / slowness, np.inf)
+    estimate = {'back_azimuth':np.mod(azimuth, 360.0), 'slowness':slowness, 'apparent_velocity':velocity, 'power':power}
+    if single:
+        estimate = {key:float(value[0]) for key, value in estimate.items()}
+    estimate['grid'] = {'slowness':coarse_slowness, 'back_azimuth':coarse_azimuth,
+                        'power':coarse_power.reshape(-1, num_slowness, num_azimuth)}
+
+    return estimate
+
+def beamform_correlation(correlate_dict:dict, f_min:float=None, f_max:float=None, **grid_kwargs):
+    """Estimates the direction of arrival from a correlation collection
+
+    The log-binned cross-spectra are used as they are, so ``bins_per_octave`` of several bins
+    keeps the phase from averaging out within wide bins.
+
+    Parameters
+    ----------
+    correlate_dict : dict
+        A ``Calculate.correlate()`` or ``Calculate.cross_correlate()`` collection whose ``specifications`` hold ``coordinates``
+
+    f_min, f_max : float
+        The band used
+        (default every bin)
+
+    **grid_kwargs
+        Passed on to ``beamform()``
+
+    Returns
+    -------
+    estimate : dict
+        See ``beamform()``
+
+    """
+    cross = correlate_dict['cross'] if 'cross' in correlate_dict else correlate_dict
+    keys = list(cross['correlation'].keys())
+    frequencies = np.asarray(cross['frequencies'][keys[0]], dtype=np.float64)
+    mask = _band(frequencies, f_min, f_max)
+    spectra = np.stack([np.asarray(cross['correlation'][key])[mask] for key in keys])
+
+    return beamform(spectra, frequencies[mask], keys, cross['specifications'], **grid_kwargs)
+
+@Instrument.instrumented
+def sliding_beamform(data_collection:dict, window_length:float, step:float, segment_length:int,
+                     overlap:float=0.5, window='hann', f_min:float=None, f_max:float=None, **grid_kwargs):
+    """Estimates the direction of arrival in sliding windows of a long record
+
+    Every window is the average of the Welch segments it contains. The cross-spectra of the
+    segments are computed in chunks from strided views with one batched ``rfft`` per chunk
+    (``Calculate._segment_spectra_chunks``), and the windows completed by each chunk are averaged
+    as differences of a running sum and beamformed straight away. Only the running sum of the
+    segments of at most one window is carried between chunks, so memory does not grow with the record.
+
+    Parameters
+    ----------
+    data_collection : dict
+        The pressure data collection, whose stations share the same ``times`` and whose ``specifications`` hold ``coordinates``
+
+    window_length, step : float
+        The length of each window and the time between windows in the units of ``times``
+
+    segment_length : int
+        The number of samples in each Welch segment
+
+    overlap : float
+        The fraction of each segment shared with the next one, in the range [0, 1)
+        (default ``0.5``)
+
+    window : str or array_like
+        The taper applied to each segment
+        (default ``'hann'``)
+
+    f_min, f_max : float
+        The band used
+        (default every positive frequency)
+
+    **grid_kwargs
+        Passed on to ``beamform()``
+
+    Returns
+    -------
+    estimates : dict
+        The ``beamform()`` estimate of every window as arrays, with ``'times'`` holding the centre of each window
+
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError('overlap must be in the range [0, 1)')
+
+    specifications = data_collection['specifications']
+    stations = specifications['stations']
+    sampling_frequency = specifications['sampling_frequency']
+    times = data_collection['data'][stations[0]]['times']
+
+    hop = max(1, int(segment_length * (1 - overlap)))
+    window_samples = int(round(window_length * sampling_frequency))
+    if window_samples < segment_length:
+        raise ValueError('window_length must hold at least one segment of %d samples' % segment_length)
+    segments_per_window = 1 + (window_samples - segment_length)//hop
+    window_hop = max(1, int(round(step * sampling_frequency / hop)))
+
+    frequencies = np.fft.rfftfreq(segment_length, 1.0 / sampling_frequency)[:segment_length//2]
+    mask = _band(frequencies, f_min, f_max)
+    band = np.flatnonzero(mask)
+    bins = slice(band[0], band[-1] + 1)
+
+    rows, cols = Calc._station_pairs(len(stations), 'cross')
+    keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(rows, cols)]
+
+    # carry[k] is the sum of segments carry_first..carry_first + k - 1, kept only from the next window start on
+    carry = np.zeros((1, len(keys), len(band)), dtype=np.complex128)
+    carry_first = 0
+    next_start = 0
+    chunk_estimates = []
+    all_starts = []
+    for _, spectra in Calc._segment_spectra_chunks(data_collection, segment_length, hop, window, 'cross', bins):
+        carry = np.concatenate([carry, carry[-1] + np.cumsum(spectra, axis=0)])
+        num_segments = carry_first + len(carry) - 1
+
+        starts = np.arange(next_start, num_segments - segments_per_window + 1, window_hop)
+        if len(starts) > 0:
+            offsets = starts - carry_first
+            window_spectra = (carry[offsets + segments_per_window] - carry[offsets]) / segments_per_window
+            chunk_estimates.append(beamform(window_spectra, frequencies[bins], keys, specifications, **grid_kwargs))
+            all_starts.append(starts)
+            next_start = starts[-1] + window_hop
+
+        # The sums before the next window start are no longer needed, and rebasing keeps them small
+        drop = min(next_start, num_segments) - carry_first
+        carry = carry[drop:] - carry[drop]
+        carry_first += drop
+
+    if not chunk_estimates:
+        raise ValueError('The record is shorter than one window')
+
+    estimates = {key:np.concatenate([estimate[key] for estimate in chunk_estimates])
+                 for key in chunk_estimates[0] if key != 'grid'}
+    grid = chunk_estimates[0]['grid']
+    estimates['grid'] = {'slowness':grid['slowness'], 'back_azimuth':grid['back_azimuth'],
+                         'power':np.concatenate([estimate['grid']['power'] for estimate in chunk_estimates])}
+    starts = np.concatenate(all_starts)
+    centres = starts * hop + (segments_per_window - 1) * hop // 2 + segment_length // 2
+    estimates['times'] = float(times[0]) + centres / sampling_frequency
+
+    return estimates
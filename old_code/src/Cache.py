@@ -0,0 +1,242 @@
+"""
+Cache
+-----
+A content-addressed on-disk cache for derived data collections
+
+Results are stored under a key hashed from the function name, the source code of its module,
+every parameter and the contents of every input array, so a repeated analysis of unchanged data
+is a file read while any change to the data, the parameters or the code produces a new key.
+The cache is disabled by default; ``Calculate`` functions decorated with ``cached`` only use it
+after ``enable()`` or inside a ``caching()`` block.
+
+```
+import src.Cache as Cache
+import src.Calculate as Calc
+
+with Cache.caching('/path/to/cache', max_bytes=20 * 2**30):
+    allan_var = Calc.allan_variance(excess_lengths, taus='octave')
+```
+
+Methods
+-------
+enable(directory:str, max_bytes:int=DEFAULT_MAX_BYTES)
+    Enables the cache for every ``cached`` function
+
+disable()
+    Disables the cache
+
+caching(directory:str, max_bytes:int=DEFAULT_MAX_BYTES)
+    Context manager enabling the cache inside a ``with`` block
+
+cached(function)
+    Decorator looking up and storing the results of ``function`` in the enabled cache
+
+hash_inputs(function_name:str, *values)
+    Returns the hexadecimal key of a function and its inputs
+
+ResultCache(directory:str, max_bytes:int=DEFAULT_MAX_BYTES)
+    The on-disk store with a size limit and least-recently-used eviction
+
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+import inspect
+import tempfile
+import functools
+import contextlib
+from collections.abc import Mapping
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 2**32
+HASH_CHUNK_BYTES = 2**24
+
+_active_cache = None
+
+class ResultCache:
+    """A directory of pickled results limited to ``max_bytes`` with least-recently-used eviction
+
+    Every entry is a ``<key>.pkl`` file; its modification time records the last access and
+    entries are evicted oldest first once the directory grows past ``max_bytes``.
+
+    Parameters
+    ----------
+    directory : str
+        The directory holding the cache entries (created if it does not exist)
+
+    max_bytes : int
+        The maximum total size of the entries
+        (default ``DEFAULT_MAX_BYTES`` - 4 GiB)
+
+    """
+    def __init__(self, directory:str, max_bytes:int=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key:str):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key:str):
+        """Returns ``(True, value)`` for a stored key and ``(False, None)`` otherwise
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+        os.utime(path)
+
+        return True, value
+
+    def put(self, key:str, value):
+        """Stores ``value`` under ``key`` and evicts the least recently used entries beyond ``max_bytes``
+        """
+        # Written to a temporary file and renamed so an interrupted write never leaves a partial entry
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in ``max_bytes``
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+
+    def clear(self):
+        """Removes every entry
+        """
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
+
+def _update_hash(digest, value):
+    """Feeds the type and contents of ``value`` into ``digest``
+    """
+    if isinstance(value, Mapping):
+        digest.update(b'map%d' % len(value))
+        for key in sorted(value.keys(), key=repr):
+            _update_hash(digest, key)
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        arr = np.asarray(value) if len(value) > 0 else None
+        if arr is not None and arr.dtype != object and arr.dtype.kind != 'U':
+            _update_hash(digest, arr)
+        else:
+            digest.update(b'seq%d' % len(value))
+            for item in value:
+                _update_hash(digest, item)
+    elif isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        digest.update(('arr%s%s' % (arr.dtype.str, arr.shape)).encode())
+        flat = arr.reshape(-1).view(np.uint8)
+        for start in range(0, len(flat), HASH_CHUNK_BYTES):
+            digest.update(flat[start:start + HASH_CHUNK_BYTES])
+    else:
+        digest.update(('%s:%r' % (type(value).__name__, value)).encode())
+
+@functools.lru_cache(maxsize=None)
+def _module_fingerprint(module_name:str):
+    """Hashes the source of a module so results of older code are never served
+    """
+    try:
+        source = inspect.getsource(sys.modules[module_name])
+    except (KeyError, OSError, TypeError):
+        return ''
+
+    return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+
+def hash_inputs(function_name:str, *values):
+    """Returns the hexadecimal key of a function name and any number of input values
+
+    Mappings (including collections), sequences, arrays and scalars are hashed by content.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    _update_hash(digest, function_name)
+    for value in values:
+        _update_hash(digest, value)
+
+    return digest.hexdigest()
+
+def enable(directory:str, max_bytes:int=DEFAULT_MAX_BYTES):
+    """Enables the cache in ``directory`` for every ``cached`` function
+
+    Returns
+    -------
+    result_cache : ResultCache
+        The enabled cache
+
+    """
+    global _active_cache
+    _active_cache = ResultCache(directory, max_bytes)
+
+    return _active_cache
+
+def disable():
+    """Disables the cache
+    """
+    global _active_cache
+    _active_cache = None
+
+@contextlib.contextmanager
+def caching(directory:str, max_bytes:int=DEFAULT_MAX_BYTES):
+    """Enables the cache inside a ``with`` block and restores the previous state afterwards
+    """
+    global _active_cache
+    previous_cache = _active_cache
+    try:
+        yield enable(directory, max_bytes)
+    finally:
+        _active_cache = previous_cache
+
+def cached(function):
+    """Decorator serving the results of ``function`` from the enabled cache
+
+    The key covers the function name, the source of its module and every argument after
+    defaults are applied. Without an enabled cache, or when an ``out`` buffer is passed, the
+    function is called directly.
+    """
+    signature = inspect.signature(function)
+    function_name = function.__module__ + '.' + function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _active_cache is None:
+            return function(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        if bound.arguments.get('out') is not None:
+            return function(*args, **kwargs)
+        bound.apply_defaults()
+        key = hash_inputs(function_name, _module_fingerprint(function.__module__), dict(bound.arguments))
+
+        found, result = _active_cache.get(key)
+        if not found:
+            result = function(*args, **kwargs)
+            _active_cache.put(key, result)
+
+        return result
+
+    return wrapper
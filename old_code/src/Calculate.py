@@ -3,37 +3,71 @@ Calculate
 ---------
 A class that contains all the methods used to analyze the pressure data
 
+``excess_path_length``, ``allan_variance`` and the correlation functions are served from the
+result cache of ``Cache`` when it is enabled, and every public function is timed by ``Instrument``
+while a recording is active
+
 Methods
 -------
-excess_path_length(data_collection, L_norm:float=2000, p_norm:float=1, L_norm_units:str='mm', p_norm_units:str='bar')
+excess_path_length(data_collection, L_norm:float=2000, p_norm:float=1, L_norm_units:str='mm', p_norm_units:str='bar',
+                   dtype=np.float64, out:numpy.ndarray=None)
     Calculates the excess path length values for all unique station pairs of the given pressure data collection
 
-allan_variance(data_collection:dict, allan_var_units:str='Phase')
+octave_lags(num_samples:int)
+    Returns the octave-spaced lags used by ``allan_variance(taus='octave')``
+
+allan_variance(data_collection:dict, allan_var_units:str='Phase', taus=None)
     Calculates the Allan variance values of the excess path length data collection
 
-cross_correlate(data_collection:dict, frequency_units:str='Hz')
+cross_spectra(data_collection:dict, pairs:str='all')
+    Calculates the cross-spectral matrix of the requested station pairs from one real FFT per station
+
+segmented_cross_spectra(data_collection:dict, segment_length:int, overlap:float=0.5, window='hann', pairs:str='all')
+    Calculates the segment-averaged (Welch) cross-spectra with memory bounded by the segment length
+
+log_bin(spectra:numpy.ndarray, sampling_frequency:float, n_fft:int=None, bins_per_octave:int=1)
+    Averages one or many spectra over logarithmically spaced frequency bins
+
+cross_correlate(data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1)
     Calculates the cross-correlation values for all unique station pairs of the given pressure data collection
 
-auto_correlate (data_collection:dict, frequency_units:str='Hz')
+auto_correlate (data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1)
     Calculates the auto-correlation values of all stations of the given pressure data collection
 
-correlate(data_collection:dict, frequency_units:str='Hz')
-    Calculates both the cross and auto-correlation using ``cross_correlate()`` and ``auto_correlate()``
+correlate(data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1,
+          segment_length:int=None, overlap:float=0.5, window='hann')
+    Calculates both the cross and auto-correlation from one cross-spectral matrix, optionally segment-averaged
+
+cross_spectrogram(data_collection:dict, segment_length:int, overlap:float=0.5, window='hann', average:int=1,
+                  bins_per_octave:int=4, frequency_units:str='Hz')
+    Calculates the log-binned cross-spectra, coherence and phase of every station pair in sliding windows
 
-full_data_processing(data_collection:dict, process_allan_var:bool)
-    Calculates the excess path length, Allan variance, and correlation all in one function
+full_data_processing(data_collection:dict, process_allan_var:bool=False, stages:list=None, ...)
+    Calculates the excess path length, Allan variance, and correlation in one pipeline sharing intermediate arrays
 
 """
 
+import logging
+import functools
+import tracemalloc
+
 import numpy as np
 
+import src.Cache as Cache
+import src.Instrument as Instrument
+
+logger = logging.getLogger(__name__)
+
+@Instrument.instrumented
+@Cache.cached
 def excess_path_length(data_collection:dict, L_norm:float=2000, p_norm:float=1,
-                       L_norm_units:str='mm', p_norm_units:str='bar'):
+                       L_norm_units:str='mm', p_norm_units:str='bar', dtype=np.float64, out:np.ndarray=None):
     """
     Parameters
     ----------
     data_collection : dict
-        A data collection of the pressures
+        A data collection of the pressures whose stations share the same ``times``
+        (see ``DataCollection.align_stations()`` for independently clocked stations)
 
     L_norm : float
         **Hey Karto! Please define in nice astronomy terms ^-^
@@ -50,6 +84,15 @@ def excess_path_length(data_collection:dict, L_norm:float=2000, p_norm:float=1,
     p_norm_units : str
         The unit of the p_norm variable
         (default ``bar``)
+
+    dtype : numpy.dtype
+        The floating point type of the excess path lengths, ``np.float32`` halves the memory of long captures
+        (default ``np.float64``)
+
+    out : numpy.ndarray
+        A (P, N) buffer of ``dtype`` reused for the P = S(S-1)/2 station pairs, e.g. the buffer of a
+        previous call; the arrays of the result are rows of this buffer
+        (default ``None`` - a new buffer is allocated)
     
 
     Returns
@@ -58,29 +101,193 @@ def excess_path_length(data_collection:dict, L_norm:float=2000, p_norm:float=1,
         A new data collection containing the excess path lengths derived from the pressure values
 
     """
-    excess_dict = {}
+    p_stack = _pressure_stack(data_collection, data_collection['specifications']['stations'], dtype)
+
+    return _excess_path_length_collection(data_collection, p_stack, L_norm, p_norm, L_norm_units, p_norm_units, out)
+
+def _excess_path_length_collection(data_collection:dict, p_stack:np.ndarray, L_norm:float, p_norm:float,
+                                   L_norm_units:str, p_norm_units:str, out:np.ndarray=None):
+    """Builds the excess path length data collection from the de-meaned pressures of ``_pressure_stack()``
+
+    Every pair difference is written straight into its row of one (P, N) buffer and the whole
+    buffer is scaled in place, so no per-pair temporaries are allocated.
+    """
     stations = data_collection['specifications']['stations']
-    for i in range(len(stations)):
-        for j in range(i+1, len(stations)):
-            
-            p_arr1 = np.array(data_collection['data'][stations[i]]['pressures']) - np.mean(data_collection['data'][stations[i]]['pressures'])
-            p_arr2 = np.array(data_collection['data'][stations[j]]['pressures']) - np.mean(data_collection['data'][stations[j]]['pressures'])
-
-            key = str(stations[i] + '-' + stations[j])
-            excess_dict[key] = np.array((p_arr1 - p_arr2) * (L_norm / p_norm))
-
-        excess_lengths = {}
-        excess_lengths['specifications'] = (data_collection['specifications']).copy()
-        excess_lengths['specifications']['units'] = {'L_norm':L_norm_units,
-                                               'p_norm':p_norm_units,
-                                               'times':data_collection['specifications']['units']['times'],
-                                               'pressures':data_collection['specifications']['units']['pressures']}
-        excess_lengths['excess_path_length'] = excess_dict
-        excess_lengths['times'] = data_collection['data'][stations[0]]['times']
+    rows, cols = _station_pairs(len(stations), 'cross')
+
+    if out is None:
+        out = np.empty((len(rows), p_stack.shape[1]), dtype=p_stack.dtype)
+    elif out.shape != (len(rows), p_stack.shape[1]):
+        raise ValueError('out must have shape %s, got %s' % ((len(rows), p_stack.shape[1]), out.shape))
+
+    for pair, (i, j) in enumerate(zip(rows, cols)):
+        with Instrument.span('excess_path_length.pair', pair=str(stations[i] + '-' + stations[j])):
+            np.subtract(p_stack[i], p_stack[j], out=out[pair])
+    out *= (L_norm / p_norm)
+
+    excess_dict = {str(stations[i] + '-' + stations[j]):out[pair] for pair, (i, j) in enumerate(zip(rows, cols))}
+
+    excess_lengths = {}
+    excess_lengths['specifications'] = (data_collection['specifications']).copy()
+    excess_lengths['specifications']['units'] = {'L_norm':L_norm_units,
+                                                 'p_norm':p_norm_units,
+                                                 'times':data_collection['specifications']['units']['times'],
+                                                 'pressures':data_collection['specifications']['units']['pressures']}
+    excess_lengths['excess_path_length'] = excess_dict
+    excess_lengths['times'] = data_collection['data'][stations[0]]['times']
 
     return excess_lengths
 
-def allan_variance(data_collection:dict, allan_var_units:str='Phase'):
+def octave_lags(num_samples:int):
+    """Returns the octave-spaced lags (1, 2, 4, ...) available for a record of ``num_samples`` samples
+
+    Parameters
+    ----------
+    num_samples : int
+        The number of samples in the excess path length record
+
+    Returns
+    -------
+    lags : numpy.ndarray
+        The lags in samples, limited to the range the overlapping estimator supports (``1 <= lag < num_samples//2``)
+
+    """
+    max_lag = num_samples//2 - 1
+    if max_lag < 1:
+        return np.zeros(0, dtype=np.int64)
+
+    return 2**np.arange(int(np.log2(max_lag)) + 1, dtype=np.int64)
+
+def _allan_variance_lags(phase:np.ndarray, lags:np.ndarray, delta_time:float):
+    """Evaluates the overlapping Allan variance of a phase record at the given lags
+
+    The second difference ``x[k] - 2x[k+m] + x[k+2m]`` is built in a single reusable
+    buffer and reduced with a dot product, so each lag costs O(N) without allocating
+    the three full-length temporaries of the original per-lag expression.
+
+    Parameters
+    ----------
+    phase : numpy.ndarray
+        The phase (excess path length) record
+
+    lags : numpy.ndarray
+        The lags in samples, each in the range ``1 <= lag < len(phase)//2``
+
+    delta_time : float
+        The sampling interval of the record
+
+    Returns
+    -------
+    allan_var : numpy.ndarray
+        The Allan variance at each lag
+
+    """
+    phase = np.asarray(phase, dtype=np.float64)
+    allan_var = np.zeros(len(lags))
+    buffer = np.empty(max(len(phase) - 2, 0))
+
+    for idx, lag in enumerate(lags):
+        lag = int(lag)
+        num_terms = len(phase) - 2*lag
+        second_diff = buffer[:num_terms]
+
+        np.multiply(phase[lag:lag + num_terms], -2.0, out=second_diff)
+        second_diff += phase[:num_terms]
+        second_diff += phase[2*lag:]
+
+        allan_var[idx] = np.dot(second_diff, second_diff) / num_terms / (2.0 * (lag * delta_time)**2)
+
+    return allan_var
+
+HEAD_PRODUCTS_LEAF = 256
+EVERY_LAG_RTOL = 1e-9
+
+def _correlation_fft(first:np.ndarray, second:np.ndarray, count:int):
+    """Returns ``sum_i first[i] * second[i + d]`` for the lags ``0 <= d < count`` by FFT
+    """
+    n_fft = 1 << int(np.ceil(np.log2(len(first) + len(second))))
+
+    return np.fft.irfft(np.conj(np.fft.rfft(first, n_fft)) * np.fft.rfft(second, n_fft), n_fft)[:count]
+
+def _head_products(first:np.ndarray, second:np.ndarray, count:int):
+    """Returns ``sum_{i<m} first[i] * second[i + m]`` for ``0 <= m < count``
+
+    The lags are split in halves: the upper half takes the terms of the whole lower half of
+    ``first`` from one FFT correlation and the rest from the same problem on shifted halves, so the
+    cost is O(count log^2 count). Small problems are summed directly over a strided view.
+    """
+    if count <= HEAD_PRODUCTS_LEAF:
+        products = np.lib.stride_tricks.sliding_window_view(second[:max(2*count - 1, 0)], count) * first[:count]
+        products[np.triu_indices(count)] = 0
+
+        return products.sum(axis=1)
+
+    half = count//2
+    heads = np.empty(count)
+    heads[:half] = _head_products(first, second, half)
+    heads[half:] = (_correlation_fft(first[:half], second[half:count + half - 1], count - half)
+                    + _head_products(first[half:], second[2*half:], count - half))
+
+    return heads
+
+def _allan_variance_every_lag(phase:np.ndarray, delta_time:float):
+    """Evaluates the overlapping Allan variance of a phase record at every lag from 1 to ``len(phase)//2 - 1``
+
+    The sum of squared second differences at lag m is expanded into prefix sums of ``x**2``, the
+    autocorrelation at lags m and 2m (one FFT for all lags) and the products ``x[i]*x[i+m]`` with
+    ``i < m`` at either end of the record (``_head_products()``), which costs O(N log^2 N) instead of
+    O(N) per lag. The record is detrended first, which leaves every second difference unchanged and
+    keeps the expanded terms small. Lags whose sum could have lost more than a relative
+    ``EVERY_LAG_RTOL`` to cancellation are evaluated directly with ``_allan_variance_lags()``.
+
+    Parameters
+    ----------
+    phase : numpy.ndarray
+        The phase (excess path length) record
+
+    delta_time : float
+        The sampling interval of the record
+
+    Returns
+    -------
+    allan_var : numpy.ndarray
+        The Allan variance at the lags 1, 2, ..., ``len(phase)//2 - 1``
+
+    """
+    phase = np.asarray(phase, dtype=np.float64)
+    num_samples = len(phase)
+    lags = np.arange(1, num_samples//2)
+    if len(lags) == 0:
+        return np.zeros(0)
+    if not np.all(np.isfinite(phase)):
+        return _allan_variance_lags(phase, lags, delta_time)
+
+    samples = np.arange(num_samples, dtype=np.float64)
+    x = phase - np.polyval(np.polyfit(samples, phase, 1), samples)
+
+    squares = np.concatenate([[0.0], np.cumsum(x * x)])
+    autocorrelation = _correlation_fft(x, x, num_samples)
+    heads = _head_products(x, x, len(lags) + 1)[1:]
+    tails = _head_products(x[::-1], x[::-1], len(lags) + 1)[1:]
+
+    num_terms = num_samples - 2*lags
+    second_diff_sum = (squares[num_terms] + 4*(squares[num_samples - lags] - squares[lags])
+                       + squares[num_samples] - squares[2*lags]
+                       - 4*(2*autocorrelation[lags] - heads - tails) + 2*autocorrelation[2*lags])
+
+    # FFT and prefix sum errors grow with the total power and log N rather than with each sum
+    error_bound = 256 * np.finfo(np.float64).eps * np.log2(num_samples) * squares[-1]
+    inexact = np.flatnonzero(np.abs(second_diff_sum) * EVERY_LAG_RTOL < error_bound)
+
+    allan_var = second_diff_sum / num_terms / (2.0 * (lags * delta_time)**2)
+    if len(inexact) > 0:
+        allan_var[inexact] = _allan_variance_lags(phase, lags[inexact], delta_time)
+
+    return allan_var
+
+@Instrument.instrumented
+@Cache.cached
+def allan_variance(data_collection:dict, allan_var_units:str='Phase', taus=None):
     """Calculates the Allan variance of the excess path lengths
     Parameters
     ----------
@@ -91,22 +298,42 @@ def allan_variance(data_collection:dict, allan_var_units:str='Phase'):
         The units of the Allan variance values
         (default ``Phase``)
 
+    taus : str or array_like
+        The averaging times at which the Allan variance is evaluated. ``None`` evaluates every lag
+        from 1 to N/2 in the original layout where the index of each value is its lag, in O(N log^2 N)
+        (see ``_allan_variance_every_lag()``). ``'octave'`` (the lags 1, 2, 4, ...) and an array of
+        averaging times (in the units of ``times``, rounded to the nearest whole lags) evaluate each
+        lag directly in O(N)
+        (default ``None``)
+
     Returns
     -------
     allan_var_dict : dict
         A new data_collection containing the Allan variance values
 
     """
-    t_arr = data_collection['times']
-    t_arr = np.mean(np.diff(t_arr))
+    t_arr = np.asarray(data_collection['times'])
+    t_arr = (t_arr[-1] - t_arr[0]) / (len(t_arr) - 1)
 
     bandwidths = {}
+    tau_arr = np.zeros(0)
     for key, value in data_collection['excess_path_length'].items():
-        allan_var = np.zeros(len(value))
-        print("Starting data collection for " + key)
-
-        for idx in range(1, len(value)//2):
-            allan_var[idx] = np.mean((value[:-2*idx] - 2*value[idx:-idx] + value[idx*2:])**2.0) / (2.0 * (idx * t_arr) **2)
+        logger.debug("Starting Allan variance for %s", key)
+
+        with Instrument.span('allan_variance.pair', pair=key):
+            if taus is None:
+                lags = np.arange(1, len(value)//2)
+                allan_var = np.zeros(len(value))
+                allan_var[lags] = _allan_variance_every_lag(value, t_arr)
+                tau_arr = t_arr * np.arange(len(value))
+            else:
+                if isinstance(taus, str) and taus == 'octave':
+                    lags = octave_lags(len(value))
+                else:
+                    lags = np.unique(np.rint(np.asarray(taus, dtype=np.float64) / t_arr).astype(np.int64))
+                    lags = lags[(lags >= 1) & (lags < len(value)//2)]
+                allan_var = _allan_variance_lags(value, lags, t_arr)
+                tau_arr = t_arr * lags
 
         bandwidths[key] = allan_var
     
@@ -116,11 +343,354 @@ def allan_variance(data_collection:dict, allan_var_units:str='Phase'):
                                                  'times':data_collection['specifications']['units']['times'],
                                                  'pressures':data_collection['specifications']['units']['pressures']}
     allan_var_dict['times'] = data_collection['times']
+    allan_var_dict['taus'] = tau_arr
     allan_var_dict['allan_var'] = bandwidths
 
     return allan_var_dict
 
-def cross_correlate(data_collection:dict, frequency_units:str='Hz'):
+def _pressure_stack(data_collection:dict, stations:list, dtype=np.float64):
+    """Stacks the de-meaned pressures of the given stations into a single (S, N) array
+
+    The means are taken in float64 and subtracted while casting, so a float32 stack keeps the
+    resolution of the pressure fluctuations rather than of the absolute pressure.
+    """
+    p_stack = np.empty((len(stations), len(data_collection['data'][stations[0]]['pressures'])), dtype=dtype)
+    for idx, station in enumerate(stations):
+        p_arr = np.asarray(data_collection['data'][station]['pressures'], dtype=np.float64)
+        np.subtract(p_arr, np.mean(p_arr), out=p_stack[idx], casting='same_kind')
+
+    return p_stack
+
+def _station_pairs(num_stations:int, pairs:str='all'):
+    """Returns the row and column indices of the requested station pairs
+
+    Parameters
+    ----------
+    num_stations : int
+        The number of stations
+
+    pairs : str
+        ``'cross'`` for the unique pairs of different stations, ``'auto'`` for each station with itself,
+        or ``'all'`` for both, cross pairs first
+        (default ``'all'``)
+
+    Returns
+    -------
+    rows, cols : numpy.ndarray
+        The station indices of each pair
+
+    """
+    cross_rows, cross_cols = np.triu_indices(num_stations, k=1)
+    auto_rows = auto_cols = np.arange(num_stations)
+
+    if pairs == 'cross':
+        return cross_rows, cross_cols
+    if pairs == 'auto':
+        return auto_rows, auto_cols
+
+    return np.concatenate((cross_rows, auto_rows)), np.concatenate((cross_cols, auto_cols))
+
+@Instrument.instrumented
+def cross_spectra(data_collection:dict, pairs:str='all', p_stack:np.ndarray=None):
+    """Calculates the cross-spectra of the requested station pairs from one real FFT per station
+
+    All station pressures are stacked into an (S, N) array and transformed with a single
+    ``rfft`` call. The cross-spectral matrix is then formed for every requested pair in one
+    vectorized product, keeping the first N/2 frequency bins as the original correlation did.
+
+    Parameters
+    ----------
+    data_collection : dict
+        A data collection of the pressures
+
+    pairs : str
+        ``'cross'``, ``'auto'`` or ``'all'`` station pairs (see ``_station_pairs``)
+        (default ``'all'``)
+
+    p_stack : numpy.ndarray
+        The de-meaned pressures of ``_pressure_stack()`` when they have already been computed
+        (default ``None``)
+
+    Returns
+    -------
+    keys : list
+        The ``station-station`` key of each pair
+
+    spectra : numpy.ndarray
+        A (P, N/2) complex array with the cross-spectrum of each pair
+
+    n_fft : int
+        The number of samples N of the transformed records
+
+    """
+    stations = data_collection['specifications']['stations']
+    p_stack = _pressure_stack(data_collection, stations) if p_stack is None else p_stack
+    num_freqs = p_stack.shape[1]//2
+
+    station_ffts = np.fft.rfft(p_stack, axis=1)[:, :num_freqs]
+    rows, cols = _station_pairs(len(stations), pairs)
+    spectra = station_ffts[rows] * np.conj(station_ffts[cols])
+
+    keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(rows, cols)]
+
+    return keys, spectra, p_stack.shape[1]
+
+def _segment_window(window, segment_length:int):
+    """Returns the taper applied to each segment
+
+    Parameters
+    ----------
+    window : str or array_like
+        One of ``'hann'``, ``'hamming'``, ``'blackman'``, ``'boxcar'``, or the window values themselves
+
+    segment_length : int
+        The number of samples in each segment
+
+    """
+    windows = {'hann':np.hanning, 'hamming':np.hamming, 'blackman':np.blackman, 'boxcar':np.ones}
+    if isinstance(window, str):
+        if window not in windows:
+            raise ValueError("Unknown window '%s', expected one of %s" % (window, list(windows.keys())))
+        return windows[window](segment_length)
+
+    window = np.asarray(window, dtype=np.float64)
+    if window.shape != (segment_length,):
+        raise ValueError('The window must have segment_length=%d values' % segment_length)
+
+    return window
+
+def _check_segment_length(segment_length, num_samples:int):
+    """Raises ``ValueError`` unless ``segment_length`` is a whole number of samples from 2 to ``num_samples``
+    """
+    if isinstance(segment_length, (bool, np.bool_)) or not isinstance(segment_length, (int, np.integer)):
+        raise ValueError('segment_length must be an integer number of samples, got %r' % (segment_length,))
+    if segment_length < 2:
+        raise ValueError('segment_length=%d must be at least 2 samples' % segment_length)
+    if segment_length > num_samples:
+        raise ValueError('segment_length=%d is longer than the record (%d samples)' % (segment_length, num_samples))
+
+def _add_segment_spectra(segment:np.ndarray, taper:np.ndarray, rows:np.ndarray, cols:np.ndarray, spectra:np.ndarray):
+    """De-means and tapers an (S, L) segment in place and adds its pair cross-spectra to ``spectra``
+    """
+    segment -= np.mean(segment, axis=1, keepdims=True)
+    segment *= taper
+
+    station_ffts = np.fft.rfft(segment, axis=1)[:, :spectra.shape[1]]
+    spectra += station_ffts[rows] * np.conj(station_ffts[cols])
+
+@Instrument.instrumented
+def segmented_cross_spectra(data_collection:dict, segment_length:int, overlap:float=0.5,
+                            window='hann', pairs:str='all'):
+    """Calculates the segment-averaged (Welch) cross-spectra of the requested station pairs
+
+    The pressures are processed one segment at a time: each segment of every station is
+    de-meaned, tapered and transformed with a single ``rfft`` call and its cross-spectra are
+    added to a running sum. Memory is therefore bounded by the segment length rather than
+    the record length.
+
+    Parameters
+    ----------
+    data_collection : dict
+        A data collection of the pressures
+
+    segment_length : int
+        The number of samples in each segment
+
+    overlap : float
+        The fraction of each segment shared with the next one, in the range [0, 1)
+        (default ``0.5``)
+
+    window : str or array_like
+        The taper applied to each segment (see ``_segment_window``)
+        (default ``'hann'``)
+
+    pairs : str
+        ``'cross'``, ``'auto'`` or ``'all'`` station pairs (see ``_station_pairs``)
+        (default ``'all'``)
+
+    Returns
+    -------
+    keys : list
+        The ``station-station`` key of each pair
+
+    spectra : numpy.ndarray
+        A (P, segment_length/2) complex array with the averaged cross-spectrum of each pair
+
+    n_fft : int
+        The number of samples in each transformed segment
+
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError('overlap must be in the range [0, 1)')
+
+    stations = data_collection['specifications']['stations']
+    station_pressures = [data_collection['data'][station]['pressures'] for station in stations]
+    num_samples = len(station_pressures[0])
+    _check_segment_length(segment_length, num_samples)
+
+    taper = _segment_window(window, segment_length)
+    step = max(1, int(segment_length * (1 - overlap)))
+    num_freqs = segment_length//2
+    rows, cols = _station_pairs(len(stations), pairs)
+
+    spectra = np.zeros((len(rows), num_freqs), dtype=np.complex128)
+    segment = np.empty((len(stations), segment_length))
+    num_segments = 0
+    for start in range(0, num_samples - segment_length + 1, step):
+        for idx, pressures in enumerate(station_pressures):
+            segment[idx] = pressures[start:start + segment_length]
+        _add_segment_spectra(segment, taper, rows, cols, spectra)
+        num_segments += 1
+
+    spectra /= num_segments
+    keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(rows, cols)]
+
+    return keys, spectra, segment_length
+
+def _segment_spectra_chunks(data_collection:dict, segment_length:int, step:int, window='hann', pairs:str='cross',
+                            bins:slice=None, max_chunk_bytes:int=2**26):
+    """Yields the cross-spectra of every segment of the record, a chunk of consecutive segments at a time
+
+    The segments of a chunk are zero-copy strided views of one contiguous block per station, and
+    every segment of every station in the chunk is transformed by a single batched ``rfft`` call.
+    ``max_chunk_bytes`` bounds the size of the tapered segments held at once.
+
+    Yields
+    ------
+    first_segment : int
+        The index of the first segment of the chunk; segment k starts at sample ``k*step``
+
+    spectra : numpy.ndarray
+        A (n, P, F) complex array with the cross-spectra of the n segments of the chunk, limited to the FFT ``bins``
+        (default the first ``segment_length//2`` bins)
+
+    """
+    stations = data_collection['specifications']['stations']
+    station_pressures = [data_collection['data'][station]['pressures'] for station in stations]
+    num_samples = len(station_pressures[0])
+    _check_segment_length(segment_length, num_samples)
+
+    taper = _segment_window(window, segment_length)
+    bins = slice(0, segment_length//2) if bins is None else bins
+    rows, cols = _station_pairs(len(stations), pairs)
+    num_segments = 1 + (num_samples - segment_length)//step
+    chunk_segments = max(1, max_chunk_bytes // (8 * len(stations) * segment_length))
+
+    for first in range(0, num_segments, chunk_segments):
+        last = min(first + chunk_segments, num_segments)
+        block = np.stack([np.asarray(pressures[first*step:(last - 1)*step + segment_length], dtype=np.float64)
+                          for pressures in station_pressures])
+        segments = np.lib.stride_tricks.sliding_window_view(block, segment_length, axis=1)[:, ::step]
+
+        tapered = segments - np.mean(segments, axis=2, keepdims=True)
+        tapered *= taper
+        station_ffts = np.fft.rfft(tapered, axis=2)[:, :, bins]
+
+        yield first, np.moveaxis(station_ffts[rows] * np.conj(station_ffts[cols]), 0, 1)
+
+@functools.lru_cache(maxsize=64)
+def _log_bin_index(n_fft:int, sampling_frequency:float, bins_per_octave:int):
+    """Builds the log-spaced bin index of a spectrum holding the first ``n_fft//2`` bins of an ``n_fft`` point FFT
+
+    The result is cached on the FFT length, sampling frequency and bins per octave so repeated
+    correlations of equally sized records share a single index. The arrays are read-only.
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        The first spectrum index of each bin
+
+    end : int
+        The index one past the last spectrum value that falls in a bin
+
+    counts : numpy.ndarray
+        The number of spectrum values averaged into each bin
+
+    frequencies : numpy.ndarray
+        The centre frequency of each bin
+
+    """
+    num_freqs = n_fft//2
+    num_octaves = int(np.ceil(np.log2(num_freqs))) if num_freqs > 0 else 0
+
+    edges = np.unique(np.floor(2.0**(np.arange(num_octaves*bins_per_octave + 1) / bins_per_octave)).astype(np.int64))
+    starts = edges[:-1][edges[:-1] < num_freqs]
+    nominal_ends = edges[1:len(starts) + 1]
+    end = min(int(nominal_ends[-1]), num_freqs) if len(starts) else 0
+    counts = np.diff(np.append(starts, end))
+    frequencies = (starts + nominal_ends) / 2 * sampling_frequency / n_fft
+
+    for arr in (starts, counts, frequencies):
+        arr.flags.writeable = False
+
+    return starts, end, counts, frequencies
+
+@Instrument.instrumented
+def log_bin(spectra:np.ndarray, sampling_frequency:float, n_fft:int=None, bins_per_octave:int=1):
+    """Averages spectra over logarithmically spaced frequency bins
+
+    With one bin per octave the bins are ``2**idx:2**(idx+1)``. Every row of ``spectra`` is
+    reduced in a single ``np.add.reduceat`` call using the cached index of ``_log_bin_index``.
+
+    Parameters
+    ----------
+    spectra : numpy.ndarray
+        A spectrum or a (P, F) array with one spectrum per row, holding the first F bins of the FFT
+
+    sampling_frequency : float
+        The sampling frequency of the transformed record
+
+    n_fft : int
+        The length of the transformed record
+        (default ``2*F``)
+
+    bins_per_octave : int
+        The number of bins in each octave
+        (default ``1``)
+
+    Returns
+    -------
+    frequencies : numpy.ndarray
+        The centre frequency of each bin
+
+    spectra_binned : numpy.ndarray
+        The spectra averaged over each bin, with the bins along the last axis
+
+    """
+    n_fft = 2*spectra.shape[-1] if n_fft is None else n_fft
+    starts, end, counts, frequencies = _log_bin_index(int(n_fft), float(sampling_frequency), int(bins_per_octave))
+
+    if len(starts) == 0:
+        return frequencies, np.zeros(spectra.shape[:-1] + (0,), dtype=spectra.dtype)
+
+    spectra_binned = np.add.reduceat(spectra[..., :end], starts, axis=-1) / counts
+
+    return frequencies, spectra_binned
+
+def _correlation_collection(data_collection:dict, keys:list, spectra:np.ndarray, frequency_units:str,
+                            n_fft:int=None, bins_per_octave:int=1):
+    """Log-bins the spectra of the given pairs and stores them in a correlation data collection
+    """
+    sampling_frequency = data_collection['specifications']['sampling_frequency']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm_spectra = spectra/abs(spectra)
+    frequencies, spectra_smooth = log_bin(spectra, sampling_frequency, n_fft, bins_per_octave)
+    frequencies, norm_spectra_smooth = log_bin(norm_spectra, sampling_frequency, n_fft, bins_per_octave)
+
+    correlate_dict = {}
+    correlate_dict['specifications'] = (data_collection['specifications']).copy()
+    correlate_dict['specifications']['units'] = {'pressures':data_collection['specifications']['units']['pressures'],
+                                                 'times':data_collection['specifications']['units']['times'],
+                                                 'frequency':frequency_units}
+    correlate_dict['frequencies'] = {key:frequencies for key in keys}
+    correlate_dict['correlation_norm'] = {key:norm_spectra_smooth[idx] for idx, key in enumerate(keys)}
+    correlate_dict['correlation'] = {key:spectra_smooth[idx] for idx, key in enumerate(keys)}
+
+    return correlate_dict
+
+@Instrument.instrumented
+@Cache.cached
+def cross_correlate(data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1):
     """Calculates the cross-correlation of each station in the data_collection
     Parameters
     ----------
@@ -131,60 +701,23 @@ def cross_correlate(data_collection:dict, frequency_units:str='Hz'):
         The frequency unit for the correlation
         (default ``Hz``)
 
+    bins_per_octave : int
+        The number of logarithmic frequency bins in each octave of the spectrum
+        (default ``1``)
+
     Returns
     -------
     correlate_dict : dict
         A new data_collection storing the cross-correlation data
         
     """
-    stations = data_collection['specifications']['stations']
-    correlate_dict = {}
-    pair_frequencies = {}
-    pair_norm_cross_smooth = {}
-    pair_cross_smooth = {}
-
-    for i in range(len(stations)):
-        for j in range(i+1, len(stations)):
-
-            station1 = data_collection['data'][stations[i]]['pressures']
-            station2 = data_collection['data'][stations[j]]['pressures']
-            station1 = (station1 - np.mean(station1))
-            station2 = (station2 - np.mean(station2))
-            
-            cross_12 = (np.fft.fft(station1) * np.conj(np.fft.fft(station2)))
-            cross_12 = cross_12[:int(len(station1)/2)]
-            norm_cross_12 = cross_12/abs(cross_12)
-            
-            num_bins = int(np.ceil(np.log2(len(cross_12))))
-            cross_12_smooth = np.zeros(num_bins, dtype=cross_12.dtype)
-            norm_cross_12_smooth = np.zeros(num_bins, dtype=norm_cross_12.dtype)
-            values = np.zeros(num_bins)
-            for idx in range(num_bins):
-                cross_12_smooth[idx] = np.mean(cross_12[2**(idx):2**(idx+1)])
-                norm_cross_12_smooth[idx] = np.mean(norm_cross_12[2**(idx):2**(idx+1)])
-                values[idx] = ((2**idx) + (2**(idx+1)))/2
-
-            samplingFrequency = data_collection['specifications']['sampling_frequency']
-            timePeriod  = len(cross_12)/samplingFrequency
-            frequencies = values/timePeriod
-        
-            key = str(stations[i] + '-' + stations[j])
-            
-            pair_frequencies[key] = frequencies
-            pair_cross_smooth[key] = norm_cross_12_smooth
-            pair_norm_cross_smooth[key] = norm_cross_12_smooth
+    keys, spectra, n_fft = cross_spectra(data_collection, 'cross')
 
-    correlate_dict['specifications'] = (data_collection['specifications']).copy()
-    correlate_dict['specifications']['units'] = {'pressures':data_collection['specifications']['units']['pressures'],
-                                                 'times':data_collection['specifications']['units']['times'],
-                                                 'frequency':frequency_units}
-    correlate_dict['frequencies'] = pair_frequencies
-    correlate_dict['correlation_norm'] = pair_norm_cross_smooth
-    correlate_dict['correlation'] = pair_cross_smooth
-    
-    return correlate_dict
+    return _correlation_collection(data_collection, keys, spectra, frequency_units, n_fft, bins_per_octave)
 
-def auto_correlate(data_collection:dict, frequency_units:str='Hz'):
+@Instrument.instrumented
+@Cache.cached
+def auto_correlate(data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1):
     """Calculates the auto-correlation of each station in the data_collection
     Parameters
     ----------
@@ -195,57 +728,30 @@ def auto_correlate(data_collection:dict, frequency_units:str='Hz'):
         The frequency unit for the correlation
         (default ``Hz``)
 
+    bins_per_octave : int
+        The number of logarithmic frequency bins in each octave of the spectrum
+        (default ``1``)
+
     Returns
     -------
     correlate_dict : dict
         A new data_collection storing the auto-correlation data
 
     """
-    stations = data_collection['specifications']['stations']
-    correlate_dict = {}
-    pair_frequencies = {}
-    pair_norm_cross_smooth = {}
-    pair_cross_smooth = {}
+    keys, spectra, n_fft = cross_spectra(data_collection, 'auto')
 
-    for i in range(len(stations)):
-        station1 = data_collection['data'][stations[i]]['pressures']
-        station1 = (station1 - np.mean(station1))
-        
-        cross_12 = (np.fft.fft(station1) * np.conj(np.fft.fft(station1)))
-        cross_12 = cross_12[:int(len(station1)/2)]
-        norm_cross_12 = cross_12/abs(cross_12)
-        
-        num_bins = int(np.ceil(np.log2(len(cross_12))))
-        cross_12_smooth = np.zeros(num_bins, dtype=cross_12.dtype)
-        norm_cross_12_smooth = np.zeros(num_bins, dtype=norm_cross_12.dtype)
-        values = np.zeros(num_bins)
-        for idx in range(num_bins):
-            cross_12_smooth[idx] = np.mean(cross_12[2**(idx):2**(idx+1)])
-            norm_cross_12_smooth[idx] = np.mean(norm_cross_12[2**(idx):2**(idx+1)])
-            values[idx] = ((2**idx) + (2**(idx+1)))/2
-
-        samplingFrequency = data_collection['specifications']['sampling_frequency']
-        timePeriod  = len(cross_12)/samplingFrequency
-        frequencies = values/timePeriod
-    
-        key = str(stations[i] + '-' + stations[i])
-        
-        pair_frequencies[key] = frequencies
-        pair_cross_smooth[key] = norm_cross_12_smooth
-        pair_norm_cross_smooth[key] = norm_cross_12_smooth
+    return _correlation_collection(data_collection, keys, spectra, frequency_units, n_fft, bins_per_octave)
 
-    correlate_dict['specifications'] = (data_collection['specifications']).copy()
-    correlate_dict['specifications']['units'] = {'pressures':data_collection['specifications']['units']['pressures'],
-                                                 'times':data_collection['specifications']['units']['times'],
-                                                 'frequency':frequency_units}
-    correlate_dict['frequencies'] = pair_frequencies
-    correlate_dict['correlation_norm'] = pair_norm_cross_smooth
-    correlate_dict['correlation'] = pair_cross_smooth
-    
-    return correlate_dict
-
-def correlate(data_collection:dict, frequency_units:str='Hz'):
+@Instrument.instrumented
+@Cache.cached
+def correlate(data_collection:dict, frequency_units:str='Hz', bins_per_octave:int=1,
+              segment_length:int=None, overlap:float=0.5, window='hann'):
     """Calculates both the cross and auto-correlation of each station in the data_collection
+
+    Every station is transformed once and the cross and auto spectra are taken from the
+    same cross-spectral matrix. Setting ``segment_length`` switches to the segmented (Welch)
+    mode of ``segmented_cross_spectra``, which bounds memory for long collections.
+
     Parameters
     ----------
     data_collection : dict
@@ -255,14 +761,43 @@ def correlate(data_collection:dict, frequency_units:str='Hz'):
         The frequency unit for the correlation
         (default ``Hz``)
 
+    bins_per_octave : int
+        The number of logarithmic frequency bins in each octave of the spectrum
+        (default ``1``)
+
+    segment_length : int
+        The number of samples in each averaged segment, from 2 to the length of the record, or ``None`` to
+        transform the whole record at once
+        (default ``None``)
+
+    overlap : float
+        The fraction of each segment shared with the next one in segmented mode
+        (default ``0.5``)
+
+    window : str or array_like
+        The taper applied to each segment in segmented mode
+        (default ``'hann'``)
+
     Returns
     -------
     correlate_dict : dict
         A new data_collection storing both the cross and auto-correlation data
         
     """
-    cross = cross_correlate(data_collection, frequency_units)
-    auto = auto_correlate(data_collection, frequency_units)
+    return _correlate_collection(data_collection, frequency_units, bins_per_octave, segment_length, overlap, window)
+
+def _correlate_collection(data_collection:dict, frequency_units:str, bins_per_octave:int,
+                          segment_length:int, overlap:float, window, p_stack:np.ndarray=None):
+    """Builds the combined cross and auto-correlation collection, reusing ``p_stack`` when given
+    """
+    if segment_length is None:
+        keys, spectra, n_fft = cross_spectra(data_collection, 'all', p_stack)
+    else:
+        keys, spectra, n_fft = segmented_cross_spectra(data_collection, segment_length, overlap, window, 'all')
+    num_cross = len(keys) - len(data_collection['specifications']['stations'])
+
+    cross = _correlation_collection(data_collection, keys[:num_cross], spectra[:num_cross], frequency_units, n_fft, bins_per_octave)
+    auto = _correlation_collection(data_collection, keys[num_cross:], spectra[num_cross:], frequency_units, n_fft, bins_per_octave)
 
     correlate = {}
     correlate['specifications'] = (cross['specifications']).copy()
@@ -271,9 +806,122 @@ def correlate(data_collection:dict, frequency_units:str='Hz'):
 
     return correlate
 
-def full_data_processing(data_collection:dict, process_allan_var:bool=False):
+@Instrument.instrumented
+@Cache.cached
+def cross_spectrogram(data_collection:dict, segment_length:int, overlap:float=0.5, window='hann',
+                      average:int=1, bins_per_octave:int=4, frequency_units:str='Hz'):
+    """Calculates the time evolution of the cross-spectra, coherence and phase of every station pair
+
+    The record is cut into overlapping segments taken as zero-copy strided views of the
+    pressures; every segment of every station in a chunk is transformed by one batched ``rfft``
+    and log-binned straight away, so memory is bounded by the chunk and the binned result.
+
+    Parameters
+    ----------
+    data_collection : dict
+        A data collection of the pressures whose stations share the same ``times``
+
+    segment_length : int
+        The number of samples in each segment
+
+    overlap : float
+        The fraction of each segment shared with the next one, in the range [0, 1)
+        (default ``0.5``)
+
+    window : str or array_like
+        The taper applied to each segment (see ``_segment_window``)
+        (default ``'hann'``)
+
+    average : int
+        The number of consecutive segments averaged into each time frame
+        (default ``1``)
+
+    bins_per_octave : int
+        The number of logarithmic frequency bins in each octave (see ``log_bin()``)
+        (default ``4``)
+
+    frequency_units : str
+        The frequency unit for the spectrogram
+        (default ``Hz``)
+
+    Returns
+    -------
+    spectrogram_dict : dict
+        A new data collection with ``times`` (T,) at the centre of each frame, ``frequencies`` (B,),
+        ``cross`` holding the complex ``spectrogram``, ``coherence`` and ``phase`` (radians) of each
+        station pair as (T, B) arrays and ``auto`` holding the power ``spectrogram`` of each station.
+        The coherence is only informative where a bin averages several segments or frequencies
+
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError('overlap must be in the range [0, 1)')
+    if average < 1:
+        raise ValueError('average must be at least 1')
+
+    specifications = data_collection['specifications']
+    stations = specifications['stations']
+    sampling_frequency = specifications['sampling_frequency']
+    step = max(1, int(segment_length * (1 - overlap)))
+
+    rows, cols = _station_pairs(len(stations), 'all')
+    keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(rows, cols)]
+    num_cross = len(keys) - len(stations)
+
+    binned_chunks = []
+    for _, spectra in _segment_spectra_chunks(data_collection, segment_length, step, window, 'all'):
+        frequencies, binned = log_bin(spectra, sampling_frequency, segment_length, bins_per_octave)
+        binned_chunks.append(binned)
+    binned = np.concatenate(binned_chunks)
+
+    num_frames = len(binned) // average
+    if num_frames == 0:
+        raise ValueError('The record holds fewer than average=%d segments' % average)
+    binned = binned[:num_frames*average].reshape(num_frames, average, len(keys), -1).mean(axis=1)
+
+    cross = binned[:, :num_cross]
+    auto = binned[:, num_cross:].real
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coherence = np.abs(cross)**2 / (auto[:, rows[:num_cross]] * auto[:, cols[:num_cross]])
+
+    frame_centre = ((average - 1) * step + segment_length) / 2
+    times = float(data_collection['data'][stations[0]]['times'][0]) + (np.arange(num_frames) * average * step + frame_centre) / sampling_frequency
+
+    spectrogram_dict = {}
+    spectrogram_dict['specifications'] = specifications.copy()
+    spectrogram_dict['specifications']['units'] = {'pressures':specifications['units']['pressures'],
+                                                   'times':specifications['units']['times'],
+                                                   'frequency':frequency_units}
+    spectrogram_dict['times'] = times
+    spectrogram_dict['frequencies'] = np.asarray(frequencies)
+    spectrogram_dict['cross'] = {'spectrogram':{key:cross[:, idx] for idx, key in enumerate(keys[:num_cross])},
+                                 'coherence':{key:coherence[:, idx] for idx, key in enumerate(keys[:num_cross])},
+                                 'phase':{key:np.angle(cross[:, idx]) for idx, key in enumerate(keys[:num_cross])}}
+    spectrogram_dict['auto'] = {'spectrogram':{key:auto[:, idx] for idx, key in enumerate(keys[num_cross:])}}
+
+    return spectrogram_dict
+
+def _run_stage(report:dict, stage:str, function, *args):
+    """Runs one stage of ``full_data_processing()`` and records its wall time and peak memory in ``report``
+    """
+    with Instrument.measure('full_data_processing.' + stage) as record:
+        result = function(*args)
+
+    report[stage] = {'seconds':record['wall_seconds'], 'peak_memory_bytes':record['peak_bytes']}
+
+    return result
+
+@Instrument.instrumented
+def full_data_processing(data_collection:dict, process_allan_var:bool=False, stages:list=None,
+                         L_norm:float=2000, p_norm:float=1, L_norm_units:str='mm', p_norm_units:str='bar',
+                         allan_var_units:str='Phase', taus=None, frequency_units:str='Hz',
+                         bins_per_octave:int=1, segment_length:int=None, overlap:float=0.5, window='hann'):
     """Fully processes the pressure data collection calculating the excess path length, Allan variance, and correlation.
 
+    The stations are de-meaned once into a single (S, N) array which is shared by the excess path
+    length and correlation stages; the Allan variance runs on the excess path lengths already in
+    memory and the cross and auto-correlation share one FFT per station. The wall time and peak
+    memory (as seen by ``tracemalloc``) of every stage are returned under ``report``.
+
     Parameters
     ----------
     data_collection : dict
@@ -281,7 +929,22 @@ def full_data_processing(data_collection:dict, process_allan_var:bool=False):
 
     process_allan_var : bool
         Setting this variable to ``False`` will cause the function to skip calculating the Allan variance
+        when ``stages`` is not given
         (default ``False``)
+
+    stages : list
+        The stages to run, any of ``'excess_path_length'``, ``'allan_variance'`` and ``'correlation'``.
+        The excess path length is always calculated when the Allan variance is requested
+        (default ``['excess_path_length', 'correlation']`` plus ``'allan_variance'`` if ``process_allan_var``)
+
+    L_norm, p_norm, L_norm_units, p_norm_units
+        Passed on to the excess path length stage (see ``excess_path_length()``)
+
+    allan_var_units, taus
+        Passed on to the Allan variance stage (see ``allan_variance()``)
+
+    frequency_units, bins_per_octave, segment_length, overlap, window
+        Passed on to the correlation stage (see ``correlate()``)
         
     Returns
     -------
@@ -289,4 +952,50 @@ def full_data_processing(data_collection:dict, process_allan_var:bool=False):
         A new data collection containing the pressure, excess path length, Allan variance, and correlation data
         (default Allan variance collection will be blank)
 
-    """
\ No newline at end of file
+    """
+    if stages is None:
+        stages = ['excess_path_length', 'correlation'] + (['allan_variance'] if process_allan_var else [])
+    unknown_stages = set(stages) - {'excess_path_length', 'allan_variance', 'correlation'}
+    if unknown_stages:
+        raise ValueError('Unknown stages %s' % sorted(unknown_stages))
+    if 'correlation' in stages and segment_length is not None:
+        stations = data_collection['specifications']['stations']
+        _check_segment_length(segment_length, len(data_collection['data'][stations[0]]['pressures']))
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+
+    try:
+        report = {}
+        full_collection = {'specifications':(data_collection['specifications']).copy(),
+                           'data':data_collection['data'],
+                           'excess_path_length':{},
+                           'allan_variance':{},
+                           'correlation':{}}
+
+        stations = data_collection['specifications']['stations']
+        needs_stack = ('excess_path_length' in stages or 'allan_variance' in stages
+                       or ('correlation' in stages and segment_length is None))
+        if needs_stack:
+            p_stack = _run_stage(report, 'demean', _pressure_stack, data_collection, stations)
+
+        if 'excess_path_length' in stages or 'allan_variance' in stages:
+            full_collection['excess_path_length'] = _run_stage(report, 'excess_path_length', _excess_path_length_collection,
+                                                               data_collection, p_stack, L_norm, p_norm, L_norm_units, p_norm_units)
+
+        if 'allan_variance' in stages:
+            full_collection['allan_variance'] = _run_stage(report, 'allan_variance', allan_variance,
+                                                           full_collection['excess_path_length'], allan_var_units, taus)
+
+        if 'correlation' in stages:
+            full_collection['correlation'] = _run_stage(report, 'correlation', _correlate_collection,
+                                                        data_collection, frequency_units, bins_per_octave,
+                                                        segment_length, overlap, window, p_stack if needs_stack else None)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    full_collection['report'] = report
+
+    return full_collection
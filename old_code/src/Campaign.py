@@ -0,0 +1,323 @@
+"""
+Campaign
+--------
+Resumable batch analysis of every collection of a campaign in parallel worker processes
+
+A campaign is a directory tree of collections (``filter5/``, ``filter6/``, ...) or a manifest listing
+them. Each worker is given only the path of a collection and opens it itself, so columnar
+collections are memory-mapped by the worker rather than pickled across processes, and only a small
+row of statistics is sent back. Every collection writes its derived data to ``<name>.pkl`` and then
+its row to ``<name>.json``; a collection whose row exists for the same input and parameters is
+skipped, so an interrupted campaign picks up where it stopped.
+
+Run from the ``old_code`` directory:
+```
+python -m src.Campaign /path/to/filter6/ --output /path/to/results/ --stages excess_path_length allan_variance --workers 8
+```
+
+Methods
+-------
+find_collections(path:str, exclude:list=None)
+    Returns the collections found in a directory tree or listed in a manifest file
+
+analyse_collection(collection_path:str, output_directory:str, stages:list=None, **processing_kwargs)
+    Processes one collection, writes its derived data and returns its row of statistics
+
+run_campaign(collection_paths:list, output_directory:str, stages:list=None, max_workers:int=None,
+             progress=print, **processing_kwargs)
+    Processes many collections in a process pool, skipping completed ones, and writes ``summary.csv``
+
+"""
+
+import os
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import src.Cache as Cache
+import src.DataCollection as Data
+
+DEFAULT_STAGES = ['excess_path_length', 'allan_variance', 'correlation']
+SUMMARY_FILE = 'summary.csv'
+
+def find_collections(path:str, exclude:list=None):
+    """Finds the collections of a campaign
+
+    Parameters
+    ----------
+    path : str
+        A directory searched recursively for collections of every storage format with
+        ``DataCollection.find_collections()``, or a manifest file with one collection path per line
+        (relative paths are relative to the manifest, blank lines and lines starting with ``#`` are ignored)
+
+    exclude : list
+        Directories which are not searched, e.g. the output directory when it lies below ``path``
+        (default ``None``)
+
+    Returns
+    -------
+    collection_paths : list
+        The sorted paths of the collections
+
+    """
+    if os.path.isfile(path) and not Data.is_collection(path):
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, 'r') as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+    return [collection_path for collection_path, _ in Data.find_collections(path, exclude)]
+
+def _input_fingerprint(collection_path:str):
+    """Returns the size and modification time of the files of a collection, which change whenever it is rewritten
+    """
+    file_paths = Data.collection_files(collection_path)
+
+    return [[os.path.basename(file_path), os.path.getsize(file_path), os.path.getmtime(file_path)] for file_path in file_paths]
+
+def _job_key(collection_path:str, stages:list, processing_kwargs:dict):
+    """Returns the key identifying one collection processed with one set of parameters
+    """
+    return Cache.hash_inputs('Campaign.analyse_collection', _input_fingerprint(collection_path),
+                             sorted(stages), processing_kwargs)
+
+def _statistics(data_collection, full_collection:dict):
+    """Returns the per-collection statistics of the summary table
+    """
+    specifications = data_collection['specifications']
+    stations = specifications['stations']
+    times = np.asarray(data_collection['data'][stations[0]]['times'])
+
+    filter_number = specifications.get('filter')
+    row = {'filter':filter_number.decode() if isinstance(filter_number, bytes) else filter_number,
+           'stations':' '.join(stations),
+           'sampling_frequency':specifications['sampling_frequency'],
+           'num_samples':len(times),
+           'duration':float(times[-1] - times[0]) if len(times) > 1 else 0.0}
+
+    for station in stations:
+        row['pressure_std_%s' % station] = float(np.std(data_collection['data'][station]['pressures']))
+
+    for pair, excess_length in full_collection['excess_path_length'].get('excess_path_length', {}).items():
+        row['excess_path_length_std_%s' % pair] = float(np.std(excess_length))
+
+    allan_var_dict = full_collection['allan_variance']
+    if allan_var_dict:
+        # The averaging time closest to one second summarises the short-term stability
+        taus = np.asarray(allan_var_dict['taus'])
+        idx = int(np.argmin(np.abs(taus - 1.0)))
+        row['allan_tau'] = float(taus[idx])
+        for pair, allan_var in allan_var_dict['allan_var'].items():
+            row['allan_var_%s' % pair] = float(allan_var[idx])
+
+    for stage, entry in full_collection['report'].items():
+        row['seconds_%s' % stage] = entry['seconds']
+
+    return row
+
+def analyse_collection(collection_path:str, output_directory:str, stages:list=None, name:str=None,
+                       **processing_kwargs):
+    """Processes one collection and writes its derived data and row of statistics
+
+    Parameters
+    ----------
+    collection_path : str
+        A pressure data collection in any format read by ``DataCollection.load_any()``
+
+    output_directory : str
+        The directory in which ``<name>.pkl`` holding the derived collections is written
+
+    stages : list
+        The ``Calculate.full_data_processing()`` stages to run
+        (default ``DEFAULT_STAGES``)
+
+    name : str
+        The file name prefix of the outputs
+        (default the base name of the collection)
+
+    **processing_kwargs
+        Passed on to ``Calculate.full_data_processing()``
+
+    Returns
+    -------
+    row : dict
+        The filter, stations, sampling frequency, number of samples and duration of the collection, the
+        standard deviation of every station's pressures and pair's excess path length, the Allan variance
+        of every pair at the averaging time closest to 1 s and the seconds spent in each stage
+
+    """
+    import src.Calculate as Calc
+
+    stages = DEFAULT_STAGES if stages is None else stages
+    name = Data.collection_name(collection_path) if name is None else name
+    start = time.perf_counter()
+
+    data_collection = Data.load_any(collection_path)
+    full_collection = Calc.full_data_processing(data_collection, stages=stages, **processing_kwargs)
+
+    derived = {key:full_collection[key] for key in ('specifications', 'excess_path_length', 'allan_variance',
+                                                    'correlation', 'report')}
+    derived['source'] = collection_path
+    _write_atomic(os.path.join(output_directory, name + '.pkl'), lambda file_path: Data.save(derived, file_path))
+
+    row = {'collection':name, 'path':collection_path}
+    row.update(_statistics(data_collection, full_collection))
+    row['seconds'] = time.perf_counter() - start
+
+    return row
+
+def _write_atomic(file_path:str, write):
+    """Writes a file under a temporary name and renames it, so an interrupted write never looks complete
+    """
+    temp_path = file_path + '.tmp'
+    write(temp_path)
+    os.replace(temp_path, file_path)
+
+def _run_job(collection_path:str, output_directory:str, stages:list, name:str, key:str, processing_kwargs:dict):
+    """Runs ``analyse_collection()`` in a worker and writes the completion record last
+    """
+    row = analyse_collection(collection_path, output_directory, stages, name, **processing_kwargs)
+
+    def write(file_path):
+        with open(file_path, 'w') as f:
+            json.dump({'key':key, 'row':row}, f, indent=4)
+    _write_atomic(os.path.join(output_directory, name + '.json'), write)
+
+    return row
+
+def _completed_row(output_directory:str, name:str, key:str):
+    """Returns the stored row of a completed collection, or ``None`` if it must be processed
+    """
+    try:
+        with open(os.path.join(output_directory, name + '.json'), 'r') as f:
+            record = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if record.get('key') != key or not os.path.exists(os.path.join(output_directory, name + '.pkl')):
+        return None
+
+    return record['row']
+
+def write_summary(rows:list, file_path:str):
+    """Writes the rows of statistics as one CSV table whose columns are the union of every row's keys
+    """
+    columns = []
+    for row in rows:
+        columns += [column for column in row if column not in columns]
+
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def run_campaign(collection_paths:list, output_directory:str, stages:list=None, max_workers:int=None,
+                 progress=print, root:str=None, **processing_kwargs):
+    """Processes the collections of a campaign in parallel worker processes
+
+    Parameters
+    ----------
+    collection_paths : list
+        The collections to process (see ``find_collections()``)
+
+    output_directory : str
+        The directory in which the derived data, the completion records and ``summary.csv`` are written
+        (created if it does not exist)
+
+    stages : list
+        The ``Calculate.full_data_processing()`` stages to run
+        (default ``DEFAULT_STAGES``)
+
+    max_workers : int
+        The number of collections processed at the same time
+        (default the number of CPUs)
+
+    progress : callable
+        Called with one line of text as each collection finishes, or ``None`` for no output
+        (default ``print``)
+
+    root : str
+        The directory the output names are made relative to, so ``filter5/x`` and ``filter6/x`` do not collide
+        (default only the base name of each collection is used)
+
+    **processing_kwargs
+        Passed on to ``Calculate.full_data_processing()`` (e.g. ``taus=None``, ``segment_length``)
+
+    Returns
+    -------
+    report : dict
+        ``{collection_path:{'row':dict, 'error':str, 'skipped':bool}}`` where ``error`` is ``None`` on success
+        and ``skipped`` marks collections completed by an earlier run
+
+    """
+    stages = DEFAULT_STAGES if stages is None else list(stages)
+    os.makedirs(output_directory, exist_ok=True)
+
+    report = {}
+    jobs = {}
+    for collection_path in collection_paths:
+        name = Data.collection_name(collection_path, root)
+        key = _job_key(collection_path, stages, processing_kwargs)
+        row = _completed_row(output_directory, name, key)
+        if row is not None:
+            report[collection_path] = {'row':row, 'error':None, 'skipped':True}
+        else:
+            jobs[collection_path] = (name, key)
+
+    if progress is not None and report:
+        progress('%d of %d collections already complete' % (len(report), len(collection_paths)))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_run_job, collection_path, output_directory, stages, name, key, processing_kwargs):collection_path
+                       for collection_path, (name, key) in jobs.items()}
+
+            for count, future in enumerate(as_completed(futures), start=1):
+                collection_path = futures[future]
+                try:
+                    report[collection_path] = {'row':future.result(), 'error':None, 'skipped':False}
+                except Exception as error:
+                    report[collection_path] = {'row':None, 'error':'%s: %s' % (type(error).__name__, error), 'skipped':False}
+
+                if progress is not None:
+                    entry = report[collection_path]
+                    status = ('ok (%.1f s)' % entry['row']['seconds']) if entry['error'] is None else 'FAILED (%s)' % entry['error']
+                    progress('[%d/%d] %s %s' % (count, len(jobs), collection_path, status))
+
+    rows = [report[path]['row'] for path in collection_paths if report[path]['row'] is not None]
+    write_summary(rows, os.path.join(output_directory, SUMMARY_FILE))
+
+    return report
+
+def main(argv:list=None):
+    """Command line entry point of ``run_campaign()``
+    """
+    parser = argparse.ArgumentParser(description='Process every collection of a MET4A campaign')
+    parser.add_argument('path', help='directory of collections or manifest file listing them')
+    parser.add_argument('--output', required=True, help='directory in which the results and summary.csv are written')
+    parser.add_argument('--stages', nargs='+', default=DEFAULT_STAGES, choices=DEFAULT_STAGES)
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default number of CPUs)')
+    parser.add_argument('--full-taus', action='store_true',
+                        help='evaluate the Allan variance at every averaging time instead of octave-spaced ones')
+    parser.add_argument('--segment-length', type=int, default=None, help='segment length of the averaged correlation')
+    args = parser.parse_args(argv)
+
+    processing_kwargs = {'segment_length':args.segment_length}
+    processing_kwargs['taus'] = None if args.full_taus else 'octave'
+
+    root = args.path if os.path.isdir(args.path) else None
+    report = run_campaign(find_collections(args.path, exclude=[args.output]), args.output, args.stages, args.workers, root=root,
+                          **processing_kwargs)
+    failures = [path for path, entry in report.items() if entry['error'] is not None]
+    skipped = [path for path, entry in report.items() if entry['skipped']]
+    print('%d collections processed, %d skipped, %d failed' % (len(report) - len(failures) - len(skipped),
+                                                               len(skipped), len(failures)))
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,445 @@
+"""
+Catalog
+-------
+A SQLite index of the collections of an archive
+
+Scanning an archive reads every collection once and records its filter number, kind (``lab`` or
+``field``, from its path), stations, sampling frequency, time span, number of samples and a
+fingerprint of its files. Only the headers and the first and last times of columnar directories,
+collection logs and compressed collections are read, and only the ends of their files are hashed. Rescans only read collections whose files changed size or modification
+time and drop collections that disappeared, so finding collections afterwards is a query of the
+index that never opens a data file. Collections that fail to load are recorded too and only
+retried once their files change.
+
+The ``duration`` of a collection runs from the first to the last sample of any station and its
+``overlap`` is the part of it recorded by every station.
+
+```
+with Catalog.Catalog('/path/to/catalog.sqlite') as catalog:
+    catalog.scan('/path/to/archive/')
+    rows = catalog.query(filter_number=6, kind='lab', station='orc', min_overlap=30*60)
+```
+
+Run from the ``old_code`` directory:
+```
+python -m src.Catalog catalog.sqlite scan /path/to/archive/
+python -m src.Catalog catalog.sqlite query --filter 6 --kind lab --station orc --min-overlap 1800
+```
+
+Methods
+-------
+find_collections(path:str)
+    Returns the collections of every storage format, including non-standard ones, in a directory tree
+
+collection_metadata(path:str, storage_format:str)
+    Returns the catalog entry of one collection
+
+Catalog(database_path:str)
+    The index with ``scan()``, ``query()``, ``get()`` and ``failures()``
+
+"""
+
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import src.DataCollection as Data
+
+KINDS = ['lab', 'field']
+FINGERPRINT_BYTES = 2**20
+DEFAULT_SCAN_WORKERS = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    format TEXT NOT NULL,
+    kind TEXT,
+    filter_number INTEGER,
+    stations TEXT NOT NULL,
+    sampling_frequency REAL,
+    t_start REAL,
+    t_end REAL,
+    duration REAL,
+    overlap REAL,
+    num_samples INTEGER,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    fingerprint TEXT NOT NULL,
+    scanned REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stations (
+    path TEXT NOT NULL REFERENCES collections(path) ON DELETE CASCADE,
+    station TEXT NOT NULL,
+    num_samples INTEGER,
+    t_start REAL,
+    t_end REAL,
+    PRIMARY KEY (path, station)
+);
+CREATE TABLE IF NOT EXISTS failures (
+    path TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    error TEXT NOT NULL,
+    scanned REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS collections_filter ON collections(filter_number, kind, duration);
+CREATE INDEX IF NOT EXISTS stations_station ON stations(station, path);
+"""
+
+def find_collections(path:str):
+    """Finds every collection in a directory tree (see ``DataCollection.find_collections()``)
+
+    Parameters
+    ----------
+    path : str
+        The root directory of the archive
+
+    Returns
+    -------
+    collections : list
+        ``(path, storage_format)`` pairs sorted by path, where ``storage_format`` is ``'columnar'``,
+        ``'chunked'``, ``'compressed'``, ``'pickle'`` or ``'old'``
+
+    """
+    return Data.find_collections(path)
+
+def _file_state(file_paths:list):
+    """Returns the total size and latest modification time of the files, which change whenever a collection is rewritten
+    """
+    stats = [os.stat(file_path) for file_path in file_paths]
+
+    return sum(stat.st_size for stat in stats), max(stat.st_mtime for stat in stats)
+
+def _fingerprint(file_paths:list):
+    """Hashes the names, sizes and first and last ``FINGERPRINT_BYTES`` of the files of a collection
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            digest.update(('%s:%d' % (os.path.basename(file_path), file_size)).encode())
+            digest.update(f.read(FINGERPRINT_BYTES))
+            if file_size > 2*FINGERPRINT_BYTES:
+                f.seek(-FINGERPRINT_BYTES, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_BYTES))
+
+    return digest.hexdigest()
+
+def _filter_number(specifications:dict, path:str):
+    """Returns the filter number from ``specifications['filter']`` (e.g. ``b'IA=6'``), or from a ``filter6`` directory in the path
+    """
+    filter_setting = specifications.get('filter')
+    if isinstance(filter_setting, bytes):
+        filter_setting = filter_setting.decode('latin-1')
+    match = re.search(r'(\d+)', str(filter_setting)) if filter_setting is not None else None
+    if match is None:
+        match = re.search(r'filter_?(\d+)', path, re.IGNORECASE)
+
+    return int(match.group(1)) if match is not None else None
+
+def _kind(path:str):
+    """Returns ``'lab'`` or ``'field'`` when the path names exactly one of them (e.g. ``synced_jul19_lab``, ``Lab_Experiments``)
+    """
+    words = set(re.split(r'[^a-z]+', path.lower()))
+    kinds = [kind for kind in KINDS if kind in words or kind + 's' in words]
+
+    return kinds[0] if len(kinds) == 1 else None
+
+def collection_metadata(path:str, storage_format:str):
+    """Reads the catalog entry of one collection
+
+    Only the parts of a collection giving its specifications and the span of every station are read
+    (see ``DataCollection.collection_spans()``); pickle files and non-standard collections are loaded once.
+
+    Parameters
+    ----------
+    path : str
+        The collection as returned by ``find_collections()``
+
+    storage_format : str
+        ``'columnar'``, ``'chunked'``, ``'compressed'``, ``'pickle'`` or ``'old'``
+
+    Returns
+    -------
+    entry : dict
+        The columns of the ``collections`` table and ``'stations'`` as ``{station:(num_samples, t_start, t_end)}``.
+        ``t_start``, ``t_end`` and ``duration`` span the samples of every station and ``overlap`` is the
+        time recorded by all of them
+
+    """
+    specifications, stations = Data.collection_spans(path)
+    spans = [span for span in stations.values() if span[0] > 0]
+    t_start = min(span[1] for span in spans) if spans else None
+    t_end = max(span[2] for span in spans) if spans else None
+    overlap = (min(span[2] for span in spans) - max(span[1] for span in spans)) if spans else 0.0
+    file_paths = Data.collection_files(path)
+    size, mtime = _file_state(file_paths)
+
+    return {'path':path,
+            'name':Data.collection_name(path),
+            'format':storage_format,
+            'kind':_kind(path),
+            'filter_number':_filter_number(specifications, path),
+            'stations':stations,
+            'sampling_frequency':specifications.get('sampling_frequency'),
+            't_start':t_start,
+            't_end':t_end,
+            'duration':(t_end - t_start) if spans and t_end > t_start else 0.0,
+            'overlap':max(overlap, 0.0) if len(spans) == len(stations) else 0.0,
+            'num_samples':min(span[0] for span in stations.values()) if stations else 0,
+            'size':size,
+            'mtime':mtime,
+            'fingerprint':_fingerprint(file_paths)}
+
+class Catalog:
+    """The SQLite index of the collections of one or more archives
+
+    Parameters
+    ----------
+    database_path : str
+        The SQLite file of the index (created if it does not exist)
+
+    """
+    def __init__(self, database_path:str):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _store(self, entry:dict):
+        """Inserts or replaces the rows of one collection
+        """
+        columns = [column for column in entry if column != 'stations'] + ['scanned']
+        values = [entry[column] for column in columns[:-1]] + [time.time()]
+        with self.connection:
+            self.connection.execute('DELETE FROM failures WHERE path = ?', (entry['path'],))
+            self.connection.execute('DELETE FROM collections WHERE path = ?', (entry['path'],))
+            self.connection.execute('INSERT INTO collections (%s, stations) VALUES (%s, ?)'
+                                    % (', '.join(columns), ', '.join('?' * len(columns))),
+                                    values + [' '.join(entry['stations'])])
+            self.connection.executemany('INSERT INTO stations (path, station, num_samples, t_start, t_end) VALUES (?, ?, ?, ?, ?)',
+                                        [(entry['path'], station) + span for station, span in entry['stations'].items()])
+
+    def _store_failure(self, path:str, storage_format:str, state:tuple, error:str):
+        """Records a collection which failed to load with the size and modification time of its files
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM collections WHERE path = ?', (path,))
+            self.connection.execute('INSERT OR REPLACE INTO failures (path, format, size, mtime, error, scanned) VALUES (?, ?, ?, ?, ?, ?)',
+                                    (path, storage_format) + tuple(state) + (error, time.time()))
+
+    def scan(self, path:str, max_workers:int=DEFAULT_SCAN_WORKERS, progress=None):
+        """Indexes the collections of an archive, reading only new and changed ones
+
+        Parameters
+        ----------
+        path : str
+            The root directory of the archive
+
+        max_workers : int
+            The number of collections read at the same time; each may hold a whole pickle collection in memory
+            (default ``4``)
+
+        progress : callable
+            Called with one line of text per collection read, or ``None`` for no output
+            (default ``None``)
+
+        Returns
+        -------
+        counts : dict
+            The number of ``'added'``, ``'updated'``, ``'unchanged'``, ``'removed'`` and ``'failed'`` collections,
+            and of ``'skipped'`` collections which failed before and have not changed since
+
+        """
+        root = os.path.abspath(path)
+        found = [(os.path.abspath(collection_path), storage_format) for collection_path, storage_format in find_collections(root)]
+        known = {row['path']:(row['size'], row['mtime'])
+                 for row in self.connection.execute("SELECT path, size, mtime FROM collections WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                                                    (root, _like_prefix(root)))}
+
+        known_failures = {row['path']:(row['size'], row['mtime'])
+                          for row in self.connection.execute("SELECT path, size, mtime FROM failures WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                                                             (root, _like_prefix(root)))}
+
+        counts = {'added':0, 'updated':0, 'unchanged':0, 'removed':0, 'failed':0, 'skipped':0}
+        changed = []
+        for collection_path, storage_format in found:
+            try:
+                state = _file_state(Data.collection_files(collection_path))
+            except OSError:
+                counts['failed'] += 1
+                continue
+            if known.get(collection_path) == state:
+                counts['unchanged'] += 1
+            elif known_failures.get(collection_path) == state:
+                counts['skipped'] += 1
+            else:
+                changed.append((collection_path, storage_format, state))
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [(collection_path, storage_format, state, executor.submit(collection_metadata, collection_path, storage_format))
+                       for collection_path, storage_format, state in changed]
+            for collection_path, storage_format, state, future in futures:
+                try:
+                    self._store(future.result())
+                    counts['updated' if collection_path in known else 'added'] += 1
+                    status = 'ok'
+                except Exception as error:
+                    counts['failed'] += 1
+                    status = 'FAILED (%s: %s)' % (type(error).__name__, error)
+                    self._store_failure(collection_path, storage_format, state, status[len('FAILED ('):-1])
+                if progress is not None:
+                    progress('%s %s' % (collection_path, status))
+
+        found_paths = {collection_path for collection_path, _ in found}
+        removed = set(known) - found_paths
+        with self.connection:
+            self.connection.executemany('DELETE FROM collections WHERE path = ?', [(removed_path,) for removed_path in removed])
+            self.connection.executemany('DELETE FROM failures WHERE path = ?',
+                                        [(removed_path,) for removed_path in set(known_failures) - found_paths])
+        counts['removed'] = len(removed)
+
+        return counts
+
+    def query(self, filter_number:int=None, kind:str=None, station=None, min_duration:float=None,
+              max_duration:float=None, sampling_frequency:float=None, name:str=None, storage_format:str=None,
+              min_overlap:float=None):
+        """Finds the collections matching every given criterion
+
+        Parameters
+        ----------
+        filter_number : int
+            The filter setting, e.g. ``6`` for ``b'IA=6'``
+
+        kind : str
+            ``'lab'`` or ``'field'``
+
+        station : str or list
+            One or more stations which must all be present
+
+        min_duration, max_duration : float
+            The bounds of the duration of the collection, from the first to the last sample of any station,
+            in the units of ``times``
+
+        sampling_frequency : float
+            The sampling frequency
+
+        name : str
+            A SQL ``LIKE`` pattern of the collection name, e.g. ``'%jul25%'``
+
+        storage_format : str
+            ``'columnar'``, ``'chunked'``, ``'compressed'``, ``'pickle'`` or ``'old'``
+
+        min_overlap : float
+            The shortest time recorded by every station of the collection, in the units of ``times``
+
+        Returns
+        -------
+        rows : list
+            One dictionary of the ``collections`` columns per collection, sorted by path, with ``stations`` as a list
+
+        """
+        conditions, values = [], []
+        for column, operator, value in [('filter_number', '=', filter_number), ('kind', '=', kind),
+                                        ('duration', '>=', min_duration), ('duration', '<=', max_duration),
+                                        ('sampling_frequency', '=', sampling_frequency), ('name', 'LIKE', name),
+                                        ('format', '=', storage_format), ('overlap', '>=', min_overlap)]:
+            if value is not None:
+                conditions.append('%s %s ?' % (column, operator))
+                values.append(value)
+
+        stations = [station] if isinstance(station, str) else list(station or [])
+        for station_name in stations:
+            conditions.append('path IN (SELECT path FROM stations WHERE station = ?)')
+            values.append(station_name)
+
+        sql = 'SELECT * FROM collections'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        return [_row_dict(row) for row in self.connection.execute(sql + ' ORDER BY path', values)]
+
+    def get(self, path:str):
+        """Returns the entry of one collection, or ``None`` if it is not indexed
+        """
+        row = self.connection.execute('SELECT * FROM collections WHERE path = ?', (os.path.abspath(path),)).fetchone()
+
+        return _row_dict(row) if row is not None else None
+
+    def failures(self):
+        """Returns the collections which failed to load, with their ``path``, ``format``, ``size``, ``mtime`` and ``error``
+        """
+        return [dict(row) for row in self.connection.execute('SELECT * FROM failures ORDER BY path')]
+
+def _like_prefix(directory:str):
+    """Returns a ``LIKE`` pattern matching every path below a directory
+    """
+    escaped = directory.rstrip(os.sep).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    return escaped + os.sep + '%'
+
+def _row_dict(row:sqlite3.Row):
+    entry = dict(row)
+    entry['stations'] = entry['stations'].split()
+
+    return entry
+
+def main(argv:list=None):
+    """Command line entry point of ``Catalog.scan()`` and ``Catalog.query()``
+    """
+    parser = argparse.ArgumentParser(description='Index and search MET4A collections')
+    parser.add_argument('database', help='SQLite file of the catalog')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = commands.add_parser('scan', help='index the collections of an archive')
+    scan_parser.add_argument('path', help='root directory of the archive')
+    scan_parser.add_argument('--workers', type=int, default=DEFAULT_SCAN_WORKERS,
+                             help='number of collections read at the same time (default %d)' % DEFAULT_SCAN_WORKERS)
+
+    query_parser = commands.add_parser('query', help='list the matching collections')
+    query_parser.add_argument('--filter', type=int, default=None, dest='filter_number')
+    query_parser.add_argument('--kind', choices=KINDS, default=None)
+    query_parser.add_argument('--station', nargs='+', default=None)
+    query_parser.add_argument('--min-duration', type=float, default=None)
+    query_parser.add_argument('--max-duration', type=float, default=None)
+    query_parser.add_argument('--min-overlap', type=float, default=None, help='shortest time recorded by every station')
+    query_parser.add_argument('--name', default=None, help='SQL LIKE pattern of the collection name')
+    query_parser.add_argument('--json', action='store_true', help='print the full entries as JSON')
+    args = parser.parse_args(argv)
+
+    with Catalog(args.database) as catalog:
+        if args.command == 'scan':
+            counts = catalog.scan(args.path, args.workers, progress=print)
+            print(', '.join('%d %s' % (count, status) for status, count in counts.items()))
+            return 1 if counts['failed'] else 0
+
+        rows = catalog.query(args.filter_number, args.kind, args.station, args.min_duration, args.max_duration,
+                             name=args.name, min_overlap=args.min_overlap)
+        if args.json:
+            print(json.dumps(rows, indent=4))
+        else:
+            for row in rows:
+                print('%s\tfilter %s\t%s\t%.0f s\t%s' % (row['path'], row['filter_number'], row['kind'],
+                                                         row['duration'] or 0.0, ' '.join(row['stations'])))
+
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -51,6 +51,7 @@ standard_allan_variance = {'specifications': {'filter_number':b'IA=%d',
                                               'sampling_frequency':int
                                              },
                            'times':{'station_pair':[]},
+                           'taus':[],
                            'allan_var':{'station_pair':[]}
                           }
 ```
@@ -75,13 +76,25 @@ standard_correlation = {'specifications': {'filter_number':b'IA=%d',
                        }
 ```
 
+```
+standard_spectrogram = {'specifications': {... 'units': {'pressures':str, 'times':str, 'frequency':str='Hz'} ...},
+                        'times':[],
+                        'frequencies':[],
+                        'cross':{'spectrogram':{'station_pairs':[[]]},
+                                 'coherence':{'station_pairs':[[]]},
+                                 'phase':{'station_pairs':[[]]}
+                                },
+                        'auto':{'spectrogram':{'station_pairs':[[]]}}
+                       }
+```
+
 
 Methods
 -------
 load(collection_path:str)
     Returns the specified pickle file containing a data collection in standard format
 
-load_old(path:str, collection_name:str)
+load_old(path:str, collection_name:str, max_workers:int=None)
     Returns the specified pickle file containing a data collection in non-standard format
 
 get_filter(data_dict:dict)
@@ -92,20 +105,89 @@ get_filter_old(data_dict:dict)
 
 reformat_pressure_dict(path:str, collection_name:str,
                        station_names:list=['dol', 'ott', 'sea', 'orc'],
-                       pressure_units:str='bar', time_units:str='sec')
+                       pressure_units:str='bar', time_units:str='sec',
+                       sampling_frequency:int=625, max_workers:int=None)
     Returns a pressure data collection in standard format
 
 reformat_allan_var_dict(path:str, collection_name:str,
                         station_names:list=['dol', 'ott', 'sea', 'orc'])
     Returns the Allan variance data collection in standard format
 
+estimate_clock_offsets(data_collection:dict, reference:str=None, max_offset:float=1.0, estimation_samples:int=2**18)
+    Returns the clock offset of every station relative to a reference station, estimated by FFT cross-correlation
+
+align_stations(data_collection:dict, offsets:dict=None, reference:str=None, sampling_frequency:float=None, ...)
+    Returns a pressure data collection resampled onto one uniform time grid shared by all stations
+
 save(data_dict:dict, file_path:str)
     Stores the data collection as a pickle file in the specified path
 
+save_columnar(data_dict:dict, directory:str)
+    Stores a pressure data collection in standard format as a columnar directory of ``.npy`` arrays
+
+load_columnar(directory:str, mmap:bool=True)
+    Returns a pressure data collection in standard format whose arrays are memory-mapped from a columnar directory
+
+convert_to_columnar(collection_path:str, directory:str)
+    Converts a pickled data collection in standard format into a columnar directory
+
+convert_old_to_columnar(path:str, collection_name:str, directory:str, **kwargs)
+    Converts a data collection in non-standard format into a columnar directory
+
+open_collection(directory:str)
+    Returns a ``LazyCollection`` of a columnar directory which loads station arrays on first access
+
+LazyCollection
+    A read-only standard format collection supporting ``.window(t_start, t_end)`` and ``.stations([...])`` selectors
+
+ChunkedCollectionWriter(file_path:str, specifications:dict=None)
+    Appends fixed-size chunks of station pressures and times to an append-only collection log
+
+load_chunked(file_path:str)
+    Returns the chunks of a collection log as one pressure data collection in standard format
+
+save_compressed(data_dict:dict, file_path:str, chunk_size:int=CODEC_CHUNK_SAMPLES, level:int=6)
+    Stores a pressure data collection in standard format with a compact lossless encoding
+
+load_compressed(file_path:str, max_workers:int=None)
+    Returns a pressure data collection stored by ``save_compressed()``
+
+collection_spans(path:str)
+    Returns the specifications and the number of samples, first and last time of every station, reading as little as possible
+
+collection_name(collection_path:str, root:str=None)
+    Returns the name of a collection used as the prefix of the files derived from it
+
+find_collections(path:str, exclude:list=None)
+    Returns the collections of every storage format, including non-standard ones, in a directory tree
+
+collection_files(path:str)
+    Returns the files holding a collection
+
+is_collection(path:str)
+    Returns whether a path holds a collection readable by ``load_any()``
+
+load_any(path:str)
+    Returns a data collection stored as a pickle file, a columnar directory, a collection log or a compressed file
+
 """
 
+import os
+import json
+import zlib
+import struct
 import pickle
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
+import src.Instrument as Instrument
+
+COLUMNAR_SPECIFICATIONS = 'specifications.json'
+OLD_STATION_PREFIXES = ['dolphin_', 'otter_', 'seal_', 'orca_']
+
+@Instrument.instrumented
 def load(collection_path:str):
     """Retrieves and loads a pickle file of the collection into a dictionary
     
@@ -123,36 +205,51 @@ def load(collection_path:str):
     with open(collection_path, "rb") as f:
         return pickle.load(f)        
 
-def load_old(path:str, collection_name:str):
+def _load_old_station(file_path:str):
+    """Loads the pickle file of one station in non-standard format and converts its data to contiguous float64 arrays
+    """
+    with open(file_path, "rb") as f:
+        station_dict = pickle.load(f)
+
+    for filter_num in station_dict.keys():
+        for quantity in ('pressures', 'times'):
+            station_dict[filter_num][quantity] = np.ascontiguousarray(station_dict[filter_num][quantity], dtype=np.float64)
+
+    return station_dict
+
+@Instrument.instrumented
+def load_old(path:str, collection_name:str, max_workers:int=None):
     """Retrieves and loads a specific pickle files of a collection before 2024 into a dictionary
+
+    The per-station files are loaded concurrently and their pressures and times are converted
+    once to contiguous float64 arrays.
     
     Parameters
     ----------
     path : str
-        The path to the directory in which the data collection is stored
+        The path prefix of the station files, i.e. the directory in which the data collection
+        is stored including its trailing separator
 
     collection_name : str
         The path where the pickle file is stored
 
+    max_workers : int
+        The number of station files loaded at the same time
+        (default one per station)
+
     Returns
     -------
     data_dict : dict
         A dictionary containing all the data collection
 
     """
-    data_dict = {}
-    sea_mammals = ['dolphin', 'otter', 'seal', 'orca']
+    file_paths = [path + prefix + collection_name for prefix in OLD_STATION_PREFIXES]
 
-    for idx in range(len(sea_mammals)):
+    max_workers = len(OLD_STATION_PREFIXES) if max_workers is None else max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        station_dicts = list(executor.map(_load_old_station, file_paths))
 
-        dictionary_name = 'data_dict_' + (sea_mammals[idx])[0:3]
-        pickle_file_name = sea_mammals[idx] + '_' + collection_name
-
-        with open(path + pickle_file_name, "rb") as f:
-            dictionary_name = pickle.load(f)
-        data_dict[idx] = (dictionary_name)
-
-    return data_dict
+    return dict(enumerate(station_dicts))
 
 def get_filter(data_dict:dict):
     """Retrieves the filter setting of the data collection
@@ -194,10 +291,11 @@ def get_filter_old(data_dict:dict):
 
     return filter_number
 
+@Instrument.instrumented
 def reformat_pressure_dict(path:str, collection_name:str,
              station_names:list=['dol', 'ott', 'sea', 'orc'],
              pressure_units:str='bar', time_units:str='sec',
-             sampling_frequency:int=625):
+             sampling_frequency:int=625, max_workers:int=None):
     """Reformats pressure data collections before 2024 into new standard collection format
     
     Parameters
@@ -218,13 +316,21 @@ def reformat_pressure_dict(path:str, collection_name:str,
         The unit of time in which old_collection was taken
         (default 'sec')
 
+    sampling_frequency : int
+        The sampling frequency at which old_collection was taken
+        (default 625)
+
+    max_workers : int
+        The number of station files loaded at the same time (see ``load_old()``)
+        (default one per station)
+
     Returns
     -------
     data_dict : dict
         The reformatted dictionary containing the entire collection
 
     """
-    old_collection = load_old(path, collection_name)
+    old_collection = load_old(path, collection_name, max_workers)
     filter_num = get_filter_old(old_collection)
 
     new_dict = {}
@@ -254,6 +360,169 @@ def reformat_allan_var_dict(path:str, collection_name:str,
     """Reformats old Allan_variance
     """
 
+def _overlap(data_collection:dict, stations:list, offsets:dict):
+    """Returns the first and last time, in the clock of the reference, covered by every station
+    """
+    t_start = max(float(data_collection['data'][station]['times'][0]) - offsets[station] for station in stations)
+    t_end = min(float(data_collection['data'][station]['times'][-1]) - offsets[station] for station in stations)
+    if t_end <= t_start:
+        raise ValueError('The stations do not overlap in time')
+
+    return t_start, t_end
+
+def _resample(times:np.ndarray, pressures:np.ndarray, grid:np.ndarray, offset:float, out:np.ndarray):
+    """Linearly interpolates one chunk of a station onto ``grid``, which is in the clock of the reference
+
+    Only the samples spanning the chunk are passed to ``np.interp``, so memory-mapped stations are read once.
+    """
+    start = max(int(np.searchsorted(times, grid[0] + offset, side='right')) - 1, 0)
+    stop = min(int(np.searchsorted(times, grid[-1] + offset, side='left')) + 1, len(times))
+    out[:] = np.interp(grid + offset, times[start:stop], pressures[start:stop])
+
+def estimate_clock_offsets(data_collection:dict, reference:str=None, max_offset:float=1.0,
+                           estimation_samples:int=2**18):
+    """Estimates the clock offset of every station relative to a reference station
+
+    Every station is first resampled on its own clock onto the nominal sampling grid over a window of
+    ``estimation_samples`` in the middle of the record. The windows of all stations are transformed
+    with one batched FFT, cross-correlated with the reference and the peak within ``max_offset`` is
+    refined to a fraction of a sample by a parabola through its neighbours.
+
+    Parameters
+    ----------
+    data_collection : dict
+        The pressure data collection in standard format
+
+    reference : str
+        The station whose clock is kept
+        (default the first station)
+
+    max_offset : float
+        The largest offset searched in the units of ``times``
+        (default ``1.0``)
+
+    estimation_samples : int
+        The number of samples cross-correlated per station
+        (default ``2**18``)
+
+    Returns
+    -------
+    offsets : dict
+        ``{station:offset}`` where ``offset`` is subtracted from the ``times`` of the station to bring them
+        onto the clock of the reference (``0.0`` for the reference)
+
+    """
+    stations = data_collection['specifications']['stations']
+    reference = stations[0] if reference is None else reference
+    delta_time = 1.0 / data_collection['specifications']['sampling_frequency']
+
+    t_start, t_end = _overlap(data_collection, stations, {station:0.0 for station in stations})
+    num_samples = min(estimation_samples, int((t_end - t_start) / delta_time) + 1)
+    max_lag = min(int(np.ceil(max_offset / delta_time)), num_samples - 1)
+    grid = 0.5 * (t_start + t_end - (num_samples - 1) * delta_time) + np.arange(num_samples) * delta_time
+
+    windows = np.empty((len(stations), num_samples))
+    for idx, station in enumerate(stations):
+        station_data = data_collection['data'][station]
+        _resample(station_data['times'], station_data['pressures'], grid, 0.0, windows[idx])
+    windows -= windows.mean(axis=1, keepdims=True)
+
+    # Zero padding past max_lag keeps the circular correlation from wrapping within the searched lags
+    n_fft = 1 << int(np.ceil(np.log2(num_samples + max_lag)))
+    spectra = np.fft.rfft(windows, n=n_fft, axis=1)
+    spectra *= np.conj(spectra[stations.index(reference)])
+    correlations = np.fft.irfft(spectra, n=n_fft, axis=1)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    searched = correlations[:, lags % n_fft]
+    peaks = np.argmax(searched, axis=1)
+
+    # Parabolic refinement of the peak between its neighbours
+    inner = (peaks > 0) & (peaks < len(lags) - 1)
+    rows = np.arange(len(stations))
+    left = searched[rows, np.clip(peaks - 1, 0, len(lags) - 1)]
+    centre = searched[rows, peaks]
+    right = searched[rows, np.clip(peaks + 1, 0, len(lags) - 1)]
+    curvature = left - 2*centre + right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift = np.where(inner & (curvature < 0), 0.5 * (left - right) / curvature, 0.0)
+
+    offsets = (lags[peaks] + shift) * delta_time
+
+    return {station:(0.0 if station == reference else float(offsets[idx])) for idx, station in enumerate(stations)}
+
+@Instrument.instrumented
+def align_stations(data_collection:dict, offsets:dict=None, reference:str=None, sampling_frequency:float=None,
+                   max_offset:float=1.0, estimation_samples:int=2**18, chunk_size:int=2**20):
+    """Resamples every station onto one uniform time grid shared sample-for-sample by all stations
+
+    The clock offsets (estimated with ``estimate_clock_offsets()`` unless given) are removed and the
+    pressures are linearly interpolated onto the grid covering the time all stations overlap. The
+    grid is filled in chunks of ``chunk_size`` samples so long and memory-mapped records are never
+    copied as a whole.
+
+    Parameters
+    ----------
+    data_collection : dict
+        The pressure data collection in standard format
+
+    offsets : dict
+        ``{station:offset}`` subtracted from the ``times`` of each station
+        (default ``None`` - estimated by cross-correlation)
+
+    reference : str
+        The station whose clock is kept when estimating the offsets
+        (default the first station)
+
+    sampling_frequency : float
+        The sampling frequency of the common grid
+        (default ``specifications['sampling_frequency']``)
+
+    max_offset, estimation_samples
+        Passed on to ``estimate_clock_offsets()``
+
+    chunk_size : int
+        The number of grid samples interpolated at a time
+        (default ``2**20``)
+
+    Returns
+    -------
+    aligned_dict : dict
+        A pressure data collection in standard format in which every station shares the same ``times``
+        array; ``specifications['clock_offsets']`` records the applied offsets and
+        ``specifications['sampling_frequency']`` the grid
+
+    """
+    specifications = data_collection['specifications']
+    stations = specifications['stations']
+    sampling_frequency = specifications['sampling_frequency'] if sampling_frequency is None else sampling_frequency
+
+    if offsets is None:
+        offsets = estimate_clock_offsets(data_collection, reference, max_offset, estimation_samples)
+    offsets = {station:float(offsets.get(station, 0.0)) for station in stations}
+
+    t_start, t_end = _overlap(data_collection, stations, offsets)
+    num_samples = int(np.floor((t_end - t_start) * sampling_frequency + 1e-9)) + 1
+    times = t_start + np.arange(num_samples) / sampling_frequency
+
+    data_dict = {}
+    for station in stations:
+        station_data = data_collection['data'][station]
+        station_times = np.asarray(station_data['times'])
+        station_pressures = np.asarray(station_data['pressures'])
+        pressures = np.empty(num_samples)
+        for start in range(0, num_samples, chunk_size):
+            stop = min(start + chunk_size, num_samples)
+            _resample(station_times, station_pressures, times[start:stop], offsets[station], pressures[start:stop])
+        data_dict[station] = {'pressures':pressures, 'times':times}
+
+    aligned_specifications = dict(specifications)
+    aligned_specifications['sampling_frequency'] = sampling_frequency
+    aligned_specifications['clock_offsets'] = offsets
+
+    return {'specifications':aligned_specifications, 'data':data_dict}
+
+@Instrument.instrumented
 def save(data_dict:dict, file_path:str):
     """Stores the given dataset as a pickle file at the given path
 
@@ -267,4 +536,970 @@ def save(data_dict:dict, file_path:str):
 
     """
     with open(file_path, "wb") as f:
-        pickle.dump(data_dict, f)
\ No newline at end of file
+        pickle.dump(data_dict, f)
+
+def _encode_json(value):
+    """Makes the byte strings of ``specifications`` (e.g. ``b'IA=5'``) representable in JSON
+    """
+    if isinstance(value, bytes):
+        return {'__bytes__':value.decode('latin-1')}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+def _decode_json(value:dict):
+    """Restores the byte strings encoded by ``_encode_json``
+    """
+    if list(value.keys()) == ['__bytes__']:
+        return value['__bytes__'].encode('latin-1')
+    return value
+
+def _columnar_file(directory:str, station:str, quantity:str):
+    """Returns the path of the array holding the ``quantity`` (pressures or times) of ``station``
+    """
+    return os.path.join(directory, '%s_%s.npy' % (station, quantity))
+
+@Instrument.instrumented
+def save_columnar(data_dict:dict, directory:str):
+    """Stores a pressure data collection as a columnar directory
+
+    The directory holds ``specifications.json`` and one contiguous float64 ``.npy`` array per
+    station for each of ``pressures`` and ``times``::
+
+        directory/specifications.json
+        directory/dol_pressures.npy
+        directory/dol_times.npy
+        ...
+
+    Parameters
+    ----------
+    data_dict : dict
+        The pressure data collection in standard format
+
+    directory : str
+        The directory in which the collection is stored (created if it does not exist)
+
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    for station in data_dict['specifications']['stations']:
+        for quantity in ('pressures', 'times'):
+            arr = np.ascontiguousarray(data_dict['data'][station][quantity], dtype=np.float64)
+            np.save(_columnar_file(directory, station, quantity), arr)
+
+    # Written last so a directory with a specifications file is always complete
+    with open(os.path.join(directory, COLUMNAR_SPECIFICATIONS), 'w') as f:
+        json.dump(data_dict['specifications'], f, default=_encode_json, indent=4)
+
+@Instrument.instrumented
+def load_columnar(directory:str, mmap:bool=True):
+    """Loads a pressure data collection stored by ``save_columnar()``
+
+    Parameters
+    ----------
+    directory : str
+        The columnar directory of the collection
+
+    mmap : bool
+        Setting this variable to ``False`` reads the arrays into memory instead of memory-mapping them
+        (default ``True``)
+
+    Returns
+    -------
+    data_dict : dict
+        The data collection in standard format with ``numpy.memmap`` backed ``pressures`` and ``times``
+
+    """
+    with open(os.path.join(directory, COLUMNAR_SPECIFICATIONS), 'r') as f:
+        specifications = json.load(f, object_hook=_decode_json)
+
+    mmap_mode = 'r' if mmap else None
+    data_dict = {}
+    for station in specifications['stations']:
+        data_dict[station] = {quantity:np.load(_columnar_file(directory, station, quantity), mmap_mode=mmap_mode)
+                              for quantity in ('pressures', 'times')}
+
+    return {'specifications':specifications, 'data':data_dict}
+
+def convert_to_columnar(collection_path:str, directory:str):
+    """Converts a pickle file of a data collection in standard format into a columnar directory
+
+    Parameters
+    ----------
+    collection_path : str
+        The full path of the pickle file
+
+    directory : str
+        The columnar directory that will be written
+
+    """
+    save_columnar(load(collection_path), directory)
+
+def convert_old_to_columnar(path:str, collection_name:str, directory:str, **kwargs):
+    """Converts a data collection in non-standard format into a columnar directory
+
+    Parameters
+    ----------
+    path : str
+        The path prefix of the station files as expected by ``load_old()``
+
+    collection_name : str
+        The name of the collection shared by the per-station pickle files
+
+    directory : str
+        The columnar directory that will be written
+
+    **kwargs
+        Passed on to ``reformat_pressure_dict()`` (``station_names``, units, ``sampling_frequency``)
+
+    """
+    save_columnar(reformat_pressure_dict(path, collection_name, **kwargs), directory)
+
+class _ArrayLoader:
+    """Loads a station array from a columnar ``.npy`` file as a read-only memory map
+    """
+    def __init__(self, file_path:str):
+        self.file_path = file_path
+
+    def __call__(self):
+        return np.load(self.file_path, mmap_mode='r')
+
+class _SliceLoader:
+    """Loads the ``[start:stop]`` slice of a quantity of another lazily loaded station
+    """
+    def __init__(self, station:'_LazyStation', quantity:str, start:int=None, stop:int=None):
+        self.station = station
+        self.quantity = quantity
+        self.start = start
+        self.stop = stop
+
+    def __call__(self):
+        return np.asarray(self.station[self.quantity])[self.start:self.stop]
+
+class _LazyStation(Mapping):
+    """The ``{'pressures':..., 'times':...}`` entry of a station, loading each array on first access
+    """
+    def __init__(self, loaders:dict):
+        self._loaders = loaders
+        self._arrays = {}
+
+    def __getitem__(self, quantity:str):
+        if quantity not in self._arrays:
+            self._arrays[quantity] = self._loaders[quantity]()
+        return self._arrays[quantity]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+class LazyCollection(Mapping):
+    """A pressure data collection in standard format whose station arrays load on first access
+
+    It supports the same ``collection['specifications']`` and ``collection['data'][station]['pressures']``
+    access as the standard dictionary, so it can be passed to any ``Calculate`` or ``Plot`` function.
+    ``window()`` and ``stations()`` return new collections sharing the same memory.
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` of the collection
+
+    loaders : dict
+        ``{station:{'pressures':callable, 'times':callable}}`` where each callable returns the array
+
+    """
+    def __init__(self, specifications:dict, loaders:dict):
+        self._specifications = specifications
+        self._data = {station:_LazyStation(loaders[station]) for station in specifications['stations']}
+
+    @classmethod
+    def from_dict(cls, data_dict:dict):
+        """Wraps a data collection in standard format held in memory
+        """
+        loaders = {station:{quantity:_SliceLoader(data_dict['data'][station], quantity)
+                            for quantity in ('pressures', 'times')}
+                   for station in data_dict['specifications']['stations']}
+
+        return cls(data_dict['specifications'], loaders)
+
+    def __getitem__(self, key:str):
+        if key == 'specifications':
+            return self._specifications
+        if key == 'data':
+            return self._data
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(('specifications', 'data'))
+
+    def __len__(self):
+        return 2
+
+    def window(self, t_start:float, t_end:float):
+        """Selects the samples with ``t_start <= times <= t_end`` in every station
+
+        The bounds are found by binary search of each station's ``times`` and the pressures are
+        returned as zero-copy slices, loaded only when accessed.
+
+        Parameters
+        ----------
+        t_start, t_end : float
+            The bounds of the window in the units of ``times``
+
+        Returns
+        -------
+        windowed_collection : LazyCollection
+            A collection of the same stations limited to the window
+
+        """
+        loaders = {}
+        for station, station_data in self._data.items():
+            times = np.asarray(station_data['times'])
+            start = int(np.searchsorted(times, t_start, side='left'))
+            stop = int(np.searchsorted(times, t_end, side='right'))
+            loaders[station] = {quantity:_SliceLoader(station_data, quantity, start, stop)
+                                for quantity in ('pressures', 'times')}
+
+        return LazyCollection(self._specifications, loaders)
+
+    def stations(self, station_names:list):
+        """Selects a subset of the stations
+
+        Parameters
+        ----------
+        station_names : list
+            The stations to keep, in the order they will appear in ``specifications['stations']``
+
+        Returns
+        -------
+        station_collection : LazyCollection
+            A collection with only the given stations
+
+        """
+        specifications = self._specifications.copy()
+        specifications['stations'] = list(station_names)
+        loaders = {station:{quantity:_SliceLoader(self._data[station], quantity)
+                            for quantity in ('pressures', 'times')}
+                   for station in station_names}
+
+        return LazyCollection(specifications, loaders)
+
+def open_collection(directory:str):
+    """Opens a columnar directory written by ``save_columnar()`` without reading any station array
+
+    Parameters
+    ----------
+    directory : str
+        The columnar directory of the collection
+
+    Returns
+    -------
+    data_collection : LazyCollection
+        The collection, loading each station array as a memory map on first access
+
+    """
+    with open(os.path.join(directory, COLUMNAR_SPECIFICATIONS), 'r') as f:
+        specifications = json.load(f, object_hook=_decode_json)
+
+    loaders = {station:{quantity:_ArrayLoader(_columnar_file(directory, station, quantity))
+                        for quantity in ('pressures', 'times')}
+               for station in specifications['stations']}
+
+    return LazyCollection(specifications, loaders)
+
+CHUNK_LOG_MAGIC = b'MET4ALOG'
+CHUNK_RECORD_MAGIC = b'CHNK'
+_CHUNK_LOG_HEADER = struct.Struct('<8sQ')
+_CHUNK_RECORD_HEADER = struct.Struct('<4sIQ')
+_CHUNK_CHECKSUM = struct.Struct('<I')
+
+def _read_chunk_log_header(f):
+    """Reads the specifications at the start of a collection log and returns them with the offset of the first chunk
+    """
+    magic, specifications_length = _CHUNK_LOG_HEADER.unpack(f.read(_CHUNK_LOG_HEADER.size))
+    if magic != CHUNK_LOG_MAGIC:
+        raise ValueError('%s is not a chunked collection log' % f.name)
+    specifications = json.loads(f.read(specifications_length).decode(), object_hook=_decode_json)
+
+    return specifications, _CHUNK_LOG_HEADER.size + specifications_length
+
+def _iter_chunks(f, first_chunk:int, file_size:int):
+    """Walks the chunk records from the start of a log and yields the offset, header and payload of every intact chunk
+
+    A record cut short, failing its checksum (e.g. an interrupted write) or not starting with
+    ``CHUNK_RECORD_MAGIC`` (e.g. the trailing index of logs written by earlier versions) ends the scan.
+    """
+    offset = first_chunk
+    f.seek(offset)
+    while offset + _CHUNK_RECORD_HEADER.size <= file_size:
+        magic, header_length, payload_length = _CHUNK_RECORD_HEADER.unpack(f.read(_CHUNK_RECORD_HEADER.size))
+        record_end = offset + _CHUNK_RECORD_HEADER.size + header_length + payload_length + _CHUNK_CHECKSUM.size
+        if magic != CHUNK_RECORD_MAGIC or record_end > file_size:
+            return
+
+        header = f.read(header_length)
+        payload = f.read(payload_length)
+        checksum, = _CHUNK_CHECKSUM.unpack(f.read(_CHUNK_CHECKSUM.size))
+        if zlib.crc32(header + payload) != checksum:
+            return
+
+        yield offset, header, payload
+        offset = record_end
+
+def _chunk_offsets(f):
+    """Returns the specifications, the offsets of every intact chunk and the end of the last one by scanning a log
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    specifications, first_chunk = _read_chunk_log_header(f)
+
+    offsets = []
+    data_end = first_chunk
+    for offset, header, payload in _iter_chunks(f, first_chunk, file_size):
+        offsets.append(offset)
+        data_end = offset + _CHUNK_RECORD_HEADER.size + len(header) + len(payload) + _CHUNK_CHECKSUM.size
+
+    return specifications, offsets, data_end
+
+class ChunkedCollectionWriter:
+    """Appends chunks of station pressures and times to an append-only collection log
+
+    The log holds the ``specifications`` followed by one record per chunk, each protected by a
+    CRC32 checksum. Each ``append()`` only writes its record and syncs the file, so its cost does
+    not grow with the length of the run; readers find the chunks by walking the records. Opening
+    an existing log resumes it: if the last write was interrupted (e.g. power loss) the damaged
+    tail after the last intact chunk is discarded.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the log
+
+    specifications : dict
+        The ``specifications`` of the collection, required when the log does not exist yet
+        (default ``None``)
+
+    """
+    def __init__(self, file_path:str, specifications:dict=None):
+        self.file_path = file_path
+
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            self._file = open(file_path, 'r+b')
+            self.specifications, self.offsets, self._data_end = _chunk_offsets(self._file)
+        else:
+            if specifications is None:
+                raise ValueError('specifications are required to create a new collection log')
+            self.specifications = specifications
+            encoded = json.dumps(specifications, default=_encode_json).encode()
+
+            self._file = open(file_path, 'w+b')
+            self._file.write(_CHUNK_LOG_HEADER.pack(CHUNK_LOG_MAGIC, len(encoded)) + encoded)
+            self.offsets = []
+            self._data_end = self._file.tell()
+        self._sync()
+
+    def append(self, chunk:dict):
+        """Appends one chunk
+
+        Parameters
+        ----------
+        chunk : dict
+            ``{station:{'pressures':array, 'times':array}}`` for every station of the collection
+
+        """
+        stations = self.specifications['stations']
+        header = json.dumps({station:len(chunk[station]['pressures']) for station in stations}).encode()
+        payload = b''.join(np.ascontiguousarray(chunk[station][quantity], dtype='<f8').tobytes()
+                           for station in stations for quantity in ('pressures', 'times'))
+        for station in stations:
+            if len(chunk[station]['times']) != len(chunk[station]['pressures']):
+                raise ValueError('%s has a different number of pressures and times' % station)
+
+        body = header + payload
+        record = (_CHUNK_RECORD_HEADER.pack(CHUNK_RECORD_MAGIC, len(header), len(payload))
+                  + body + _CHUNK_CHECKSUM.pack(zlib.crc32(body)))
+
+        self._file.seek(self._data_end)
+        self._file.write(record)
+        self.offsets.append(self._data_end)
+        self._data_end += len(record)
+        self._sync()
+
+    def _sync(self):
+        """Drops anything after the last chunk (a damaged tail or an old index) and syncs the log
+        """
+        self._file.truncate(self._data_end)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes the log
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+@Instrument.instrumented
+def load_chunked(file_path:str):
+    """Loads every intact chunk of a collection log written by ``ChunkedCollectionWriter``
+
+    The chunks are read in one pass over the log, up to the first one cut short or failing its checksum.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the log
+
+    Returns
+    -------
+    data_dict : dict
+        The pressure data collection in standard format, with the chunks of each station joined into
+        contiguous float64 arrays
+
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        specifications, first_chunk = _read_chunk_log_header(f)
+        stations = specifications['stations']
+
+        pieces = {station:{'pressures':[], 'times':[]} for station in stations}
+        for _, header, payload in _iter_chunks(f, first_chunk, file_size):
+            num_samples = json.loads(header.decode())
+            payload = np.frombuffer(payload, dtype='<f8')
+
+            position = 0
+            for station in stations:
+                for quantity in ('pressures', 'times'):
+                    pieces[station][quantity].append(payload[position:position + num_samples[station]])
+                    position += num_samples[station]
+
+    data_dict = {station:{quantity:np.concatenate(pieces[station][quantity]) if pieces[station][quantity] else np.zeros(0)
+                          for quantity in ('pressures', 'times')}
+                 for station in stations}
+
+    return {'specifications':specifications, 'data':data_dict}
+
+COMPRESSED_MAGIC = b'MET4ACMP'
+CODEC_CHUNK_SAMPLES = 2**20
+_COMPRESSED_TRAILER = struct.Struct('<Q8s')
+_MAX_DECIMALS = 12
+
+def _shuffle(arr:np.ndarray):
+    """Groups the bytes of equal significance of every value together, which lets zlib find the repeated high bytes
+    """
+    return np.ascontiguousarray(arr.view(np.uint8).reshape(-1, arr.dtype.itemsize).T).tobytes()
+
+def _unshuffle(blob:bytes, dtype, num_samples:int):
+    dtype = np.dtype(dtype)
+    return np.ascontiguousarray(np.frombuffer(blob, dtype=np.uint8).reshape(dtype.itemsize, num_samples).T).view(dtype).reshape(-1)
+
+def _smallest_int_dtype(values:np.ndarray):
+    """Returns the narrowest signed integer type holding every value
+    """
+    if len(values) == 0:
+        return np.dtype(np.int8)
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+def _quantized_decimals(chunk:np.ndarray):
+    """Returns the fewest decimals ``d`` for which ``round(p * 10**d) / 10**d`` restores every value exactly, or ``None``
+    """
+    if len(chunk) == 0 or not np.all(np.isfinite(chunk)):
+        return None
+    sample = chunk[::max(1, len(chunk) // 1024)]
+    for decimals in range(_MAX_DECIMALS + 1):
+        scale = 10.0**decimals
+        if np.max(np.abs(sample)) * scale >= 2**53:
+            return None
+        if np.array_equal(np.rint(sample * scale) / scale, sample):
+            if np.array_equal(np.rint(chunk * scale) / scale, chunk):
+                return decimals
+            return None
+
+    return None
+
+def _encode_chunk(chunk:np.ndarray, quantity:str, level:int):
+    """Encodes one chunk of float64 values losslessly and returns its descriptor and compressed bytes
+
+    Times are predicted as ``start + k*step`` and only the samples differing from the prediction
+    are stored as exceptions. Values with a fixed number of decimals are stored as delta-coded
+    integers and any other values as delta-coded bit patterns.
+    """
+    num_samples = len(chunk)
+    if quantity == 'times' and num_samples > 1 and np.all(np.isfinite(chunk)):
+        start, step = float(chunk[0]), float((chunk[-1] - chunk[0]) / (num_samples - 1))
+        predicted = start + np.arange(num_samples) * step
+        exceptions = np.flatnonzero(predicted.view(np.int64) != chunk.view(np.int64))
+        if len(exceptions) <= num_samples // 8:
+            index_deltas = np.diff(exceptions, prepend=0)
+            blob = zlib.compress(_shuffle(index_deltas) + _shuffle(chunk[exceptions]), level)
+            return {'encoding':'uniform', 'samples':num_samples, 'start':start, 'step':step,
+                    'exceptions':len(exceptions)}, blob
+
+    decimals = _quantized_decimals(chunk)
+    if decimals is not None:
+        integers = np.rint(chunk * 10.0**decimals).astype(np.int64)
+        deltas = np.diff(integers, prepend=integers[:1])
+        dtype = _smallest_int_dtype(deltas)
+        return {'encoding':'quantized', 'samples':num_samples, 'decimals':decimals,
+                'first':int(integers[0]) if num_samples else 0, 'dtype':dtype.str}, zlib.compress(_shuffle(deltas.astype(dtype)), level)
+
+    bits = chunk.view(np.uint64)
+    deltas = np.diff(bits, prepend=np.zeros(1, dtype=np.uint64))
+    return {'encoding':'float', 'samples':num_samples}, zlib.compress(_shuffle(deltas), level)
+
+def _decode_chunk(descriptor:dict, blob:bytes, out:np.ndarray):
+    """Decodes one chunk written by ``_encode_chunk`` into ``out``
+    """
+    data = zlib.decompress(blob)
+    num_samples = descriptor['samples']
+    encoding = descriptor['encoding']
+
+    if encoding == 'uniform':
+        out[:] = descriptor['start'] + np.arange(num_samples) * descriptor['step']
+        num_exceptions = descriptor['exceptions']
+        if num_exceptions:
+            exceptions = np.cumsum(_unshuffle(data[:8*num_exceptions], np.int64, num_exceptions))
+            out[exceptions] = _unshuffle(data[8*num_exceptions:], np.float64, num_exceptions)
+    elif encoding == 'quantized':
+        deltas = _unshuffle(data, descriptor['dtype'], num_samples).astype(np.int64)
+        deltas[:1] = descriptor['first']
+        np.divide(np.cumsum(deltas), 10.0**descriptor['decimals'], out=out)
+    elif encoding == 'float':
+        out.view(np.uint64)[:] = np.cumsum(_unshuffle(data, np.uint64, num_samples), dtype=np.uint64)
+    else:
+        raise ValueError('Unknown encoding %r' % encoding)
+
+def _encode_array(arr, quantity:str, chunk_size:int, level:int):
+    """Encodes an array chunk by chunk, checking that every chunk decodes to the same bits
+    """
+    arr = np.ascontiguousarray(arr, dtype=np.float64)
+    encoded = []
+    for start in range(0, max(len(arr), 1), chunk_size):
+        chunk = arr[start:start + chunk_size]
+        descriptor, blob = _encode_chunk(chunk, quantity, level)
+
+        decoded = np.empty(len(chunk))
+        _decode_chunk(descriptor, blob, decoded)
+        if not np.array_equal(decoded.view(np.uint64), chunk.view(np.uint64)):
+            bits = chunk.view(np.uint64)
+            descriptor = {'encoding':'float', 'samples':len(chunk)}
+            blob = zlib.compress(_shuffle(np.diff(bits, prepend=np.zeros(1, dtype=np.uint64))), level)
+        encoded.append((descriptor, blob))
+
+    return encoded
+
+@Instrument.instrumented
+def save_compressed(data_dict:dict, file_path:str, chunk_size:int=CODEC_CHUNK_SAMPLES, level:int=6):
+    """Stores a pressure data collection in standard format with a lossless compact encoding
+
+    Every station's ``times`` and ``pressures`` are split into chunks of ``chunk_size`` samples and
+    each chunk is stored with the most compact exact encoding: nearly uniform times as start, step
+    and the samples that differ, readings with a fixed number of decimals as delta-coded integers,
+    and anything else as delta-coded float bit patterns, each byte-shuffled and compressed with
+    zlib. Every chunk is decoded again while saving, so a file always loads to the same bits.
+
+    Parameters
+    ----------
+    data_dict : dict
+        The pressure data collection in standard format
+
+    file_path : str
+        The full path of the file
+
+    chunk_size : int
+        The number of samples encoded together
+        (default ``2**20``)
+
+    level : int
+        The zlib compression level from 1 (fastest) to 9 (smallest)
+        (default ``6``)
+
+    """
+    stations = data_dict['specifications']['stations']
+    header = {'specifications':data_dict['specifications'], 'chunks':{}}
+
+    with open(file_path, 'wb') as f:
+        f.write(COMPRESSED_MAGIC)
+        for station in stations:
+            header['chunks'][station] = {}
+            for quantity in ('pressures', 'times'):
+                descriptors = []
+                for descriptor, blob in _encode_array(data_dict['data'][station][quantity], quantity, chunk_size, level):
+                    descriptor.update({'offset':f.tell(), 'length':len(blob), 'crc':zlib.crc32(blob)})
+                    descriptors.append(descriptor)
+                    f.write(blob)
+                header['chunks'][station][quantity] = descriptors
+
+        header_offset = f.tell()
+        f.write(json.dumps(header, default=_encode_json).encode())
+        f.write(_COMPRESSED_TRAILER.pack(header_offset, COMPRESSED_MAGIC))
+
+def _read_compressed_header(f, file_path:str):
+    """Reads the header at the end of a compressed collection and returns it with its offset
+    """
+    if f.read(len(COMPRESSED_MAGIC)) != COMPRESSED_MAGIC:
+        raise ValueError('%s is not a compressed collection' % file_path)
+    file_size = os.fstat(f.fileno()).st_size
+    if file_size < len(COMPRESSED_MAGIC) + _COMPRESSED_TRAILER.size:
+        raise ValueError('%s is truncated' % file_path)
+    f.seek(-_COMPRESSED_TRAILER.size, os.SEEK_END)
+    header_offset, magic = _COMPRESSED_TRAILER.unpack(f.read(_COMPRESSED_TRAILER.size))
+    trailer_offset = file_size - _COMPRESSED_TRAILER.size
+    if magic != COMPRESSED_MAGIC or not len(COMPRESSED_MAGIC) <= header_offset <= trailer_offset:
+        raise ValueError('%s is truncated' % file_path)
+    f.seek(header_offset)
+    try:
+        header = json.loads(f.read(trailer_offset - header_offset).decode(), object_hook=_decode_json)
+    except ValueError:
+        raise ValueError('%s has a corrupted header' % file_path)
+
+    return header, header_offset
+
+@Instrument.instrumented
+def load_compressed(file_path:str, max_workers:int=None):
+    """Loads a pressure data collection stored by ``save_compressed()``
+
+    The chunks are decoded by a pool of threads (``zlib`` and NumPy release the GIL) directly into
+    one preallocated float64 array per station and quantity. A truncated file or a chunk failing
+    its CRC32 checksum raises ``ValueError`` before anything is decoded.
+
+    Parameters
+    ----------
+    file_path : str
+        The full path of the file
+
+    max_workers : int
+        The number of chunks decoded at the same time
+        (default chosen by ``ThreadPoolExecutor``)
+
+    Returns
+    -------
+    data_dict : dict
+        The data collection in standard format with contiguous float64 arrays
+
+    """
+    with open(file_path, 'rb') as f:
+        header, header_offset = _read_compressed_header(f, file_path)
+        f.seek(0)
+        contents = f.read(header_offset)
+
+    specifications = header['specifications']
+    data_dict = {}
+    tasks = []
+    for station in specifications['stations']:
+        data_dict[station] = {}
+        for quantity in ('pressures', 'times'):
+            descriptors = header['chunks'][station][quantity]
+            arr = np.empty(sum(descriptor['samples'] for descriptor in descriptors))
+            position = 0
+            for idx, descriptor in enumerate(descriptors):
+                blob = contents[descriptor['offset']:descriptor['offset'] + descriptor['length']]
+                if len(blob) != descriptor['length'] or ('crc' in descriptor and zlib.crc32(blob) != descriptor['crc']):
+                    raise ValueError('%s: chunk %d of %s %s is corrupted' % (file_path, idx, station, quantity))
+                tasks.append((descriptor, blob, arr[position:position + descriptor['samples']]))
+                position += descriptor['samples']
+            data_dict[station][quantity] = arr
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(lambda task: _decode_chunk(*task), tasks):
+            pass
+
+    return {'specifications':specifications, 'data':data_dict}
+
+def _read_float(f, offset:int):
+    f.seek(offset)
+
+    return float(np.frombuffer(f.read(8), dtype='<f8')[0])
+
+def _chunked_spans(file_path:str):
+    """Returns the specifications and station spans of a collection log from its record headers
+
+    Only the headers, the first and last time of each station and the last record are read. Appends
+    only ever damage the end of a log, so the checksum of the last record alone decides whether it counts.
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        specifications, offset = _read_chunk_log_header(f)
+        stations = specifications['stations']
+
+        records = []
+        while offset + _CHUNK_RECORD_HEADER.size <= file_size:
+            f.seek(offset)
+            magic, header_length, payload_length = _CHUNK_RECORD_HEADER.unpack(f.read(_CHUNK_RECORD_HEADER.size))
+            record_end = offset + _CHUNK_RECORD_HEADER.size + header_length + payload_length + _CHUNK_CHECKSUM.size
+            if magic != CHUNK_RECORD_MAGIC or record_end > file_size:
+                break
+            try:
+                num_samples = json.loads(f.read(header_length).decode())
+            except ValueError:
+                break
+            records.append((offset + _CHUNK_RECORD_HEADER.size, header_length + payload_length, num_samples))
+            offset = record_end
+
+        if records:
+            body_offset, body_length, _ = records[-1]
+            f.seek(body_offset)
+            body = f.read(body_length)
+            checksum, = _CHUNK_CHECKSUM.unpack(f.read(_CHUNK_CHECKSUM.size))
+            if zlib.crc32(body) != checksum:
+                records.pop()
+
+        spans = {}
+        for idx, station in enumerate(stations):
+            filled = [(body_offset + body_length - 16*sum(num_samples[other] for other in stations[idx:])
+                       + 8*num_samples[station], num_samples[station])
+                      for body_offset, body_length, num_samples in records if num_samples[station] > 0]
+            if not filled:
+                spans[station] = (0, None, None)
+                continue
+            (first_times, _), (last_times, last_count) = filled[0], filled[-1]
+            spans[station] = (sum(count for _, count in filled), _read_float(f, first_times),
+                              _read_float(f, last_times + 8*(last_count - 1)))
+
+    return specifications, spans
+
+def _compressed_spans(file_path:str):
+    """Returns the specifications and station spans of a compressed collection from its header and first and last times chunks
+    """
+    with open(file_path, 'rb') as f:
+        header, _ = _read_compressed_header(f, file_path)
+
+        spans = {}
+        for station in header['specifications']['stations']:
+            descriptors = [descriptor for descriptor in header['chunks'][station]['times'] if descriptor['samples'] > 0]
+            if not descriptors:
+                spans[station] = (0, None, None)
+                continue
+
+            times = []
+            for descriptor in (descriptors[0], descriptors[-1]):
+                f.seek(descriptor['offset'])
+                blob = f.read(descriptor['length'])
+                if len(blob) != descriptor['length'] or ('crc' in descriptor and zlib.crc32(blob) != descriptor['crc']):
+                    raise ValueError('%s: a times chunk of %s is corrupted' % (file_path, station))
+                times.append(np.empty(descriptor['samples']))
+                _decode_chunk(descriptor, blob, times[-1])
+            spans[station] = (sum(descriptor['samples'] for descriptor in descriptors), float(times[0][0]), float(times[-1][-1]))
+
+    return header['specifications'], spans
+
+def collection_spans(path:str):
+    """Returns the number of samples and the first and last time of every station of a collection
+
+    Columnar directories only touch the first and last memory-mapped times, collection logs only
+    their record headers and compressed collections their header and first and last times chunks;
+    pickle files and non-standard collections are loaded.
+
+    Parameters
+    ----------
+    path : str
+        A collection readable by ``load_any()``
+
+    Returns
+    -------
+    specifications : dict
+        The ``specifications`` of the collection
+
+    spans : dict
+        ``{station:(num_samples, t_start, t_end)}``, with ``None`` times for a station without samples
+
+    """
+    if not os.path.isdir(path) and not _is_old_collection(path):
+        with open(path, 'rb') as f:
+            magic = f.read(len(CHUNK_LOG_MAGIC))
+        if magic == CHUNK_LOG_MAGIC:
+            return _chunked_spans(path)
+        if magic == COMPRESSED_MAGIC:
+            return _compressed_spans(path)
+
+    data_collection = load_any(path)
+    specifications = data_collection['specifications']
+    spans = {}
+    for station in specifications['stations']:
+        times = data_collection['data'][station]['times']
+        spans[station] = (len(times), float(times[0]), float(times[-1])) if len(times) > 0 else (0, None, None)
+
+    return specifications, spans
+
+def collection_name(collection_path:str, root:str=None):
+    """Returns the name of a collection used as the prefix of the files derived from it
+
+    Parameters
+    ----------
+    collection_path : str
+        The path of the collection
+
+    root : str
+        A directory above the collection whose relative path makes the name unique, e.g. ``filter6_synced_jul19_lab``
+        (default ``None`` - the base name of the path)
+
+    Returns
+    -------
+    name : str
+        The base name or relative path without a ``.pkl`` extension, with path separators replaced by ``_``
+
+    """
+    path = os.path.normpath(collection_path)
+    name = os.path.relpath(path, root) if root is not None else os.path.basename(path)
+    name = name[:-len('.pkl')] if name.endswith('.pkl') else name
+
+    return name.replace(os.sep, '_')
+
+def _old_station_files(path:str):
+    """Returns the per-station files of a non-standard collection given as its directory joined with its collection name
+    """
+    directory, collection_name = os.path.split(path)
+
+    return [os.path.join(directory, prefix + collection_name) for prefix in OLD_STATION_PREFIXES]
+
+def _is_old_collection(path:str):
+    """Returns whether a path is the directory and collection name of a non-standard collection with a file for every station
+    """
+    return not os.path.exists(path) and all(os.path.isfile(file_path) for file_path in _old_station_files(path))
+
+def find_collections(path:str, exclude:list=None):
+    """Finds every collection in a directory tree
+
+    The per-station pickle files of a non-standard collection (``dolphin_<name>``, ``otter_<name>``, ...)
+    are grouped into one collection when every station has a file.
+
+    Parameters
+    ----------
+    path : str
+        The root directory of the archive
+
+    exclude : list
+        Directories below ``path`` which are not searched, e.g. the output directory of a campaign
+        (default ``None``)
+
+    Returns
+    -------
+    collections : list
+        ``(path, storage_format)`` pairs sorted by path, where ``storage_format`` is ``'columnar'``,
+        ``'chunked'``, ``'compressed'``, ``'pickle'`` or ``'old'``. The path of a non-standard collection is its directory
+        joined with the collection name shared by its per-station files
+
+    """
+    excluded = {os.path.realpath(directory) for directory in exclude or []}
+    collections = []
+    for directory, sub_directories, file_names in os.walk(path):
+        if os.path.realpath(directory) in excluded:
+            sub_directories.clear()
+            continue
+        if COLUMNAR_SPECIFICATIONS in file_names:
+            collections.append((directory, 'columnar'))
+            sub_directories.clear()
+            continue
+
+        names = set(file_names)
+        for file_name in file_names:
+            prefix = next((prefix for prefix in OLD_STATION_PREFIXES if file_name.startswith(prefix)), None)
+            if prefix is not None:
+                collection_name = file_name[len(prefix):]
+                if all(other + collection_name in names for other in OLD_STATION_PREFIXES):
+                    if prefix == OLD_STATION_PREFIXES[0]:
+                        collections.append((os.path.join(directory, collection_name), 'old'))
+                    continue
+
+            file_path = os.path.join(directory, file_name)
+            if file_name.endswith('.pkl'):
+                collections.append((file_path, 'pickle'))
+            else:
+                with open(file_path, 'rb') as f:
+                    magic = f.read(len(CHUNK_LOG_MAGIC))
+                if magic == CHUNK_LOG_MAGIC:
+                    collections.append((file_path, 'chunked'))
+                elif magic == COMPRESSED_MAGIC:
+                    collections.append((file_path, 'compressed'))
+
+    return sorted(collections)
+
+def collection_files(path:str):
+    """Returns the files holding a collection
+
+    Parameters
+    ----------
+    path : str
+        A collection as returned by ``find_collections()``
+
+    Returns
+    -------
+    file_paths : list
+        The files of a columnar directory, the per-station files of a non-standard collection, or the path itself
+
+    """
+    if os.path.isdir(path):
+        return sorted(entry.path for entry in os.scandir(path) if entry.is_file())
+    if _is_old_collection(path):
+        return _old_station_files(path)
+
+    return [path]
+
+def is_collection(path:str):
+    """Returns whether a path holds a collection readable by ``load_any()``
+
+    Parameters
+    ----------
+    path : str
+        A directory or file path, or the directory joined with the collection name of a non-standard collection
+
+    Returns
+    -------
+    is_collection : bool
+        ``True`` for a columnar directory, a pickle file, a collection log, a compressed collection
+        or a non-standard collection
+
+    """
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, COLUMNAR_SPECIFICATIONS))
+    if _is_old_collection(path):
+        return True
+    if path.endswith('.pkl'):
+        return True
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(CHUNK_LOG_MAGIC)) in (CHUNK_LOG_MAGIC, COMPRESSED_MAGIC)
+
+@Instrument.instrumented
+def load_any(path:str):
+    """Loads a data collection from any of the storage formats of this module
+
+    Parameters
+    ----------
+    path : str
+        A columnar directory (opened lazily with ``open_collection()``), a collection log written by
+        ``ChunkedCollectionWriter``, a file written by ``save_compressed()``, a pickle file, or the
+        directory joined with the collection name of a non-standard collection
+
+    Returns
+    -------
+    data_dict : dict
+        The data collection
+
+    """
+    if os.path.isdir(path):
+        return open_collection(path)
+    if _is_old_collection(path):
+        directory, collection_name = os.path.split(path)
+        return reformat_pressure_dict(os.path.join(directory, ''), collection_name)
+
+    with open(path, 'rb') as f:
+        magic = f.read(len(CHUNK_LOG_MAGIC))
+    if magic == CHUNK_LOG_MAGIC:
+        return load_chunked(path)
+    if magic == COMPRESSED_MAGIC:
+        return load_compressed(path)
+
+    return load(path)
@@ -0,0 +1,388 @@
+"""
+Detect
+------
+STA/LTA event detection in long pressure records
+
+The short-term to long-term average ratio of every station is computed from cumulative sums in
+O(N) without a loop over samples: the STA and LTA are the variances of the pressures in a short and
+a long window ending at each sample, so slow drifts and the absolute pressure cancel out. A station
+triggers when the ratio rises above ``on`` and stays triggered until it falls below ``off``; an
+event is declared where at least ``min_stations`` stations are triggered at the same time.
+
+```
+windows = Detect.detect(data_collection, sta=1.0, lta=30.0, on=4.0, off=1.5, min_stations=3)
+for event_collection in Detect.event_collections(data_collection, windows):
+    full_collection = Calc.full_data_processing(event_collection, stages=['correlation'])
+```
+
+Stations are processed in chunks of ``chunk_size`` samples carrying ``lta`` of history, so memory
+stays bounded for memory-mapped collections and the same code serves live feeds through
+``StreamingDetector``.
+
+Methods
+-------
+sta_lta(pressures:np.ndarray, sampling_frequency:float, sta:float=1.0, lta:float=30.0)
+    Returns the STA/LTA ratio of one station at every sample
+
+StaLtaTrigger(sampling_frequency:float, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5)
+    Incremental STA/LTA trigger of one station returning the triggered intervals
+
+StreamingDetector(specifications:dict, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5, ...)
+    Incremental STA/LTA triggers of every station of a live feed with coincidence windows
+
+coincidence_windows(station_intervals:dict, min_stations:int=2, pre:float=0.0, post:float=0.0)
+    Returns the windows in which at least ``min_stations`` stations are triggered
+
+detect(data_collection:dict, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5, min_stations:int=2, ...)
+    Returns the event windows of a pressure data collection
+
+event_collections(data_collection:dict, windows:list)
+    Returns the windowed collections of the events, ready for ``Calculate``
+
+"""
+
+import numpy as np
+
+import src.Instrument as Instrument
+import src.DataCollection as Data
+
+DEFAULT_CHUNK_SIZE = 2**20
+
+def _window_variance(x:np.ndarray, num_samples:int):
+    """Returns the variance of ``x`` in the window of ``num_samples`` ending at each sample from ``num_samples - 1`` on
+
+    Sums are taken from cumulative sums of the values relative to the first one, which keeps the
+    subtraction of the squared mean well conditioned for pressures far from zero.
+    """
+    x = x - x[0]
+    cumsum = np.concatenate(([0.0], np.cumsum(x)))
+    cumsum_sq = np.concatenate(([0.0], np.cumsum(x * x)))
+    mean = (cumsum[num_samples:] - cumsum[:-num_samples]) / num_samples
+    mean_sq = (cumsum_sq[num_samples:] - cumsum_sq[:-num_samples]) / num_samples
+
+    return np.maximum(mean_sq - mean * mean, 0.0)
+
+def _ratio(x:np.ndarray, sta_samples:int, lta_samples:int):
+    """Returns the STA/LTA ratio at each sample from ``lta_samples - 1`` on
+    """
+    sta_var = _window_variance(x, sta_samples)[lta_samples - sta_samples:]
+    lta_var = _window_variance(x, lta_samples)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = sta_var / lta_var
+
+    return np.where(lta_var > 0, ratio, 0.0)
+
+def sta_lta(pressures:np.ndarray, sampling_frequency:float, sta:float=1.0, lta:float=30.0):
+    """Calculates the STA/LTA ratio of one station
+
+    Parameters
+    ----------
+    pressures : numpy.ndarray
+        The pressures of the station
+
+    sampling_frequency : float
+        The sampling frequency of the pressures
+
+    sta, lta : float
+        The lengths of the short-term and long-term windows in seconds
+        (default ``1.0`` and ``30.0``)
+
+    Returns
+    -------
+    ratio : numpy.ndarray
+        The ratio of the variances in the windows ending at each sample; ``nan`` for the first ``lta`` of samples
+
+    """
+    sta_samples, lta_samples = _window_samples(sampling_frequency, sta, lta)
+    ratio = np.full(len(pressures), np.nan)
+    if len(pressures) >= lta_samples:
+        ratio[lta_samples - 1:] = _ratio(np.asarray(pressures, dtype=np.float64), sta_samples, lta_samples)
+
+    return ratio
+
+def _window_samples(sampling_frequency:float, sta:float, lta:float):
+    """Returns the window lengths in samples
+    """
+    sta_samples = max(1, int(round(sta * sampling_frequency)))
+    lta_samples = max(sta_samples + 1, int(round(lta * sampling_frequency)))
+
+    return sta_samples, lta_samples
+
+class StaLtaTrigger:
+    """Incremental STA/LTA trigger of one station
+
+    The last ``lta`` of samples is kept between updates so the ratio, and the triggered state, run
+    on without a seam across blocks; a block of any length is handled by the same vectorized code.
+
+    Parameters
+    ----------
+    sampling_frequency : float
+        The sampling frequency of the pressures
+
+    sta, lta : float
+        The lengths of the short-term and long-term windows in seconds
+        (default ``1.0`` and ``30.0``)
+
+    on, off : float
+        The ratio above which the trigger turns on and below which it turns off again
+        (default ``4.0`` and ``1.5``)
+
+    """
+    def __init__(self, sampling_frequency:float, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5):
+        if off > on:
+            raise ValueError('off must not be larger than on')
+
+        self.sta_samples, self.lta_samples = _window_samples(sampling_frequency, sta, lta)
+        self.on = on
+        self.off = off
+        self.history = np.zeros(0)
+        self.triggered = False
+        self.on_time = None
+        self.last_time = None
+        self.max_ratio = 0.0
+
+    def update(self, pressures:np.ndarray, times:np.ndarray):
+        """Adds one block of samples
+
+        Parameters
+        ----------
+        pressures, times : numpy.ndarray
+            The new samples of the station
+
+        Returns
+        -------
+        intervals : list
+            The ``(t_on, t_off, max_ratio)`` of every trigger that turned off in this block
+
+        """
+        pressures = np.asarray(pressures, dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        if len(pressures) == 0:
+            return []
+
+        buffer = np.concatenate((self.history, pressures))
+        self.history = buffer[max(0, len(buffer) - (self.lta_samples - 1)):]
+
+        ratio = np.zeros(len(pressures))
+        num_valid = len(buffer) - self.lta_samples + 1
+        if num_valid > 0:
+            ratio[len(pressures) - min(num_valid, len(pressures)):] = _ratio(buffer, self.sta_samples, self.lta_samples)[-len(pressures):]
+
+        # Hysteresis without a loop: each sample takes the state of the latest on (+1) or off (-1) crossing
+        marks = np.where(ratio > self.on, 1, np.where(ratio < self.off, -1, 0))
+        marked = np.flatnonzero(marks)
+        latest = np.zeros(len(marks), dtype=np.int64)
+        latest[marked] = marked + 1
+        np.maximum.accumulate(latest, out=latest)
+        state = np.where(latest > 0, marks[np.maximum(latest - 1, 0)] > 0, self.triggered)
+
+        changes = np.flatnonzero(np.diff(np.concatenate(([self.triggered], state)).astype(np.int8)))
+        intervals = []
+        for change in changes:
+            if state[change]:
+                self.on_time = times[change]
+                self.max_ratio = 0.0
+            else:
+                self.max_ratio = max(self.max_ratio, float(np.max(ratio[self._on_index(times):change], initial=0.0)))
+                intervals.append((float(self.on_time), float(times[change]), self.max_ratio))
+                self.on_time = None
+
+        if state[-1]:
+            self.max_ratio = max(self.max_ratio, float(np.max(ratio[self._on_index(times):], initial=0.0)))
+        self.triggered = bool(state[-1])
+        self.last_time = float(times[-1])
+
+        return intervals
+
+    def _on_index(self, times:np.ndarray):
+        """Returns the index in ``times`` from which the current trigger has been on
+        """
+        return int(np.searchsorted(times, self.on_time, side='left'))
+
+    def open_interval(self):
+        """Returns the ``(t_on, t_last, max_ratio)`` of a trigger that is still on, or ``None``
+        """
+        if not self.triggered:
+            return None
+
+        return (float(self.on_time), self.last_time, self.max_ratio)
+
+def coincidence_windows(station_intervals:dict, min_stations:int=2, pre:float=0.0, post:float=0.0):
+    """Finds the windows in which at least ``min_stations`` stations are triggered at the same time
+
+    Parameters
+    ----------
+    station_intervals : dict
+        ``{station:[(t_on, t_off, max_ratio), ...]}`` as returned by ``StaLtaTrigger``
+
+    min_stations : int
+        The number of stations that must be triggered together
+        (default ``2``)
+
+    pre, post : float
+        The time added before and after each window, e.g. to include the onset of the event
+        (default ``0.0``)
+
+    Returns
+    -------
+    windows : list
+        ``{'t_start':float, 't_end':float, 'stations':list, 'max_ratio':float}`` for every event in time
+        order; windows overlapping after padding are merged
+
+    """
+    stations = [station for station, intervals in station_intervals.items() for _ in intervals]
+    starts = np.array([interval[0] for intervals in station_intervals.values() for interval in intervals])
+    ends = np.array([interval[1] for intervals in station_intervals.values() for interval in intervals])
+    if len(starts) == 0:
+        return []
+
+    # Sweep over every start (+1) and end (-1); ends sort before starts at the same time
+    edges = np.concatenate((starts, ends))
+    steps = np.concatenate((np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)))
+    order = np.lexsort((steps, edges))
+    active = np.cumsum(steps[order])
+    coincident = (active >= min_stations).astype(np.int8)
+    changes = np.diff(np.concatenate(([0], coincident, [0])))
+    window_starts = edges[order][np.flatnonzero(changes == 1)]
+    window_ends = edges[order][np.flatnonzero(changes == -1)]
+
+    windows = []
+    for t_start, t_end in zip(window_starts - pre, window_ends + post):
+        if windows and t_start <= windows[-1]['t_end']:
+            windows[-1]['t_end'] = max(windows[-1]['t_end'], float(t_end))
+        else:
+            windows.append({'t_start':float(t_start), 't_end':float(t_end)})
+
+    for window in windows:
+        overlapping = [idx for idx in range(len(starts))
+                       if starts[idx] <= window['t_end'] and ends[idx] >= window['t_start']]
+        window['stations'] = sorted({stations[idx] for idx in overlapping}, key=list(station_intervals).index)
+        window['max_ratio'] = max(interval[2] for intervals in station_intervals.values() for interval in intervals
+                                  if interval[0] <= window['t_end'] and interval[1] >= window['t_start'])
+
+    return windows
+
+class StreamingDetector:
+    """Incremental STA/LTA triggers of every station of a live feed
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` of the pressure data collection being streamed
+
+    sta, lta, on, off
+        Passed on to ``StaLtaTrigger``
+
+    min_stations, pre, post
+        Passed on to ``coincidence_windows()``
+
+    """
+    def __init__(self, specifications:dict, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5,
+                 min_stations:int=2, pre:float=0.0, post:float=0.0):
+        self.specifications = specifications
+        self.min_stations = min_stations
+        self.pre = pre
+        self.post = post
+        self.triggers = {station:StaLtaTrigger(specifications['sampling_frequency'], sta, lta, on, off)
+                         for station in specifications['stations']}
+        self.intervals = {station:[] for station in specifications['stations']}
+
+    def update(self, block:dict, times):
+        """Adds one block of samples
+
+        Parameters
+        ----------
+        block : dict
+            ``{station:pressures}`` of the new samples
+
+        times : numpy.ndarray or dict
+            The times of the block, shared by every station or ``{station:times}``
+
+        """
+        for station, trigger in self.triggers.items():
+            station_times = times[station] if isinstance(times, dict) else times
+            self.intervals[station] += trigger.update(block[station], station_times)
+
+    def windows(self, include_open:bool=True):
+        """Returns the coincidence windows of the samples so far
+
+        Parameters
+        ----------
+        include_open : bool
+            Setting this variable to ``False`` ignores triggers that are still on, whose windows may still grow
+            (default ``True``)
+
+        """
+        station_intervals = {}
+        for station, intervals in self.intervals.items():
+            open_interval = self.triggers[station].open_interval() if include_open else None
+            station_intervals[station] = intervals + ([open_interval] if open_interval is not None else [])
+
+        return coincidence_windows(station_intervals, self.min_stations, self.pre, self.post)
+
+@Instrument.instrumented
+def detect(data_collection:dict, sta:float=1.0, lta:float=30.0, on:float=4.0, off:float=1.5, min_stations:int=2,
+           pre:float=None, post:float=None, chunk_size:int=DEFAULT_CHUNK_SIZE):
+    """Detects the events of a pressure data collection
+
+    Parameters
+    ----------
+    data_collection : dict
+        The pressure data collection in standard format, or a ``LazyCollection``
+
+    sta, lta, on, off
+        Passed on to ``StaLtaTrigger``
+
+    min_stations : int
+        The number of stations that must be triggered together
+        (default ``2``)
+
+    pre, post : float
+        The time added before and after each window
+        (default ``sta``)
+
+    chunk_size : int
+        The number of samples per station processed at a time
+        (default ``2**20``)
+
+    Returns
+    -------
+    windows : list
+        ``{'t_start':float, 't_end':float, 'stations':list, 'max_ratio':float}`` for every event, see ``coincidence_windows()``
+
+    """
+    pre = sta if pre is None else pre
+    post = sta if post is None else post
+    detector = StreamingDetector(data_collection['specifications'], sta, lta, on, off, min_stations, pre, post)
+
+    for station, trigger in detector.triggers.items():
+        station_data = data_collection['data'][station]
+        pressures, times = station_data['pressures'], station_data['times']
+        with Instrument.span('detect.station', station=station):
+            for start in range(0, len(pressures), chunk_size):
+                detector.intervals[station] += trigger.update(pressures[start:start + chunk_size],
+                                                              times[start:start + chunk_size])
+
+    return detector.windows()
+
+def event_collections(data_collection:dict, windows:list):
+    """Returns the collections of the detected events
+
+    Parameters
+    ----------
+    data_collection : dict
+        The pressure data collection in standard format, or a ``LazyCollection``
+
+    windows : list
+        The windows returned by ``detect()``
+
+    Returns
+    -------
+    event_collections : list
+        One ``LazyCollection`` per window holding zero-copy slices of every station
+
+    """
+    if not isinstance(data_collection, Data.LazyCollection):
+        data_collection = Data.LazyCollection.from_dict(data_collection)
+
+    return [data_collection.window(window['t_start'], window['t_end']) for window in windows]
@@ -0,0 +1,193 @@
+"""
+Ingest
+------
+Bulk import of data collections in non-standard format (the per-station ``dolphin_``, ``otter_``,
+``seal_`` and ``orca_`` pickle files of Summer 2023) into standard format
+
+Every collection is loaded and converted to contiguous float64 arrays once by a pool of worker
+processes and written out in standard format, so later analyses never pay the list-to-array
+conversion again.
+
+Run from the ``old_code`` directory:
+```
+python -m src.Ingest /path/to/filter6/Lab_Experiments/ /path/to/output/ --workers 8
+```
+
+Methods
+-------
+find_old_collections(path:str)
+    Returns the names of the complete non-standard collections stored in a directory
+
+import_collection(path:str, collection_name:str, output_directory:str, columnar:bool=True, **kwargs)
+    Converts one non-standard collection and writes it to the output directory in standard format
+
+bulk_import(path:str, output_directory:str, collection_names:list=None, columnar:bool=True,
+            max_workers:int=None, progress=print, **kwargs)
+    Converts every collection of a directory in parallel, reporting progress and errors per collection
+
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import src.DataCollection as Data
+
+def find_old_collections(path:str):
+    """Finds the collections in non-standard format which have a pickle file for every station
+
+    Parameters
+    ----------
+    path : str
+        The directory in which the non-standard collections are stored
+
+    Returns
+    -------
+    collection_names : list
+        The sorted collection names (e.g. ``'synced_jul19_lab.pkl'``) as expected by ``DataCollection.load_old()``
+
+    """
+    file_names = set(os.listdir(path))
+    collection_names = []
+    for file_name in file_names:
+        if file_name.startswith(Data.OLD_STATION_PREFIXES[0]):
+            collection_name = file_name[len(Data.OLD_STATION_PREFIXES[0]):]
+            if all(prefix + collection_name in file_names for prefix in Data.OLD_STATION_PREFIXES):
+                collection_names.append(collection_name)
+
+    return sorted(collection_names)
+
+def _output_path(output_directory:str, collection_name:str, columnar:bool):
+    """Returns the path of the converted collection
+    """
+    name = collection_name[:-len('.pkl')] if collection_name.endswith('.pkl') else collection_name
+
+    return os.path.join(output_directory, name if columnar else name + '.pkl')
+
+def import_collection(path:str, collection_name:str, output_directory:str, columnar:bool=True, **kwargs):
+    """Converts one non-standard collection into standard format
+
+    Parameters
+    ----------
+    path : str
+        The directory in which the non-standard collection is stored
+
+    collection_name : str
+        The name of the collection shared by the per-station pickle files
+
+    output_directory : str
+        The directory in which the converted collection is written
+
+    columnar : bool
+        Setting this variable to ``False`` writes a standard format pickle instead of a columnar directory
+        (default ``True``)
+
+    **kwargs
+        Passed on to ``DataCollection.reformat_pressure_dict()``
+
+    Returns
+    -------
+    output_path : str
+        The path of the converted collection
+
+    """
+    data_dict = Data.reformat_pressure_dict(os.path.join(path, ''), collection_name, **kwargs)
+    output_path = _output_path(output_directory, collection_name, columnar)
+
+    if columnar:
+        Data.save_columnar(data_dict, output_path)
+    else:
+        Data.save(data_dict, output_path)
+
+    return output_path
+
+def _timed_import(*args, **kwargs):
+    """Runs ``import_collection()`` and also returns its duration in seconds
+    """
+    start = time.perf_counter()
+    output_path = import_collection(*args, **kwargs)
+
+    return output_path, time.perf_counter() - start
+
+def bulk_import(path:str, output_directory:str, collection_names:list=None, columnar:bool=True,
+                max_workers:int=None, progress=print, **kwargs):
+    """Converts many non-standard collections into standard format in parallel worker processes
+
+    Parameters
+    ----------
+    path : str
+        The directory in which the non-standard collections are stored
+
+    output_directory : str
+        The directory in which the converted collections are written (created if it does not exist)
+
+    collection_names : list
+        The collections to convert
+        (default every collection found by ``find_old_collections()``)
+
+    columnar : bool
+        Setting this variable to ``False`` writes standard format pickles instead of columnar directories
+        (default ``True``)
+
+    max_workers : int
+        The number of collections converted at the same time
+        (default the number of CPUs)
+
+    progress : callable
+        Called with one line of text as each collection finishes, or ``None`` for no output
+        (default ``print``)
+
+    **kwargs
+        Passed on to ``DataCollection.reformat_pressure_dict()``
+
+    Returns
+    -------
+    report : dict
+        ``{collection_name:{'output':str, 'error':str, 'seconds':float}}`` where ``error`` is ``None`` on success
+        and ``seconds`` is the conversion time of a successful collection
+
+    """
+    collection_names = find_old_collections(path) if collection_names is None else collection_names
+    os.makedirs(output_directory, exist_ok=True)
+
+    report = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_timed_import, path, collection_name, output_directory, columnar, **kwargs):collection_name
+                   for collection_name in collection_names}
+
+        for count, future in enumerate(as_completed(futures), start=1):
+            collection_name = futures[future]
+            try:
+                output_path, seconds = future.result()
+                report[collection_name] = {'output':output_path, 'error':None, 'seconds':seconds}
+            except Exception as error:
+                report[collection_name] = {'output':None, 'error':'%s: %s' % (type(error).__name__, error), 'seconds':None}
+
+            if progress is not None:
+                status = ('ok (%.1f s)' % report[collection_name]['seconds']) if report[collection_name]['error'] is None else 'FAILED (%s)' % report[collection_name]['error']
+                progress('[%d/%d] %s %s' % (count, len(collection_names), collection_name, status))
+
+    return report
+
+def main(argv:list=None):
+    """Command line entry point of ``bulk_import()``
+    """
+    parser = argparse.ArgumentParser(description='Convert non-standard MET4A collections into standard format')
+    parser.add_argument('path', help='directory holding the dolphin_/otter_/seal_/orca_ pickle files')
+    parser.add_argument('output_directory', help='directory in which the converted collections are written')
+    parser.add_argument('--collections', nargs='+', default=None, help='collection names to convert (default all)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default number of CPUs)')
+    parser.add_argument('--pickle', action='store_true', help='write standard format pickles instead of columnar directories')
+    parser.add_argument('--sampling-frequency', type=int, default=625)
+    args = parser.parse_args(argv)
+
+    report = bulk_import(args.path, args.output_directory, args.collections, columnar=not args.pickle,
+                         max_workers=args.workers, sampling_frequency=args.sampling_frequency)
+    failures = [name for name, entry in report.items() if entry['error'] is not None]
+    print('%d collections converted, %d failed' % (len(report) - len(failures), len(failures)))
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
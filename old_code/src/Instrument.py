@@ -0,0 +1,269 @@
+"""
+Instrument
+----------
+Hot-path instrumentation of ``Calculate``, ``DataCollection`` and ``Plot``
+
+Instrumentation is off by default and an instrumented function then costs a single check of a
+module variable. Inside a ``recording()`` block every instrumented function call and every
+``span()`` (e.g. one per station pair) records its wall time, CPU time, the bytes of the arrays
+it was given and, with ``trace_memory=True``, its peak allocation as seen by ``tracemalloc``.
+
+```
+import src.Instrument as Instrument
+
+with Instrument.recording(trace_memory=True) as recorder:
+    full_collection = Calc.full_data_processing(data_collection, process_allan_var=True)
+print(recorder.summary())
+recorder.to_json('timings.json')
+```
+
+Each record is also logged as JSON on the ``met4a.instrument`` logger at ``DEBUG`` level, so a
+structured log of production runs can be kept with the standard ``logging`` configuration.
+
+Nested measurements share one stack per thread: each saves the peak of the enclosing one before
+resetting the ``tracemalloc`` peak and passes its own peak back up when it ends, so the peaks of
+enclosing calls, spans and ``measure()`` blocks stay correct.
+
+Methods
+-------
+instrumented(function)
+    Decorator recording every call of ``function`` while a recording is active
+
+span(name:str, **labels)
+    Context manager recording a block of code (e.g. one station pair) while a recording is active
+
+measure(name:str, **labels)
+    Context manager measuring a block of code whether or not a recording is active
+
+recording(trace_memory:bool=False)
+    Context manager activating a ``Recorder`` for the duration of a ``with`` block
+
+Recorder
+    The records of one recording with ``summary()`` and ``to_json()`` exports
+
+"""
+
+import json
+import time
+import logging
+import functools
+import threading
+import contextlib
+import tracemalloc
+
+import numpy as np
+
+logger = logging.getLogger('met4a.instrument')
+
+_recorder = None
+_disabled_span = contextlib.nullcontext()
+_local = threading.local()
+
+def _frames():
+    """Returns the stack of open measurements of the current thread
+    """
+    if not hasattr(_local, 'frames'):
+        _local.frames = []
+
+    return _local.frames
+
+def _push():
+    """Opens a measurement, saving the ``tracemalloc`` peak so far in the enclosing one before resetting it
+    """
+    frames = _frames()
+    frame = {'wall':time.perf_counter(), 'cpu':time.process_time(), 'peak':0, 'memory':None}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if frames:
+            frames[-1]['peak'] = max(frames[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['memory'] = current
+    frames.append(frame)
+
+def _pop(name:str, labels:dict, bytes_processed:int):
+    """Closes the innermost measurement and returns its record, passing its peak on to the enclosing one
+    """
+    frames = _frames()
+    frame = frames.pop()
+    record = {'name':name,
+              'labels':labels,
+              'depth':len(frames),
+              'wall_seconds':time.perf_counter() - frame['wall'],
+              'cpu_seconds':time.process_time() - frame['cpu'],
+              'bytes_processed':bytes_processed,
+              'peak_bytes':None}
+
+    if frame['memory'] is not None and tracemalloc.is_tracing():
+        peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        record['peak_bytes'] = peak - frame['memory']
+        if frames:
+            frames[-1]['peak'] = max(frames[-1]['peak'], peak)
+
+    return record
+
+class Recorder:
+    """The records of one ``recording()`` block
+
+    Attributes
+    ----------
+    records : list
+        One dictionary per finished call or span with ``name``, ``labels``, ``depth``,
+        ``wall_seconds``, ``cpu_seconds``, ``bytes_processed`` and ``peak_bytes`` (``None`` unless
+        memory is traced), in the order they finished
+
+    """
+    def __init__(self, trace_memory:bool=False):
+        self.trace_memory = trace_memory
+        self.records = []
+
+    def _add(self, record:dict):
+        if not self.trace_memory:
+            record['peak_bytes'] = None
+        self.records.append(record)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(record, default=str))
+
+    def summary(self):
+        """Returns the totals per name
+
+        Returns
+        -------
+        summary : dict
+            ``{name:{'calls':int, 'wall_seconds':float, 'cpu_seconds':float, 'bytes_processed':int, 'peak_bytes':int}}``
+            where ``peak_bytes`` is the largest peak of any call
+
+        """
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['name'], {'calls':0, 'wall_seconds':0.0, 'cpu_seconds':0.0,
+                                                        'bytes_processed':0, 'peak_bytes':None})
+            entry['calls'] += 1
+            entry['wall_seconds'] += record['wall_seconds']
+            entry['cpu_seconds'] += record['cpu_seconds']
+            entry['bytes_processed'] += record['bytes_processed']
+            if record['peak_bytes'] is not None:
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, record['peak_bytes'])
+
+        return summary
+
+    def to_json(self, file_path:str):
+        """Writes the records and their summary to a JSON file
+        """
+        with open(file_path, 'w') as f:
+            json.dump({'records':self.records, 'summary':self.summary()}, f, indent=4, default=str)
+
+def _array_bytes(value, depth:int=0):
+    """Returns the bytes of the arrays held in ``value`` through plain dictionaries, lists and tuples
+
+    Lazily loaded collections are not walked so that instrumentation never loads data.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if depth > 4:
+        return 0
+    if isinstance(value, dict):
+        return sum(_array_bytes(item, depth + 1) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        if len(value) > 0 and isinstance(value[0], float):
+            return 8 * len(value)
+        return sum(_array_bytes(item, depth + 1) for item in value)
+
+    return 0
+
+def instrumented(function):
+    """Decorator recording the calls of ``function`` while a recording is active
+    """
+    name = function.__module__.split('.')[-1] + '.' + function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        recorder = _recorder
+        if recorder is None:
+            return function(*args, **kwargs)
+
+        _push()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recorder._add(_pop(name, {}, _array_bytes(args) + _array_bytes(kwargs)))
+
+    return wrapper
+
+def span(name:str, **labels):
+    """Records the enclosed block while a recording is active
+
+    Parameters
+    ----------
+    name : str
+        The name of the record, e.g. ``'allan_variance.pair'``
+
+    **labels
+        Identifying values stored with the record, e.g. ``pair='dol-ott'``
+
+    """
+    if _recorder is None:
+        return _disabled_span
+
+    return measure(name, **labels)
+
+@contextlib.contextmanager
+def measure(name:str, **labels):
+    """Measures the enclosed block, and records it while a recording is active
+
+    Parameters
+    ----------
+    name : str
+        The name of the record, e.g. ``'full_data_processing.correlation'``
+
+    **labels
+        Identifying values stored with the record
+
+    Returns
+    -------
+    record : dict
+        Filled in when the block ends, in the layout of ``Recorder.records``; ``peak_bytes`` is
+        ``None`` unless ``tracemalloc`` is tracing
+
+    """
+    record = {}
+    _push()
+    try:
+        yield record
+    finally:
+        record.update(_pop(name, labels, 0))
+        recorder = _recorder
+        if recorder is not None:
+            recorder._add(dict(record))
+
+@contextlib.contextmanager
+def recording(trace_memory:bool=False):
+    """Activates a ``Recorder`` inside a ``with`` block
+
+    Parameters
+    ----------
+    trace_memory : bool
+        Setting this variable to ``True`` also records the peak allocation of every call with ``tracemalloc``,
+        which slows the instrumented code down
+        (default ``False``)
+
+    Returns
+    -------
+    recorder : Recorder
+        The records of the block
+
+    """
+    global _recorder
+    previous_recorder = _recorder
+    recorder = Recorder(trace_memory)
+
+    tracing = tracemalloc.is_tracing()
+    if trace_memory and not tracing:
+        tracemalloc.start()
+
+    _recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = previous_recorder
+        if trace_memory and not tracing:
+            tracemalloc.stop()
@@ -5,7 +5,7 @@ A class that contains all the methods to generate specific plots given the datas
 
 Methods
 -------
-interferometric_response(data_collection:dict, plot_title:str=None)
+interferometric_response(data_collection:dict, plot_title:str=None, decimate:bool=True, redecimate_on_zoom:bool=False)
     Generates a ``Interferometric Response vs. Time`` plot for all station pairs
 
 allan_variance(data_collection:dict, plot_title:str=None)
@@ -14,18 +14,105 @@ allan_variance(data_collection:dict, plot_title:str=None)
 correlation(data_collection:dict, amplitude_units:str='dB', plot_title:str=None)
     Generates a ``Amplitude vs. Frequency`` plot of each cross correlation
 
-time_series(data_collection, plot_title:str=None)
+spectrogram(data_collection:dict, quantity:str='coherence', pairs:list=None, plot_title:str=None)
+    Generates a ``Frequency vs. Time`` plot of the coherence, phase or power of each pair
+
+time_series(data_collection, plot_title:str=None, decimate:bool=True, redecimate_on_zoom:bool=False)
     Generates a ``Pressure vs. Time`` plot of the dataset(s)
 
-masterplot( FIX ME! )
-    Generates a comprehensive plot of the timeseries, correlation, Allan variance, and interferometric response
+PLOTS
+    The plots of a full collection by name, with the function drawing each and the entry of the collection it draws
+
+full_plot(data_collection:dict, contains_allan_var:bool=False, output_path:str=None, formats:list=['png'])
+    Generates the timeseries, correlation, interferometric response, and optionally Allan variance plots of a full collection
+
+save_figure(fig, file_path:str, formats:list=['png'])
+    Saves a figure in each format and closes it
+
+minmax_decimate(x:numpy.ndarray, y:numpy.ndarray, num_bins:int)
+    Reduces a trace to the minimum and maximum of each of ``num_bins`` bins for plotting
+
+Long traces are drawn through ``minmax_decimate`` with one bin per horizontal pixel of the figure,
+which is visually identical to the full trace. Pass ``decimate=False`` for exact plots.
     
 """
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-def interferometric_response(data_collection:dict, plot_title:str=None):
+import src.Instrument as Instrument
+
+def minmax_decimate(x:np.ndarray, y:np.ndarray, num_bins:int):
+    """Reduces a trace to the minimum and maximum of each of ``num_bins`` equally sized bins
+
+    Each bin keeps its two extreme samples in their original order, so the envelope of the
+    trace is preserved when one bin covers at most one pixel.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        The trace, with ``x`` increasing
+
+    num_bins : int
+        The number of bins, e.g. the width of the axes in pixels
+
+    Returns
+    -------
+    x_decimated, y_decimated : numpy.ndarray
+        At most ``2*num_bins + 2`` samples of the trace
+
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= 2*num_bins:
+        return x, y
+
+    bin_size = int(np.ceil(len(y) / num_bins))
+    num_full = (len(y) // bin_size) * bin_size
+    bins = y[:num_full].reshape(-1, bin_size)
+    bin_starts = np.arange(0, num_full, bin_size)
+
+    extremes = np.stack((bin_starts + np.argmin(bins, axis=1), bin_starts + np.argmax(bins, axis=1)), axis=1)
+    indices = np.sort(extremes, axis=1).ravel()
+    if num_full < len(y):
+        tail = y[num_full:]
+        indices = np.concatenate((indices, np.sort(num_full + np.array([np.argmin(tail), np.argmax(tail)]))))
+
+    return x[indices], y[indices]
+
+def _axes_pixels(ax):
+    """Returns the width of an axes in pixels
+    """
+    return max(1, int(ax.get_window_extent().width))
+
+def _plot_trace(ax, x, y, decimate:bool, redecimate_on_zoom:bool, offset:float=0.0, scale:float=1.0):
+    """Plots ``(y - offset)*scale`` against ``x``, decimated to the width of the axes unless ``decimate`` is ``False``
+
+    With ``redecimate_on_zoom`` the visible part of the full trace is decimated again whenever
+    the x limits change, so zooming in reveals the individual samples.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if not decimate:
+        return ax.plot(x, (y - offset)*scale)[0]
+
+    x_plot, y_plot = minmax_decimate(x, y, _axes_pixels(ax))
+    line, = ax.plot(x_plot, (y_plot - offset)*scale)
+
+    if redecimate_on_zoom:
+        def redecimate(changed_ax):
+            x_min, x_max = changed_ax.get_xlim()
+            start = max(int(np.searchsorted(x, x_min, side='left')) - 1, 0)
+            stop = int(np.searchsorted(x, x_max, side='right')) + 1
+            x_visible, y_visible = minmax_decimate(x[start:stop], y[start:stop], _axes_pixels(changed_ax))
+            line.set_data(x_visible, (y_visible - offset)*scale)
+
+        ax.callbacks.connect('xlim_changed', redecimate)
+
+    return line
+
+@Instrument.instrumented
+def interferometric_response(data_collection:dict, plot_title:str=None, decimate:bool=True, redecimate_on_zoom:bool=False):
     """Plots the excess path length simulating the inferometric response where ``lambda_obs = 1``
 
     Parameters
@@ -37,6 +124,19 @@ def interferometric_response(data_collection:dict, plot_title:str=None):
         The desired name for the plot
         (default ``Interferometric Reponse``)
 
+    decimate : bool
+        Setting this variable to ``False`` plots every sample instead of the min/max envelope per pixel
+        (default ``True``)
+
+    redecimate_on_zoom : bool
+        Setting this variable to ``True`` decimates the visible samples again when the plot is zoomed
+        (default ``False``)
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure of the plot
+
     """
     fig, ax = plt.subplots(6, sharex=True, sharey=False, figsize=(10, 12))
 
@@ -50,7 +150,8 @@ def interferometric_response(data_collection:dict, plot_title:str=None):
 
     count = 0
     for stations in data_collection['excess_path_length'].keys():
-        ax[count].plot(data_collection['times'], data_collection['excess_path_length'][stations]*360.0)
+        _plot_trace(ax[count], data_collection['times'], data_collection['excess_path_length'][stations],
+                    decimate, redecimate_on_zoom, scale=360.0)
         
         ax[count].set_title(stations)
         count+=1
@@ -62,6 +163,9 @@ def interferometric_response(data_collection:dict, plot_title:str=None):
                         wspace=0.1, 
                         hspace=0.2)
 
+    return fig
+
+@Instrument.instrumented
 def allan_variance(data_collection:dict, plot_title:str=None):
     """Plots the Allan variance data
 
@@ -74,6 +178,11 @@ def allan_variance(data_collection:dict, plot_title:str=None):
         The desired name for the plot
         (default ``Allan Variance``)
 
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure of the plot
+
     """
     fig,ax = plt.subplots(3, 2, figsize=(12, 17), sharey=True, sharex=True)
     plot_title = 'Allan Variance' if plot_title == None else plot_title 
@@ -85,15 +194,18 @@ def allan_variance(data_collection:dict, plot_title:str=None):
     for i in range(0,3):
         for j in range(0,2):
             bandwidths = list(data_collection['allan_var'].keys())
-            delta_time = data_collection['specifications']['units']['delta_time']
             allan_var = data_collection['allan_var'][bandwidths[count]]
+            if 'taus' in data_collection:
+                time_axis = data_collection['taus']
+            else:
+                delta_time = data_collection['specifications']['units']['delta_time']
+                time_axis = delta_time * np.arange(len(allan_var))
 
-            ax[i][j].scatter(delta_time * np.arange(len(allan_var)), allan_var, label='Allan Variance', color='red')        
+            ax[i][j].scatter(time_axis, allan_var, label='Allan Variance', color='red')        
             ax[i][j].set_xscale('log')
             ax[i][j].set_yscale('log')
             ax[i][j].set_title(bandwidths[count], fontsize=15)
             # plot guidelines
-            time_axis = delta_time * np.arange(len(allan_var))
             ax[i][j].plot(time_axis, time_axis**-2.0, label='delta_time**-2.0')
             ax[i][j].plot(time_axis, time_axis**-1.0, label='delta_time**-1.0')
             ax[i][j].plot(time_axis, time_axis**-0.5, label='delta_time**-0.5')
@@ -109,6 +221,9 @@ def allan_variance(data_collection:dict, plot_title:str=None):
                         wspace=0.1, 
                         hspace=0.1)
 
+    return fig
+
+@Instrument.instrumented
 def correlation(data_collection:dict, amplitude_units:str='dB', plot_title:str=None):
     """Plots both the auto-correlation and cross-correlation of the data
 
@@ -124,7 +239,12 @@ def correlation(data_collection:dict, amplitude_units:str='dB', plot_title:str=N
     plot_title : str
         The desired title for the plot
         (default ``CORRELATION``)
-        
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure of the plot
+
     """
     fig, ax = plt.subplots(3, 1, sharex=True, sharey=False, figsize=(15, 15))
     plt.subplots_adjust(left=0.1,
@@ -162,7 +282,74 @@ def correlation(data_collection:dict, amplitude_units:str='dB', plot_title:str=N
         ax[0].plot(auto_frequencies, 10*np.log10(np.abs(auto)))
         ax[0].set_title('Auto-Correlation Power Spectrum', fontsize=20)
 
-def time_series(data_collection:dict, plot_title:str=None):
+    return fig
+
+@Instrument.instrumented
+def spectrogram(data_collection:dict, quantity:str='coherence', pairs:list=None, plot_title:str=None):
+    """Plots the time evolution of the coherence, phase or power spectrum of the station pairs
+
+    Parameters
+    ----------
+    data_collection : dict
+        Collection with spectrogram data (see ``Calculate.cross_spectrogram()``)
+
+    quantity : str
+        ``'coherence'`` or ``'phase'`` of the cross pairs, or ``'power'`` of each station
+        (default ``'coherence'``)
+
+    pairs : list
+        The pairs (or ``station-station`` keys of the stations for ``'power'``) to plot
+        (default all)
+
+    plot_title : str
+        The desired title for the plot
+        (default ``<QUANTITY> SPECTROGRAM``)
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure of the plot
+
+    """
+    if quantity == 'power':
+        values = {key:10*np.log10(np.abs(value)) for key, value in data_collection['auto']['spectrogram'].items()}
+        colour_label, colour_map, limits = 'Power (dB)', 'viridis', (None, None)
+    elif quantity == 'phase':
+        values = {key:180.0/np.pi*value for key, value in data_collection['cross']['phase'].items()}
+        colour_label, colour_map, limits = 'Phase (deg)', 'twilight', (-180, 180)
+    elif quantity == 'coherence':
+        values = data_collection['cross']['coherence']
+        colour_label, colour_map, limits = 'Coherence', 'magma', (0, 1)
+    else:
+        raise ValueError("Unknown quantity '%s', expected 'coherence', 'phase' or 'power'" % quantity)
+
+    pairs = list(values.keys()) if pairs is None else pairs
+    fig, ax = plt.subplots(len(pairs), 1, sharex=True, sharey=True, figsize=(15, 3 + 2.5*len(pairs)), squeeze=False)
+    plt.subplots_adjust(left=0.1,
+                        bottom=0.08,
+                        right=0.88,
+                        top=0.9,
+                        hspace=0.15)
+    plot_title = '%s SPECTROGRAM' % quantity.upper() if plot_title == None else plot_title
+    fig.suptitle(plot_title, fontsize=30)
+    fig.supxlabel('Time (%s)' % data_collection['specifications']['units']['times'], fontsize=25)
+    fig.supylabel('Frequency (%s)' % data_collection['specifications']['units']['frequency'], fontsize=25)
+
+    times = data_collection['times']
+    frequencies = data_collection['frequencies']
+    for idx, pair in enumerate(pairs):
+        mesh = ax[idx, 0].pcolormesh(times, frequencies, values[pair].T, shading='nearest', cmap=colour_map,
+                                     vmin=limits[0], vmax=limits[1], rasterized=True)
+        ax[idx, 0].set_yscale('log')
+        ax[idx, 0].set_title(pair, fontsize=20)
+
+    colour_bar = fig.colorbar(mesh, ax=ax[:, 0].tolist(), fraction=0.03, pad=0.02)
+    colour_bar.set_label(colour_label, fontsize=20)
+
+    return fig
+
+@Instrument.instrumented
+def time_series(data_collection:dict, plot_title:str=None, decimate:bool=True, redecimate_on_zoom:bool=False):
     """Generates a time series plot of the data collection
 
     Parameters
@@ -173,14 +360,29 @@ def time_series(data_collection:dict, plot_title:str=None):
     plot_title : str
         The title for the time series plot
         (default ``Pressure Response``)
+
+    decimate : bool
+        Setting this variable to ``False`` plots every sample instead of the min/max envelope per pixel
+        (default ``True``)
+
+    redecimate_on_zoom : bool
+        Setting this variable to ``True`` decimates the visible samples again when the plot is zoomed
+        (default ``False``)
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure of the plot
+
     """
-    plt.figure(figsize=(15, 10))
+    fig = plt.figure(figsize=(15, 10))
+    ax = plt.gca()
 
     for key in data_collection['data'].keys():
         p_arr = data_collection['data'][key]['pressures']
         time_arr = data_collection['data'][key]['times']
 
-        plt.plot(time_arr, (np.array(p_arr) - np.mean(p_arr)))
+        _plot_trace(ax, time_arr, p_arr, decimate, redecimate_on_zoom, offset=np.mean(p_arr))
 
     plt.legend(data_collection['specifications']['stations'],
         bbox_to_anchor=(1.125, 1.0),
@@ -196,16 +398,82 @@ def time_series(data_collection:dict, plot_title:str=None):
     pressure_unit = str(data_collection['specifications']['units']['pressures'])
     plt.ylabel('Pressure (%s)' % pressure_unit, fontsize=40)
 
-def full_plot(data_collection:dict, contains_allan_var:bool):
-    """
+    return fig
+
+# The entry of a full collection (see ``Calculate.full_data_processing()``) drawn by each plot, ``None`` for the pressures
+PLOTS = {'time_series':(time_series, None),
+         'interferometric_response':(interferometric_response, 'excess_path_length'),
+         'allan_variance':(allan_variance, 'allan_variance'),
+         'correlation':(correlation, 'correlation')}
+
+@Instrument.instrumented
+def full_plot(data_collection:dict, contains_allan_var:bool=False, output_path:str=None, formats:list=['png']):
+    """Plots the time series, interferometric response, correlation and optionally the Allan variance of a full collection
+
     Parameters
     ----------
     data_collection : dict
         The full data collection containing the pressure, excess path length, Allan variance, and correlation data
+        (see ``Calculate.full_data_processing()``)
     
     contains_allan_var : bool
         The function will plot the ``Allan Variance`` if this variable is set to ``True``
         (default ``False``)
 
+    output_path : str
+        When given, every plot is saved as ``<output_path>_<plot>.<format>`` and its figure is closed
+        (default ``None`` - the figures are left open)
+
+    formats : list
+        The file formats used with ``output_path``
+        (default ``['png']``)
+
+    Returns
+    -------
+    figures : dict
+        ``{plot:figure}`` for the open figures, or ``{plot:[file paths]}`` when ``output_path`` is given
+
+    """
+    figures = {}
+    for plot, (plot_function, key) in PLOTS.items():
+        if plot == 'allan_variance' and not contains_allan_var:
+            continue
+        fig = plot_function(data_collection if key is None else data_collection[key])
+        if output_path is None:
+            figures[plot] = fig
+        else:
+            figures[plot] = save_figure(fig, '%s_%s' % (output_path, plot), formats)
+
+    return figures
+
+@Instrument.instrumented
+def save_figure(fig, file_path:str, formats:list=['png']):
+    """Saves a figure in each format and closes it
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure to save
+
+    file_path : str
+        The path of the files without extension
+
+    formats : list
+        The file formats, e.g. ``['png', 'pdf']``
+        (default ``['png']``)
+
+    Returns
+    -------
+    file_paths : list
+        The paths of the saved files
+
     """
-    return -1
\ No newline at end of file
+    file_paths = []
+    try:
+        for file_format in formats:
+            file_paths.append('%s.%s' % (file_path, file_format))
+            fig.savefig(file_paths[-1], format=file_format)
+    finally:
+        plt.close(fig)
+
+    return file_paths
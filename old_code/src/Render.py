@@ -0,0 +1,174 @@
+"""
+Render
+------
+Headless, parallel rendering of plots for many data collections
+
+Each collection is rendered in a worker process using the non-interactive ``Agg`` backend, which the
+pool initializer and the command line select; callers of ``render_collection()`` in their own process
+keep the backend they chose.
+The worker computes only the derived data its plots need, writes each figure to PNG/PDF files
+and closes it immediately, so throughput scales with the number of cores and memory stays
+flat however many figures are produced.
+
+Run from the ``old_code`` directory:
+```
+python -m src.Render /path/to/collections/* --plots time_series correlation --output /path/to/plots --formats png pdf
+```
+
+Methods
+-------
+PLOT_TYPES
+    The plots that can be rendered and the ``Calculate.full_data_processing`` stage each one needs
+
+render_collection(collection_path:str, plot_types:list, output_directory:str, formats:list=['png'], **processing_kwargs)
+    Renders the plots of one collection and returns the written files
+
+render_batch(collection_paths:list, plot_types:list, output_directory:str, formats:list=['png'],
+             max_workers:int=None, progress=print, **processing_kwargs)
+    Renders the plots of many collections in a process pool
+
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Importing pyplot does not fix the backend, so ``_use_agg()`` still applies before the first figure
+import src.Plot as Plot
+
+# The ``Calculate.full_data_processing`` stage needed by each plot, named after the entry of the full collection it draws
+PLOT_TYPES = {plot:key for plot, (_, key) in Plot.PLOTS.items()}
+
+def _use_agg():
+    """Selects the non-interactive backend of a worker process or the command line before any figure is created
+    """
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+def render_collection(collection_path:str, plot_types:list, output_directory:str, formats:list=['png'],
+                      **processing_kwargs):
+    """Renders the requested plots of one collection and closes every figure
+
+    Parameters
+    ----------
+    collection_path : str
+        A pressure data collection in any format read by ``DataCollection.load_any()``
+
+    plot_types : list
+        Any of the keys of ``PLOT_TYPES``
+
+    output_directory : str
+        The directory in which ``<collection>_<plot>.<format>`` files are written
+
+    formats : list
+        The file formats
+        (default ``['png']``)
+
+    **processing_kwargs
+        Passed on to ``Calculate.full_data_processing()`` (e.g. ``taus=None``, ``segment_length``)
+
+    Returns
+    -------
+    file_paths : list
+        The paths of the written files
+
+    """
+    import src.Calculate as Calc
+    import src.DataCollection as Data
+
+    unknown_plots = set(plot_types) - set(PLOT_TYPES)
+    if unknown_plots:
+        raise ValueError('Unknown plot types %s' % sorted(unknown_plots))
+
+    data_collection = Data.load_any(collection_path)
+    stages = sorted({PLOT_TYPES[plot] for plot in plot_types} - {None})
+    full_collection = Calc.full_data_processing(data_collection, stages=stages, **processing_kwargs) if stages else {}
+
+    file_prefix = os.path.join(output_directory, Data.collection_name(collection_path))
+    file_paths = []
+    for plot in plot_types:
+        plot_function, key = Plot.PLOTS[plot]
+        collection = data_collection if key is None else full_collection[key]
+        file_paths += Plot.save_figure(plot_function(collection), '%s_%s' % (file_prefix, plot), formats)
+
+    return file_paths
+
+def render_batch(collection_paths:list, plot_types:list, output_directory:str, formats:list=['png'],
+                 max_workers:int=None, progress=print, **processing_kwargs):
+    """Renders the requested plots of many collections in parallel worker processes
+
+    Parameters
+    ----------
+    collection_paths : list
+        The collections to render
+
+    plot_types : list
+        Any of the keys of ``PLOT_TYPES``
+
+    output_directory : str
+        The directory in which the files are written (created if it does not exist)
+
+    formats : list
+        The file formats
+        (default ``['png']``)
+
+    max_workers : int
+        The number of collections rendered at the same time
+        (default the number of CPUs)
+
+    progress : callable
+        Called with one line of text as each collection finishes, or ``None`` for no output
+        (default ``print``)
+
+    **processing_kwargs
+        Passed on to ``Calculate.full_data_processing()``
+
+    Returns
+    -------
+    report : dict
+        ``{collection_path:{'files':list, 'error':str}}`` where ``error`` is ``None`` on success
+
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    report = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg) as executor:
+        futures = {executor.submit(render_collection, collection_path, plot_types, output_directory, formats, **processing_kwargs):collection_path
+                   for collection_path in collection_paths}
+
+        for count, future in enumerate(as_completed(futures), start=1):
+            collection_path = futures[future]
+            try:
+                report[collection_path] = {'files':future.result(), 'error':None}
+            except Exception as error:
+                report[collection_path] = {'files':[], 'error':'%s: %s' % (type(error).__name__, error)}
+
+            if progress is not None:
+                status = 'ok' if report[collection_path]['error'] is None else 'FAILED (%s)' % report[collection_path]['error']
+                progress('[%d/%d] %s %s' % (count, len(collection_paths), collection_path, status))
+
+    return report
+
+def main(argv:list=None):
+    """Command line entry point of ``render_batch()``
+    """
+    parser = argparse.ArgumentParser(description='Render plots of MET4A collections without a display')
+    parser.add_argument('collections', nargs='+', help='pickle files, columnar directories or collection logs')
+    parser.add_argument('--plots', nargs='+', default=list(PLOT_TYPES), choices=list(PLOT_TYPES))
+    parser.add_argument('--output', required=True, help='directory in which the plot files are written')
+    parser.add_argument('--formats', nargs='+', default=['png'])
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default number of CPUs)')
+    parser.add_argument('--full-taus', action='store_true',
+                        help='evaluate the Allan variance at every averaging time instead of octave-spaced ones')
+    args = parser.parse_args(argv)
+
+    _use_agg()
+    processing_kwargs = {'taus':None if args.full_taus else 'octave'}
+    report = render_batch(args.collections, args.plots, args.output, args.formats, args.workers, **processing_kwargs)
+    failures = [path for path, entry in report.items() if entry['error'] is not None]
+    print('%d collections rendered, %d failed' % (len(report) - len(failures), len(failures)))
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,508 @@
+"""
+Streaming
+---------
+Incremental counterparts of ``Calculate.allan_variance`` and ``Calculate.correlate`` for live station feeds,
+and the anti-alias decimation of those feeds before they are stored
+
+The classes are fed fixed-size blocks of samples per station while data arrives and keep only
+bounded state: running sums per averaging time for the Allan variance and an averaged
+cross-spectral matrix for the correlation, and the recent input of each filter for the decimation.
+Each update costs O(block) and the current estimate can be read at any point in the same structure
+as the batch functions return.
+
+```
+allan = Streaming.StreamingAllanVariance(specifications, max_tau=600)
+correlator = Streaming.StreamingCorrelator(specifications, segment_length=2**14)
+for block in feed:                      # block = {'dol':pressures, 'ott':pressures, ...}
+    allan.update(block)
+    correlator.update(block)
+allan_var_dict = allan.allan_variance()
+correlate_dict = correlator.correlate()
+```
+
+Methods
+-------
+StreamingAllanVariance(specifications:dict, taus='octave', max_tau:float=600, ...)
+    Running overlapping Allan variance of the excess path length of every station pair
+
+StreamingCorrelator(specifications:dict, segment_length:int, overlap:float=0.5, window='hann', ...)
+    Running segment-averaged cross and auto-correlation of every station pair
+
+StreamingDecimator(specifications:dict, factor:int=25, taps_per_phase:int=12, beta:float=8.0)
+    Cascaded anti-alias filtering and decimation of every station with state carried between blocks
+
+"""
+
+import numpy as np
+
+import src.Calculate as Calc
+
+class StreamingAllanVariance:
+    """Running overlapping Allan variance of the excess path length of every station pair
+
+    Only the last ``2*max_lag`` excess path length samples are kept; every new sample completes
+    one second difference ``x[k] - 2x[k+m] + x[k+2m]`` per lag m, whose square is added to a
+    running sum. The result equals ``Calculate.allan_variance`` of the whole record at the same lags.
+
+    New samples are written into a preallocated buffer twice the size of the history, and the
+    history is moved to its start only when it fills up, so an update costs O(block) per lag
+    however long the history is.
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` of the pressure data collection being streamed
+
+    taus : str or array_like
+        ``'octave'`` for the lags 1, 2, 4, ... up to ``max_tau``, or the averaging times in the units of ``times``
+        (default ``'octave'``)
+
+    max_tau : float
+        The longest averaging time of the octave grid in the units of ``times``
+        (default ``600``)
+
+    L_norm, p_norm : float
+        The excess path length scaling (see ``Calculate.excess_path_length()``)
+
+    allan_var_units : str
+        The units of the Allan variance values
+        (default ``Phase``)
+
+    """
+    def __init__(self, specifications:dict, taus='octave', max_tau:float=600, L_norm:float=2000, p_norm:float=1,
+                 allan_var_units:str='Phase'):
+        self.specifications = specifications
+        self.allan_var_units = allan_var_units
+        self.scale = L_norm / p_norm
+
+        stations = specifications['stations']
+        self.rows, self.cols = Calc._station_pairs(len(stations), 'cross')
+        self.keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(self.rows, self.cols)]
+
+        delta_time = 1.0 / specifications['sampling_frequency']
+        if isinstance(taus, str) and taus == 'octave':
+            self.lags = Calc.octave_lags(2*int(max_tau / delta_time) + 2)
+        else:
+            self.lags = np.unique(np.rint(np.asarray(taus, dtype=np.float64) / delta_time).astype(np.int64))
+            self.lags = self.lags[self.lags >= 1]
+
+        self.sums = np.zeros((len(self.keys), len(self.lags)))
+        self.num_terms = np.zeros(len(self.lags), dtype=np.int64)
+        self.max_history = 2*int(self.lags[-1]) if len(self.lags) else 0
+        self.buffer = np.empty((len(self.keys), 2*self.max_history))
+        self.end = 0
+        self.offset = None
+        self.num_samples = 0
+        self.time_span = [None, None]
+
+    def update(self, block:dict, times:np.ndarray=None):
+        """Adds one block of samples
+
+        Parameters
+        ----------
+        block : dict
+            ``{station:pressures}`` with the same number of new samples for every station
+
+        times : numpy.ndarray
+            The times of the block, used for the sampling interval and the time span of the result
+            (default ``None`` - the nominal ``sampling_frequency`` is used)
+
+        """
+        stations = self.specifications['stations']
+        p_block = np.stack([np.asarray(block[station], dtype=np.float64) for station in stations])
+        x_block = (p_block[self.rows] - p_block[self.cols]) * self.scale
+
+        # The second difference cancels constant offsets, so removing the first value keeps precision without a mean
+        if self.offset is None:
+            self.offset = x_block[:, :1].copy()
+        x_block -= self.offset
+
+        num_new = x_block.shape[1]
+        if self.end + num_new > self.buffer.shape[1]:
+            keep = min(self.max_history, self.end)
+            if keep + num_new > self.buffer.shape[1]:
+                buffer = np.empty((len(self.keys), 2*self.max_history + num_new))
+                buffer[:, :keep] = self.buffer[:, self.end - keep:self.end]
+                self.buffer = buffer
+            else:
+                self.buffer[:, :keep] = self.buffer[:, self.end - keep:self.end]
+            self.end = keep
+
+        first_new = self.end
+        self.end += num_new
+        self.buffer[:, first_new:self.end] = x_block
+        buffer = self.buffer[:, :self.end]
+        for idx, lag in enumerate(self.lags):
+            start = max(first_new, 2*lag)
+            if start >= buffer.shape[1]:
+                continue
+            second_diff = buffer[:, start - 2*lag:buffer.shape[1] - 2*lag] - 2*buffer[:, start - lag:buffer.shape[1] - lag] + buffer[:, start:]
+            self.sums[:, idx] += np.einsum('ij,ij->i', second_diff, second_diff)
+            self.num_terms[idx] += second_diff.shape[1]
+
+        self.num_samples += num_new
+
+        if times is not None and len(times) > 0:
+            if self.time_span[0] is None:
+                self.time_span[0] = float(times[0])
+            self.time_span[1] = float(times[-1])
+
+    def allan_variance(self):
+        """Returns the Allan variance of the samples so far
+
+        Returns
+        -------
+        allan_var_dict : dict
+            A data collection in the ``allan_variance(taus=...)`` layout. ``times`` holds the first and last
+            sample time (the full times array is not kept) and lags longer than the record are ``nan``
+
+        """
+        if self.time_span[0] is not None and self.num_samples > 1:
+            delta_time = (self.time_span[1] - self.time_span[0]) / (self.num_samples - 1)
+        else:
+            delta_time = 1.0 / self.specifications['sampling_frequency']
+
+        valid = (self.num_terms > 0) & (self.lags < self.num_samples//2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            allan_var = self.sums / self.num_terms / (2.0 * (self.lags * delta_time)**2)
+        allan_var[:, ~valid] = np.nan
+
+        allan_var_dict = {}
+        allan_var_dict['specifications'] = (self.specifications).copy()
+        allan_var_dict['specifications']['units'] = {'allan_var':self.allan_var_units,
+                                                     'times':self.specifications['units']['times'],
+                                                     'pressures':self.specifications['units']['pressures']}
+        allan_var_dict['times'] = np.array(self.time_span, dtype=np.float64)
+        allan_var_dict['taus'] = self.lags * delta_time
+        allan_var_dict['allan_var'] = {key:allan_var[idx] for idx, key in enumerate(self.keys)}
+
+        return allan_var_dict
+
+class StreamingCorrelator:
+    """Running segment-averaged cross and auto-correlation of every station pair
+
+    Incoming samples are buffered until a full segment is available; each segment is processed
+    exactly as in ``Calculate.segmented_cross_spectra`` and added to the averaged cross-spectra.
+
+    New samples are written into a preallocated buffer of two segments and the samples not yet
+    covered by a complete segment are moved to its start only when it fills up; blocks longer than
+    the free space are taken in pieces. Each segment is copied into one reusable array before it is
+    tapered, so updates allocate nothing and memory is bounded by the segment length however large
+    the blocks are.
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` of the pressure data collection being streamed
+
+    segment_length : int
+        The number of samples in each averaged segment
+
+    overlap : float
+        The fraction of each segment shared with the next one, in the range [0, 1)
+        (default ``0.5``)
+
+    window : str or array_like
+        The taper applied to each segment
+        (default ``'hann'``)
+
+    bins_per_octave : int
+        The number of logarithmic frequency bins in each octave of the spectrum
+        (default ``1``)
+
+    frequency_units : str
+        The frequency unit for the correlation
+        (default ``Hz``)
+
+    """
+    def __init__(self, specifications:dict, segment_length:int, overlap:float=0.5, window='hann',
+                 bins_per_octave:int=1, frequency_units:str='Hz'):
+        if not 0 <= overlap < 1:
+            raise ValueError('overlap must be in the range [0, 1)')
+        # A stream has no record length to bound the segment
+        Calc._check_segment_length(segment_length, np.iinfo(np.int64).max)
+
+        self.specifications = specifications
+        self.segment_length = segment_length
+        self.step = max(1, int(segment_length * (1 - overlap)))
+        self.taper = Calc._segment_window(window, segment_length)
+        self.bins_per_octave = bins_per_octave
+        self.frequency_units = frequency_units
+
+        stations = specifications['stations']
+        self.rows, self.cols = Calc._station_pairs(len(stations), 'all')
+        self.keys = [str(stations[i] + '-' + stations[j]) for i, j in zip(self.rows, self.cols)]
+        self.num_cross = len(self.keys) - len(stations)
+
+        self.spectra = np.zeros((len(self.keys), segment_length//2), dtype=np.complex128)
+        self.num_segments = 0
+        self.buffer = np.empty((len(stations), 2*segment_length))
+        self.segment = np.empty((len(stations), segment_length))
+        self.start = 0
+        self.end = 0
+
+    def update(self, block:dict):
+        """Adds one block of samples
+
+        Parameters
+        ----------
+        block : dict
+            ``{station:pressures}`` with the same number of new samples for every station
+
+        """
+        stations = self.specifications['stations']
+        p_block = [np.asarray(block[station], dtype=np.float64) for station in stations]
+        num_new = len(p_block[0])
+        if any(len(pressures) != num_new for pressures in p_block):
+            raise ValueError('Every station must have the same number of new samples')
+
+        position = 0
+        while position < num_new:
+            if self.end == self.buffer.shape[1]:
+                # Fewer than segment_length samples wait for their segment, so at least as many places are freed
+                kept = self.end - self.start
+                self.buffer[:, :kept] = self.buffer[:, self.start:self.end]
+                self.start, self.end = 0, kept
+
+            count = min(num_new - position, self.buffer.shape[1] - self.end)
+            for idx, pressures in enumerate(p_block):
+                self.buffer[idx, self.end:self.end + count] = pressures[position:position + count]
+            self.end += count
+            position += count
+
+            while self.start + self.segment_length <= self.end:
+                np.copyto(self.segment, self.buffer[:, self.start:self.start + self.segment_length])
+                Calc._add_segment_spectra(self.segment, self.taper, self.rows, self.cols, self.spectra)
+                self.num_segments += 1
+                self.start += self.step
+
+    def correlate(self):
+        """Returns the correlation of the segments completed so far
+
+        Returns
+        -------
+        correlate_dict : dict
+            A data collection in the ``Calculate.correlate()`` layout
+
+        """
+        if self.num_segments == 0:
+            raise ValueError('No complete segment of %d samples has been received yet' % self.segment_length)
+
+        spectra = self.spectra / self.num_segments
+        cross = Calc._correlation_collection(self._collection(), self.keys[:self.num_cross], spectra[:self.num_cross],
+                                             self.frequency_units, self.segment_length, self.bins_per_octave)
+        auto = Calc._correlation_collection(self._collection(), self.keys[self.num_cross:], spectra[self.num_cross:],
+                                            self.frequency_units, self.segment_length, self.bins_per_octave)
+
+        correlate = {}
+        correlate['specifications'] = (cross['specifications']).copy()
+        correlate['cross'] = cross
+        correlate['auto'] = auto
+
+        return correlate
+
+    def _collection(self):
+        """Returns a collection holding only the ``specifications``, as needed to build the result collections
+        """
+        return {'specifications':self.specifications}
+
+def _lowpass_taps(factor:int, taps_per_phase:int=12, beta:float=8.0):
+    """Returns a Kaiser-windowed sinc lowpass for decimation by ``factor`` with unit gain at DC
+
+    Decimation by 2 uses an odd halfband design of ``4*(taps_per_phase//2) - 1`` taps, whose every
+    other tap off the centre is zero; other factors use ``2*factor*taps_per_phase//2 + 1`` taps
+    with the cutoff at the new Nyquist frequency.
+    """
+    if factor == 2:
+        num_taps = 4*max(taps_per_phase//2, 2) - 1
+    else:
+        num_taps = 2*factor*max(taps_per_phase//2, 1) + 1
+
+    offsets = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(offsets / factor) * np.kaiser(num_taps, beta)
+    if factor == 2:
+        taps[(offsets != 0) & (offsets % 2 == 0)] = 0.0
+
+    return taps / np.sum(taps)
+
+def _decimation_factors(factor:int):
+    """Splits a decimation factor into its prime factors, largest first so the rate drops early
+    """
+    factors = []
+    divisor = 2
+    while divisor * divisor <= factor:
+        while factor % divisor == 0:
+            factors.append(divisor)
+            factor //= divisor
+        divisor += 1
+    if factor > 1:
+        factors.append(factor)
+
+    return sorted(factors, reverse=True)
+
+class _DecimationStage:
+    """One polyphase FIR decimation stage with the input history carried between blocks
+
+    Only every ``factor``-th output is computed, as a sum over taps of strided slices of the input.
+    Symmetric tap pairs share one multiplication and the zero taps of a halfband are skipped.
+    """
+    def __init__(self, factor:int, taps:np.ndarray):
+        self.factor = factor
+        self.taps = taps
+        self.delay = (len(taps) - 1) // 2
+
+        half = len(taps) // 2
+        self.pairs = [(k, len(taps) - 1 - k, taps[k]) for k in range(half) if taps[k] != 0]
+        self.centre = taps[half]
+
+        # The first output is centred on the first input sample
+        self.history = None
+        self.next_index = len(taps) - 1 + self.delay
+
+    def update(self, samples:np.ndarray, slopes:np.ndarray):
+        """Filters and decimates ``samples`` of shape ``(rows, n)`` and returns the new outputs
+
+        Before the first block each row is extended backwards from its first value with its
+        ``slopes`` per sample, which avoids the transient of the large DC level of the pressures
+        and keeps a time row linear.
+        """
+        num_history = len(self.taps) - 1
+        if self.history is None:
+            self.history = samples[:, :1] - slopes[:, None] * np.arange(num_history, 0, -1)
+
+        buffer = np.concatenate((self.history, samples), axis=1)
+        length = buffer.shape[1]
+        num_outputs = max(0, (length - 1 - self.next_index) // self.factor + 1)
+
+        if num_outputs == 0:
+            self.next_index -= samples.shape[1]
+            self.history = buffer[:, length - num_history:].copy()
+            return np.zeros((samples.shape[0], 0))
+
+        last = self.next_index + (num_outputs - 1) * self.factor
+        output = self.centre * buffer[:, self.next_index - self.delay:last - self.delay + 1:self.factor]
+        for k, mirror, tap in self.pairs:
+            output += tap * (buffer[:, self.next_index - k:last - k + 1:self.factor]
+                             + buffer[:, self.next_index - mirror:last - mirror + 1:self.factor])
+
+        self.next_index += num_outputs * self.factor - samples.shape[1]
+        self.history = buffer[:, length - num_history:].copy()
+
+        return output
+
+class StreamingDecimator:
+    """Anti-alias filtering and decimation of live station feeds with state carried between blocks
+
+    The decimation factor is split into a cascade of stages, one per prime factor, largest first:
+    halfband filters for the factors of two and windowed-sinc polyphase FIR filters for the others.
+    Each stage keeps the last samples of its input, so any block size gives the same result as
+    filtering the whole record, and each block costs O(block). The times of the outputs are shifted
+    by the same filters, so decimated samples line up with the original record.
+
+    Each stage is 6 dB down at its new Nyquist frequency, so the top fifth or so of the output band
+    is attenuated and may hold aliases; analyses should use frequencies below about 0.4 of the new
+    ``sampling_frequency``.
+
+    ```
+    decimator = Streaming.StreamingDecimator(specifications, factor=25)
+    writer = Data.ChunkedCollectionWriter('run.met4a', decimator.specifications)
+    for block, times in feed:               # block = {'dol':pressures, 'ott':pressures, ...}
+        pressures, new_times = decimator.update(block, times)
+        writer.append({station:{'pressures':pressures[station], 'times':new_times} for station in pressures})
+    ```
+
+    Parameters
+    ----------
+    specifications : dict
+        The ``specifications`` of the pressure data collection being streamed
+
+    factor : int
+        The decimation factor; the outputs are at ``sampling_frequency / factor``
+        (default ``25``)
+
+    taps_per_phase : int
+        The filter length per output sample of each stage; longer filters give a sharper cutoff
+        (default ``12``)
+
+    beta : float
+        The Kaiser window parameter; larger values give a higher stopband attenuation and a wider transition
+        (default ``8.0``)
+
+    Attributes
+    ----------
+    specifications : dict
+        A copy of ``specifications`` with the decimated ``sampling_frequency`` and a ``decimation``
+        entry holding the factor, the stages and the original sampling frequency
+
+    """
+    def __init__(self, specifications:dict, factor:int=25, taps_per_phase:int=12, beta:float=8.0):
+        if int(factor) != factor or factor < 1:
+            raise ValueError('factor must be a positive integer')
+        factor = int(factor)
+
+        self.input_specifications = specifications
+        self.factor = factor
+        self.stages = [_DecimationStage(stage_factor, _lowpass_taps(stage_factor, taps_per_phase, beta))
+                       for stage_factor in _decimation_factors(factor)]
+
+        input_frequency = specifications['sampling_frequency']
+        self.specifications = dict(specifications)
+        self.specifications['sampling_frequency'] = input_frequency / factor
+        self.specifications['decimation'] = {'factor':factor,
+                                             'stages':[stage.factor for stage in self.stages],
+                                             'num_taps':[len(stage.taps) for stage in self.stages],
+                                             'original_sampling_frequency':input_frequency}
+
+        self.times = None
+        self.num_samples = 0
+
+    def update(self, block:dict, times:np.ndarray=None):
+        """Filters and decimates one block of samples
+
+        Parameters
+        ----------
+        block : dict
+            ``{station:pressures}`` with the same number of new samples for every station
+
+        times : numpy.ndarray
+            The times of the block
+            (default ``None`` - times from zero at the nominal ``sampling_frequency``)
+
+        Returns
+        -------
+        decimated_block : dict
+            ``{station:pressures}`` of the new output samples, possibly empty arrays for short blocks
+
+        decimated_times : numpy.ndarray
+            The times of the new output samples
+
+        """
+        stations = self.input_specifications['stations']
+        p_block = np.stack([np.asarray(block[station], dtype=np.float64) for station in stations])
+        if times is None:
+            times = (self.num_samples + np.arange(p_block.shape[1])) / self.input_specifications['sampling_frequency']
+        self.num_samples += p_block.shape[1]
+
+        if p_block.shape[1] == 0:
+            return {station:p_block[idx] for idx, station in enumerate(stations)}, np.asarray(times, dtype=np.float64)
+
+        # The times run through the same cascade as an extra row: the symmetric filters delay a
+        # uniform time axis exactly as much as the pressures and smooth jitter like them. The
+        # first time is removed to keep the precision of large epoch times
+        if self.times is None:
+            self.times = float(times[0])
+        samples = np.vstack((p_block, np.asarray(times, dtype=np.float64) - self.times))
+
+        delta_time = 1.0 / self.input_specifications['sampling_frequency']
+        for stage in self.stages:
+            if samples.shape[1] == 0:
+                break
+            slopes = np.zeros(samples.shape[0])
+            slopes[-1] = delta_time
+            samples = stage.update(samples, slopes)
+            delta_time *= stage.factor
+
+        decimated_block = {station:samples[idx] for idx, station in enumerate(stations)}
+        decimated_times = samples[-1] + self.times
+
+        return decimated_block, decimated_times
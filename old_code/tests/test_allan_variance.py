@@ -0,0 +1,49 @@
+"""The every-lag Allan variance of ``Calculate.allan_variance(taus=None)`` against the direct per-lag evaluation
+
+Run from the ``old_code`` directory with ``python -m pytest tests``.
+"""
+
+import numpy as np
+import pytest
+
+import src.Calculate as Calc
+
+def _records(num_samples:int, seed:int=0):
+    rng = np.random.default_rng(seed)
+    samples = np.arange(num_samples)
+
+    return {'random_walk':np.cumsum(rng.standard_normal(num_samples)),
+            'white':rng.standard_normal(num_samples),
+            'offset_and_drift':1e4 + 0.5*samples + np.cumsum(rng.standard_normal(num_samples)),
+            'slow_sine':1e3*np.sin(2*np.pi*3*samples/num_samples) + rng.standard_normal(num_samples)}
+
+@pytest.mark.parametrize('num_samples', [2, 5, 6, 255, 512, 513, 3001])
+def test_every_lag_matches_direct_evaluation(num_samples):
+    lags = np.arange(1, num_samples//2)
+    for name, phase in _records(num_samples).items():
+        expected = Calc._allan_variance_lags(phase, lags, 0.0016)
+        actual = Calc._allan_variance_every_lag(phase, 0.0016)
+        assert actual.shape == expected.shape
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=0, err_msg=name)
+
+def test_non_finite_records_fall_back_to_direct_evaluation():
+    phase = _records(200)['random_walk']
+    phase[17] = np.nan
+    lags = np.arange(1, 100)
+    np.testing.assert_array_equal(Calc._allan_variance_every_lag(phase, 0.01),
+                                  Calc._allan_variance_lags(phase, lags, 0.01))
+
+def test_default_keeps_the_lag_indexed_layout():
+    num_samples = 1000
+    phase = _records(num_samples)['random_walk']
+    collection = {'specifications':{'units':{'times':'sec', 'pressures':'bar'}},
+                  'times':np.arange(num_samples) * 0.01,
+                  'excess_path_length':{'a-b':phase}}
+
+    allan_var_dict = Calc.allan_variance(collection)
+    allan_var = allan_var_dict['allan_var']['a-b']
+    assert allan_var.shape == (num_samples,)
+    assert allan_var[0] == 0 and np.all(allan_var[num_samples//2:] == 0)
+    np.testing.assert_allclose(allan_var_dict['taus'], 0.01*np.arange(num_samples))
+    np.testing.assert_allclose(allan_var[1:num_samples//2],
+                               Calc._allan_variance_lags(phase, np.arange(1, num_samples//2), 0.01), rtol=1e-9)
@@ -0,0 +1,129 @@
+"""Round trips of ``DataCollection.save_compressed`` and ``DataCollection.load_compressed``
+
+Run from the ``old_code`` directory with ``python -m pytest tests``.
+"""
+
+import numpy as np
+import pytest
+
+import src.DataCollection as Data
+
+def _collection(data:dict, sampling_frequency:float=625):
+    specifications = {'stations':list(data), 'sampling_frequency':sampling_frequency,
+                      'units':{'times':'sec', 'pressures':'bar'}}
+
+    return {'specifications':specifications, 'data':data}
+
+def _round_trip(tmp_path, data_dict:dict, **kwargs):
+    file_path = str(tmp_path / 'collection.cmp')
+    Data.save_compressed(data_dict, file_path, **kwargs)
+
+    return Data.load_compressed(file_path), file_path
+
+def _assert_same_bits(loaded:dict, data_dict:dict):
+    assert loaded['specifications'] == data_dict['specifications']
+    for station in data_dict['specifications']['stations']:
+        for quantity in ('pressures', 'times'):
+            expected = np.asarray(data_dict['data'][station][quantity], dtype=np.float64)
+            actual = loaded['data'][station][quantity]
+            assert actual.dtype == np.float64
+            assert np.array_equal(actual.view(np.uint64), expected.view(np.uint64))
+
+def _encodings(arr, quantity:str, chunk_size:int=Data.CODEC_CHUNK_SAMPLES):
+    return [descriptor['encoding'] for descriptor, _ in Data._encode_array(arr, quantity, chunk_size, 6)]
+
+def test_uniform_times_with_exceptions(tmp_path):
+    times = 1.7e9 + np.arange(10000) * 0.0016
+    times[[17, 4000, 9000]] += 1e-3
+    data_dict = _collection({'dol':{'pressures':np.ones(len(times)), 'times':times}})
+
+    assert _encodings(times, 'times') == ['uniform']
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+
+def test_quantized_pressures(tmp_path):
+    rng = np.random.default_rng(0)
+    pressures = np.round(1.01325 + np.cumsum(rng.integers(-3, 4, 10000)) * 1e-6, 6)
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':np.arange(len(pressures)) / 625}})
+
+    assert _encodings(pressures, 'pressures') == ['quantized']
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+
+def test_float_delta_encoding(tmp_path):
+    pressures = 1.0 + np.random.default_rng(1).standard_normal(10000) * 1e-3
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':np.arange(len(pressures)) / 625}})
+
+    assert _encodings(pressures, 'pressures') == ['float']
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+
+def test_raw_fallback_when_an_encoding_does_not_verify(tmp_path, monkeypatch):
+    pressures = 1.0 + np.random.default_rng(2).standard_normal(1000) * 1e-3
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':np.arange(len(pressures)) / 625}})
+
+    # Pretend the values have no decimals, so the quantized encoding loses them and must be replaced
+    monkeypatch.setattr(Data, '_quantized_decimals', lambda chunk: 0)
+    assert _encodings(pressures, 'pressures') == ['float']
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+
+def test_several_chunks(tmp_path):
+    times = np.arange(5000) / 625
+    pressures = np.round(np.sin(times), 4)
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':times}})
+
+    assert len(_encodings(pressures, 'pressures', chunk_size=1024)) == 5
+    loaded, _ = _round_trip(tmp_path, data_dict, chunk_size=1024)
+    _assert_same_bits(loaded, data_dict)
+
+def test_empty_and_single_sample_stations(tmp_path):
+    data_dict = _collection({'dol':{'pressures':np.zeros(0), 'times':np.zeros(0)},
+                             'ott':{'pressures':np.array([1.01325]), 'times':np.array([1.7e9])}})
+
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+    assert len(loaded['data']['dol']['pressures']) == 0
+
+def test_non_finite_values(tmp_path):
+    pressures = np.array([1.0, np.nan, np.inf, -np.inf, -0.0, 1.5, np.nan])
+    times = np.array([0.0, 0.0016, np.nan, 0.0048, np.inf, 0.008, 0.0096])
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':times}})
+
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+
+def test_list_inputs(tmp_path):
+    data_dict = _collection({'dol':{'pressures':[1.0, 1.25, 1.5, 1.75], 'times':[0, 1, 2, 3]}})
+
+    loaded, _ = _round_trip(tmp_path, data_dict)
+    _assert_same_bits(loaded, data_dict)
+    assert isinstance(loaded['data']['dol']['pressures'], np.ndarray)
+
+def test_corrupted_chunk(tmp_path):
+    pressures = 1.0 + np.random.default_rng(3).standard_normal(1000) * 1e-3
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':np.arange(len(pressures)) / 625}})
+    _, file_path = _round_trip(tmp_path, data_dict)
+
+    with open(file_path, 'r+b') as f:
+        f.seek(len(Data.COMPRESSED_MAGIC) + 10)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    with pytest.raises(ValueError, match='corrupted'):
+        Data.load_compressed(file_path)
+
+@pytest.mark.parametrize('keep', [4, 20, -30, -8])
+def test_truncated_file(tmp_path, keep):
+    pressures = 1.0 + np.random.default_rng(4).standard_normal(1000) * 1e-3
+    data_dict = _collection({'dol':{'pressures':pressures, 'times':np.arange(len(pressures)) / 625}})
+    _, file_path = _round_trip(tmp_path, data_dict)
+
+    with open(file_path, 'rb') as f:
+        contents = f.read()
+    with open(file_path, 'wb') as f:
+        f.write(contents[:keep])
+
+    with pytest.raises(ValueError):
+        Data.load_compressed(file_path)
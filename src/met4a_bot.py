@@ -1,24 +1,70 @@
 import os, slack
+import matplotlib
 from pathlib import Path
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, request, jsonify, abort
 from slackeventsapi import SlackEventAdapter
 
 
 env_path = Path('./src') / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Plots are rendered in job threads without a display
+matplotlib.use('Agg')
+
 app = Flask(__name__)
 slack_event_adapter = SlackEventAdapter(
     os.environ['SIGNING_SECRET'], '/slack/events', app)
 
-client = slack.WebClient(token=os.environ['SLACK_TOKEN'])
+# SLACK_API_URL points the bot at a local model.fake_slack server for testing
+client = slack.WebClient(token=os.environ['SLACK_TOKEN'],
+                         base_url=os.environ.get('SLACK_API_URL', slack.WebClient.BASE_URL))
 
 
 import model.setup as setup
+import model.jobs as jobs
+import model.analyses as analyses
+
+queue = jobs.JobQueue(jobs.SlackUploader(client),
+                      max_workers=int(os.environ.get('MAX_WORKERS', 2)),
+                      max_pending=int(os.environ.get('MAX_PENDING_JOBS', 16)))
+analyses.register(queue)
+
+
+def queue_command(text, channel, user=None):
+    """Queues a command and returns the acknowledgement text
+    """
+    try:
+        job_id = queue.submit(text, channel, user)
+    except jobs.UnknownCommand:
+        return "Unknown command '%s'" % text.strip()
+    except jobs.QueueFull:
+        return "Too many jobs are queued, please try again later"
+
+    return "Queued job %d: %s" % (job_id, text.strip())
+
+
+@app.route('/slack/commands', methods=['POST'])
+def command():
+    if not slack_event_adapter.server.verify_signature(request.headers.get('X-Slack-Request-Timestamp'),
+                                                       request.headers.get('X-Slack-Signature')):
+        abort(403)
+
+    text = queue_command(request.form.get('text', ''), request.form['channel_id'], request.form.get('user_id'))
+    return jsonify(response_type='ephemeral', text=text)
+
+
+@slack_event_adapter.on('app_mention')
+def mention(payload):
+    if request.headers.get('X-Slack-Retry-Num'):
+        return
+    event = payload['event']
+    text = ' '.join(word for word in event['text'].split() if not word.startswith('<@'))
+    queue.notify(event['channel'], queue_command(text, event['channel'], event.get('user')))
+
 
 channel = os.environ['CHANNEL']
 setup.sayhi(client, channel)
 
 if __name__ == "__main__":
-    app.run(debug="True")
\ No newline at end of file
+    app.run(debug="True")
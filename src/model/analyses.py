@@ -0,0 +1,101 @@
+"""Analyses which can be requested from Slack
+
+Every handler takes the text following its command and returns ``{'text':str, 'files':[paths]}``
+for ``jobs.JobQueue``. The data collections are read from ``COLLECTION_DIR`` and the analysis code
+is imported from ``old_code`` (or ``MET4A_ANALYSIS_PATH``).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+ANALYSIS_PATH = os.environ.get('MET4A_ANALYSIS_PATH', str(Path(__file__).resolve().parents[2] / 'old_code'))
+if ANALYSIS_PATH not in sys.path:
+    sys.path.insert(0, ANALYSIS_PATH)
+
+
+def latest_collection(directory=None):
+    """Returns the path of the most recently modified collection in ``directory``
+
+    Every storage format read by ``DataCollection.load_any`` is considered.
+    """
+    import src.DataCollection as Data
+
+    directory = directory or os.environ['COLLECTION_DIR']
+    paths = [entry.path for entry in os.scandir(directory) if Data.is_collection(entry.path)]
+    if not paths:
+        raise FileNotFoundError('No data collections in %s' % directory)
+
+    return max(paths, key=os.path.getmtime)
+
+
+def _collection_path(args):
+    """Returns the collection named in the command arguments, or the latest one
+
+    The name comes from Slack and the collection is unpickled, so only plain names of entries of
+    ``COLLECTION_DIR`` are accepted.
+    """
+    name = args.strip()
+    if name in ('', 'latest', 'latest collection'):
+        return latest_collection()
+
+    separators = {os.sep, '/'} | ({os.altsep} if os.altsep else set())
+    if any(separator in name for separator in separators) or name in ('.', '..'):
+        raise ValueError('%r is not a collection name' % name)
+
+    directory = os.path.realpath(os.environ['COLLECTION_DIR'])
+    collection_path = os.path.realpath(os.path.join(directory, name))
+    if not collection_path.startswith(directory + os.sep):
+        raise ValueError('%r is not in the collection directory' % name)
+
+    return collection_path
+
+
+def process_collection(args):
+    """Runs ``Calculate.full_data_processing`` on a collection and reports the time of every stage
+    """
+    import src.Calculate as Calc
+    import src.DataCollection as Data
+
+    collection_path = _collection_path(args)
+    full_collection = Calc.full_data_processing(Data.load_any(collection_path), process_allan_var=True, taus='octave')
+
+    lines = ['Processed %s' % os.path.basename(collection_path)]
+    for stage, entry in full_collection['report'].items():
+        lines.append('%s: %.2f s, %.1f MB peak' % (stage, entry['seconds'], entry['peak_memory_bytes'] / 2**20))
+
+    return {'text':'\n'.join(lines)}
+
+
+def plot(plot_type):
+    """Returns a handler rendering one ``Render.PLOT_TYPES`` plot of a collection to PNG
+    """
+    def handler(args):
+        import src.Render as Render
+
+        collection_path = _collection_path(args)
+        output_directory = tempfile.mkdtemp(prefix='met4a_')
+        try:
+            file_paths = Render.render_collection(collection_path, [plot_type], output_directory, taus='octave')
+        except Exception:
+            shutil.rmtree(output_directory, ignore_errors=True)
+            raise
+
+        # The job queue deletes the directory once the files are uploaded
+        return {'text':'%s of %s' % (plot_type.replace('_', ' ').capitalize(), os.path.basename(collection_path)),
+                'files':file_paths, 'temporary_directory':output_directory}
+
+    return handler
+
+
+def register(queue):
+    """Registers every analysis with a job queue
+
+    Plots share the global state of ``matplotlib.pyplot``, so only one plot job runs at a time.
+    """
+    queue.register('process', process_collection)
+    queue.register('process latest collection', process_collection)
+    for plot_type in ['time_series', 'interferometric_response', 'allan_variance', 'correlation']:
+        queue.register('plot ' + plot_type.replace('_', ' '), plot(plot_type), max_concurrent=1, group='plot')
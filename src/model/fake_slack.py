@@ -0,0 +1,144 @@
+"""A local stand-in for the Slack Web API
+
+Serves ``chat.postMessage``, ``files.upload`` and ``auth.test`` on localhost and records every call,
+so the job queue can be exercised without a workspace:
+
+```
+with FakeSlack(rate_limited_calls=2) as server:
+    client = slack.WebClient(token='xoxb-test', base_url=server.base_url)
+    ...
+    print(server.calls)
+```
+
+The first ``rate_limited_calls`` requests are answered with HTTP 429 and a ``Retry-After`` header
+like a rate-limited workspace, the next ``server_error_calls`` with HTTP 500, and calls of the
+methods in ``errors`` with that Slack error (e.g. ``{'chat.postMessage':'channel_not_found'}``).
+"""
+
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METHODS = ['chat.postMessage', 'files.upload', 'auth.test']
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server.fake_slack
+        url = urlsplit(self.path)
+        method = url.path.rstrip('/').split('/')[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        fields = {key:values[0] for key, values in parse_qs(url.query).items()}
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            fields.update(json.loads(body or b'{}'))
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            fields.update({key:values[0] for key, values in parse_qs(body.decode()).items()})
+        else:
+            fields['bytes'] = len(body)
+
+        with server.lock:
+            server.requests += 1
+            rate_limited = server.requests <= server.rate_limited_calls
+            server_error = not rate_limited and server.requests <= server.rate_limited_calls + server.server_error_calls
+            server.calls.append({'method':method, 'fields':fields, 'rate_limited':rate_limited,
+                                 'server_error':server_error})
+
+        if method not in METHODS:
+            self._reply(404, {'ok':False, 'error':'unknown_method'})
+        elif rate_limited:
+            self._reply(429, {'ok':False, 'error':'ratelimited'}, {'Retry-After':str(server.retry_after)})
+        elif server_error:
+            self._reply(500, {'ok':False, 'error':'internal_error'})
+        elif method in server.errors:
+            self._reply(200, {'ok':False, 'error':server.errors[method]})
+        else:
+            self._reply(200, {'ok':True, 'ts':'%d.000000' % server.requests})
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSlack:
+    """Runs the fake API in a background thread
+
+    Parameters
+    ----------
+    rate_limited_calls : int
+        The number of first requests answered with HTTP 429
+        (default ``0``)
+
+    retry_after : int
+        The ``Retry-After`` seconds sent with rate-limited responses
+        (default ``1``)
+
+    port : int
+        The local port, or ``0`` for any free port
+        (default ``0``)
+
+    server_error_calls : int
+        The number of requests after the rate-limited ones answered with HTTP 500
+        (default ``0``)
+
+    errors : dict
+        The Slack error answered to every call of a method, e.g. ``{'chat.postMessage':'channel_not_found'}``
+        (default ``None``)
+
+    """
+    def __init__(self, rate_limited_calls=0, retry_after=1, port=0, server_error_calls=0, errors=None):
+        self.rate_limited_calls = rate_limited_calls
+        self.retry_after = retry_after
+        self.server_error_calls = server_error_calls
+        self.errors = dict(errors or {})
+        self.requests = 0
+        self.calls = []
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.fake_slack = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%d/api/' % self._server.server_address[1]
+
+    def calls_to(self, method):
+        """Returns the calls of one API method which were not rate-limited or failed with a server error
+        """
+        return [call for call in self.calls
+                if call['method'] == method and not (call['rate_limited'] or call['server_error'])]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import sys
+    server = FakeSlack(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print('Fake Slack API on %s' % server.base_url)
+    server._server.serve_forever()
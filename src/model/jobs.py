@@ -0,0 +1,277 @@
+"""Asynchronous job queue behind the Slack bot
+
+Slack expects a command to be acknowledged within 3 seconds, so the bot only parses the command,
+queues a job and answers straight away. Jobs run in a bounded pool of worker threads with optional concurrency
+limits per command, and their results are posted back to the channel from a separate upload
+thread by a ``SlackUploader`` that retries rate-limited (HTTP 429), server (HTTP 5xx) and connection
+errors.
+"""
+
+import time
+import shutil
+import logging
+import threading
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while ``max_pending`` jobs are already waiting or running
+    """
+
+
+class UnknownCommand(Exception):
+    """Raised when no handler is registered for a command
+    """
+
+
+def _is_transient(error):
+    """Returns whether a failed Slack call may succeed when repeated
+
+    Rate limits (HTTP 429 or a ``ratelimited`` error), server errors (HTTP 5xx) and connection
+    errors are transient; any other API error (e.g. ``invalid_auth`` or ``channel_not_found``) is not.
+    """
+    if isinstance(error, OSError):
+        return True
+
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    if status_code == 429 or (status_code is not None and status_code >= 500):
+        return True
+    try:
+        return response['error'] == 'ratelimited'
+    except (TypeError, KeyError, AttributeError):
+        return False
+
+
+class SlackUploader:
+    """Posts messages and uploads files with retries of transient errors
+
+    Parameters
+    ----------
+    client : slack.WebClient
+        Any client with ``chat_postMessage`` and ``files_upload`` methods
+
+    max_retries : int
+        The number of retries of a call failing with a transient error; other errors are raised at once
+        (default ``5``)
+
+    base_delay : float
+        The delay in seconds before the first retry of an error without ``Retry-After``; it doubles with every retry
+        (default ``1``)
+
+    sleep : callable
+        Waits the given number of seconds between attempts
+        (default ``time.sleep``)
+
+    """
+    def __init__(self, client, max_retries=5, base_delay=1.0, sleep=time.sleep):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.sleep = sleep
+
+    def _retry_delay(self, error, attempt):
+        """Returns the delay before the next attempt, honouring the ``Retry-After`` header of rate-limited calls
+        """
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        if getattr(response, 'status_code', None) == 429 and 'Retry-After' in headers:
+            return float(headers['Retry-After'])
+        return self.base_delay * 2**attempt
+
+    def _call(self, method, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return method(**kwargs)
+            except Exception as error:
+                if attempt == self.max_retries or not _is_transient(error):
+                    raise
+                delay = self._retry_delay(error, attempt)
+                logger.warning('Slack call failed (%s), retrying in %.1f s', error, delay)
+                self.sleep(delay)
+
+    def post_message(self, channel, text):
+        return self._call(self.client.chat_postMessage, channel=channel, text=text)
+
+    def upload_file(self, channel, file_path, title=None):
+        return self._call(self.client.files_upload, channels=channel, file=file_path, title=title)
+
+
+class JobQueue:
+    """Runs registered command handlers in a bounded worker pool and posts their results to Slack
+
+    A handler is called with the text following the command and returns
+    ``{'text':str, 'files':[paths], 'temporary_directory':path}``; every entry is optional and the
+    ``temporary_directory`` holding the files is deleted once they are uploaded or the upload failed.
+
+    Parameters
+    ----------
+    uploader : SlackUploader
+        Posts the results
+
+    max_workers : int
+        The number of jobs running at the same time
+        (default ``2``)
+
+    max_pending : int
+        The number of jobs waiting or running above which ``submit()`` raises ``QueueFull``
+        (default ``16``)
+
+    """
+    def __init__(self, uploader, max_workers=2, max_pending=16):
+        self.uploader = uploader
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='met4a-job')
+        # A single upload thread keeps Slack calls in order and under the rate limit without holding a worker
+        self._uploads = ThreadPoolExecutor(max_workers=1, thread_name_prefix='met4a-upload')
+        self._handlers = {}
+        self._limits = {}
+        # Jobs over the limit of their group wait here instead of holding a worker thread
+        self._groups = {}
+        self._pending = 0
+        self._lock = threading.Condition()
+        self._ids = itertools.count(1)
+        self.jobs = {}
+
+    def register(self, command, handler, max_concurrent=None, group=None):
+        """Registers the handler of a command
+
+        ``max_concurrent`` limits how many jobs of the command, or of every command sharing the same
+        ``group``, run at once. Jobs over the limit wait outside the worker pool, so they do not
+        delay jobs of other commands.
+        """
+        self._handlers[command] = handler
+        if max_concurrent is not None:
+            group = group or command
+            if group not in self._groups:
+                self._groups[group] = {'limit':max_concurrent, 'running':0, 'waiting':collections.deque()}
+            self._limits[command] = group
+
+    def parse(self, text):
+        """Splits command text into the longest registered command and its arguments
+        """
+        words = text.strip().lower().split()
+        for length in range(len(words), 0, -1):
+            command = ' '.join(words[:length])
+            if command in self._handlers:
+                return command, ' '.join(text.strip().split()[length:])
+        raise UnknownCommand(text)
+
+    def submit(self, text, channel, user=None):
+        """Queues the job of a command and returns its id without waiting for it
+        """
+        command, args = self.parse(text)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull('%d jobs are already queued' % self._pending)
+            self._pending += 1
+            job_id = next(self._ids)
+            self.jobs[job_id] = {'command':command, 'args':args, 'channel':channel, 'user':user, 'status':'queued'}
+            start = self._admit(job_id)
+
+        if start:
+            self._dispatch(job_id)
+
+        return job_id
+
+    def _admit(self, job_id):
+        """Returns whether a job may start now, or puts it in the waiting line of its group (with the lock held)
+        """
+        group = self._limits.get(self.jobs[job_id]['command'])
+        if group is None:
+            return True
+
+        state = self._groups[group]
+        if state['running'] < state['limit']:
+            state['running'] += 1
+            return True
+        state['waiting'].append(job_id)
+
+        return False
+
+    def _release(self, job_id):
+        """Frees the place of a finished job in its group and starts the next waiting job of the group
+        """
+        group = self._limits.get(self.jobs[job_id]['command'])
+        if group is None:
+            return
+
+        with self._lock:
+            state = self._groups[group]
+            state['running'] -= 1
+            next_job_id = state['waiting'].popleft() if state['waiting'] else None
+            if next_job_id is not None:
+                state['running'] += 1
+
+        if next_job_id is not None:
+            self._dispatch(next_job_id)
+
+    def _dispatch(self, job_id):
+        try:
+            self.jobs[job_id]['future'] = self._executor.submit(self._run, job_id)
+        except RuntimeError:
+            # The queue is shutting down
+            self.jobs[job_id]['status'] = 'cancelled'
+            self._finish()
+            self._release(job_id)
+
+    def notify(self, channel, text):
+        """Posts a message from the upload thread without waiting for it
+        """
+        return self._uploads.submit(self._post, channel, text)
+
+    def _post(self, channel, text):
+        try:
+            self.uploader.post_message(channel, text)
+        except Exception:
+            logger.exception('Could not post to %s', channel)
+
+    def _run(self, job_id):
+        job = self.jobs[job_id]
+        try:
+            try:
+                job['status'] = 'running'
+                result = self._handlers[job['command']](job['args']) or {}
+            finally:
+                self._release(job_id)
+        except Exception as error:
+            logger.exception('Job %d (%s) failed', job_id, job['command'])
+            job['status'] = 'failed'
+            self._finish()
+            return self.notify(job['channel'], 'Job %d (%s) failed: %s' % (job_id, job['command'], error))
+
+        job['status'] = 'uploading'
+        self._finish()
+        return self._uploads.submit(self._upload, job_id, result)
+
+    def _upload(self, job_id, result):
+        job = self.jobs[job_id]
+        try:
+            if result.get('text'):
+                self.uploader.post_message(job['channel'], result['text'])
+            for file_path in result.get('files', []):
+                self.uploader.upload_file(job['channel'], file_path, title=job['command'])
+            job['status'] = 'done'
+        except Exception:
+            logger.exception('Could not upload the results of job %d', job_id)
+            job['status'] = 'failed'
+        finally:
+            if result.get('temporary_directory'):
+                shutil.rmtree(result['temporary_directory'], ignore_errors=True)
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+            self._lock.notify_all()
+
+    def shutdown(self, wait=True):
+        if wait:
+            # Jobs waiting for their group are only handed to the pool when an earlier one finishes
+            with self._lock:
+                self._lock.wait_for(lambda: self._pending == 0)
+        self._executor.shutdown(wait=wait)
+        self._uploads.shutdown(wait=wait)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are imported as ``model.<module>`` from the ``src`` directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,227 @@
+"""The job queue and the uploader against the fake Slack API
+
+Run from the ``src`` directory with ``python -m pytest tests``.
+"""
+
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+import model.jobs as jobs
+from model.fake_slack import FakeSlack
+
+class _Response:
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+class _ApiError(Exception):
+    """Raised like ``slack.errors.SlackApiError``, with the failed response in ``response``
+    """
+    def __init__(self, response):
+        super().__init__(response['error'])
+        self.response = response
+
+class _Client:
+    """The two Web API methods the uploader calls, over HTTP with the standard library
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def _request(self, method, query=None, body=b'', content_type='application/json'):
+        url = self.base_url + method + ('?' + urllib.parse.urlencode(query) if query else '')
+        request = urllib.request.Request(url, data=body, headers={'Content-Type':content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as reply:
+                response = _Response(reply.status, dict(reply.headers), json.loads(reply.read()))
+        except urllib.error.HTTPError as error:
+            response = _Response(error.code, dict(error.headers), json.loads(error.read()))
+        if not response['ok']:
+            raise _ApiError(response)
+        return response
+
+    def chat_postMessage(self, channel, text):
+        return self._request('chat.postMessage', body=json.dumps({'channel':channel, 'text':text}).encode())
+
+    def files_upload(self, channels, file, title=None):
+        with open(file, 'rb') as stream:
+            return self._request('files.upload', query={'channels':channels, 'title':title or ''}, body=stream.read(),
+                                 content_type='application/octet-stream')
+
+class _Recorder:
+    """Records the delays of an uploader instead of sleeping
+    """
+    def __init__(self):
+        self.delays = []
+
+    def __call__(self, delay):
+        self.delays.append(delay)
+
+@pytest.fixture
+def slack():
+    with FakeSlack() as server:
+        yield server
+
+def _queue(server, max_workers=2, **kwargs):
+    uploader = jobs.SlackUploader(_Client(server.base_url), base_delay=0.5, sleep=_Recorder(), **kwargs)
+
+    return jobs.JobQueue(uploader, max_workers=max_workers)
+
+def test_submit_returns_before_the_job_finishes(slack):
+    queue = _queue(slack)
+    release = threading.Event()
+    queue.register('process', lambda args: release.wait(5) and {'text':'processed %s' % args})
+
+    start = time.perf_counter()
+    job_id = queue.submit('process dolphin', '#met4a')
+    assert time.perf_counter() - start < 0.5
+    assert queue.jobs[job_id]['status'] in ('queued', 'running')
+
+    release.set()
+    queue.shutdown()
+    assert queue.jobs[job_id]['status'] == 'done'
+    assert [call['fields'] for call in slack.calls_to('chat.postMessage')] == \
+        [{'channel':'#met4a', 'text':'processed dolphin'}]
+
+def test_group_limit_does_not_block_other_commands(slack):
+    queue = _queue(slack, max_workers=2)
+    lock = threading.Lock()
+    running = {'plot':0, 'most':0}
+    plots_started = threading.Event()
+    release = threading.Event()
+
+    def plot(args):
+        with lock:
+            running['plot'] += 1
+            running['most'] = max(running['most'], running['plot'])
+        plots_started.set()
+        release.wait(5)
+        with lock:
+            running['plot'] -= 1
+        return {'text':'plot %s' % args}
+
+    queue.register('plot allan', plot, max_concurrent=1, group='plot')
+    queue.register('plot psd', plot, max_concurrent=1, group='plot')
+    queue.register('status', lambda args: {'text':'ok'})
+
+    plot_ids = [queue.submit('plot allan a', '#met4a'), queue.submit('plot psd b', '#met4a'),
+                queue.submit('plot allan c', '#met4a')]
+    assert plots_started.wait(5)
+    # The waiting plots hold no worker, so the second worker runs other commands at once
+    status_id = queue.submit('status', '#met4a')
+    queue.jobs[status_id]['future'].result(timeout=5)
+    assert [queue.jobs[job_id]['status'] for job_id in plot_ids] == ['running', 'queued', 'queued']
+
+    release.set()
+    queue.shutdown()
+    assert running['most'] == 1
+    assert all(queue.jobs[job_id]['status'] == 'done' for job_id in plot_ids + [status_id])
+
+def test_rate_limited_calls_wait_for_retry_after():
+    with FakeSlack(rate_limited_calls=2, retry_after=7) as server:
+        uploader = jobs.SlackUploader(_Client(server.base_url), sleep=_Recorder())
+        uploader.post_message('#met4a', 'hello')
+
+    assert uploader.sleep.delays == [7, 7]
+    assert [call['rate_limited'] for call in server.calls] == [True, True, False]
+    assert len(server.calls_to('chat.postMessage')) == 1
+
+def test_server_errors_back_off_exponentially():
+    with FakeSlack(server_error_calls=3) as server:
+        uploader = jobs.SlackUploader(_Client(server.base_url), base_delay=0.5, sleep=_Recorder())
+        uploader.post_message('#met4a', 'hello')
+
+    assert uploader.sleep.delays == [0.5, 1, 2]
+    assert len(server.calls_to('chat.postMessage')) == 1
+
+def test_connection_errors_are_retried():
+    with FakeSlack() as server:
+        base_url = server.base_url
+
+    uploader = jobs.SlackUploader(_Client(base_url), max_retries=2, base_delay=0.5, sleep=_Recorder())
+    with pytest.raises(OSError):
+        uploader.post_message('#met4a', 'hello')
+    assert uploader.sleep.delays == [0.5, 1]
+
+def test_other_errors_are_not_retried():
+    with FakeSlack(errors={'chat.postMessage':'channel_not_found'}) as server:
+        uploader = jobs.SlackUploader(_Client(server.base_url), sleep=_Recorder())
+        with pytest.raises(_ApiError, match='channel_not_found'):
+            uploader.post_message('#nowhere', 'hello')
+
+    assert uploader.sleep.delays == []
+    assert len(server.calls) == 1
+
+def test_results_are_uploaded_in_order(slack, tmp_path):
+    queue = _queue(slack)
+    directory = tmp_path / 'plots'
+
+    def plot(args):
+        directory.mkdir()
+        file_paths = []
+        for name in args.split():
+            file_path = directory / ('%s.png' % name)
+            file_path.write_bytes(b'\x89PNG' + name.encode())
+            file_paths.append(str(file_path))
+        return {'text':'plots', 'files':file_paths, 'temporary_directory':str(directory)}
+
+    queue.register('plot', plot)
+    job_id = queue.submit('plot first second', '#met4a')
+    queue.shutdown()
+
+    assert queue.jobs[job_id]['status'] == 'done'
+    assert [call['method'] for call in slack.calls] == ['chat.postMessage', 'files.upload', 'files.upload']
+    assert [call['fields']['bytes'] for call in slack.calls_to('files.upload')] == [len('\x89PNGfirst'),
+                                                                                   len('\x89PNGsecond')]
+    assert all(call['fields']['channels'] == '#met4a' for call in slack.calls_to('files.upload'))
+    assert not os.path.exists(directory)
+
+def test_failed_uploads_remove_the_temporary_directory(tmp_path):
+    directory = tmp_path / 'plots'
+    directory.mkdir()
+    (directory / 'plot.png').write_bytes(b'\x89PNG')
+
+    with FakeSlack(errors={'files.upload':'not_allowed'}) as server:
+        queue = _queue(server)
+        queue.register('plot', lambda args: {'files':[str(directory / 'plot.png')],
+                                             'temporary_directory':str(directory)})
+        job_id = queue.submit('plot', '#met4a')
+        queue.shutdown()
+
+    assert queue.jobs[job_id]['status'] == 'failed'
+    assert not os.path.exists(directory)
+
+def test_failed_jobs_are_reported(slack):
+    queue = _queue(slack)
+
+    def process(args):
+        raise ValueError('no collection %s' % args)
+
+    queue.register('process', process)
+    job_id = queue.submit('process orca', '#met4a')
+    queue.jobs[job_id]['future'].result(timeout=5)
+    queue.shutdown()
+
+    assert queue.jobs[job_id]['status'] == 'failed'
+    assert [call['fields']['text'] for call in slack.calls_to('chat.postMessage')] == \
+        ['Job %d (process) failed: no collection orca' % job_id]
+
+def test_slack_client_is_retried_on_rate_limits():
+    slack_client = pytest.importorskip('slack')
+    with FakeSlack(rate_limited_calls=1, retry_after=3) as server:
+        uploader = jobs.SlackUploader(slack_client.WebClient(token='xoxb-test', base_url=server.base_url),
+                                      sleep=_Recorder())
+        uploader.post_message('#met4a', 'hello')
+
+    assert uploader.sleep.delays == [3]
+    assert len(server.calls_to('chat.postMessage')) == 1